@@ -0,0 +1,258 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""
+Roll up data for fine geographies to coarser ones locally.
+
+Once we have downloaded data for fine geographies like census tracts
+or block groups, we can compute the values of additive variables for
+the counties or states that contain them without going back to the
+census API. This module does that.
+"""
+
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import censusdis.data as ced
+from censusdis.impl.exceptions import CensusApiException
+from censusdis.impl.varcache import VariableCache
+from censusdis.impl.varsource.base import VintageType
+
+GEO_HIERARCHY = ["STATE", "COUNTY", "TRACT", "BLOCK_GROUP"]
+"""
+The hierarchy of geography columns we can roll up along.
+
+Each level is nested in the one before it. The identifiers in
+each level are only unique within the level above it, so rolling
+up to a level groups on that level and all the levels above it.
+"""
+
+
+def _group_codes(df: pd.DataFrame, key_columns: List[str]) -> np.ndarray:
+    """
+    Compute a dense integer group code for each row of a data frame.
+
+    Parameters
+    ----------
+    df
+        The data frame.
+    key_columns
+        The columns that together identify the group each row is in.
+
+    Returns
+    -------
+        An array of integer codes in `range(n_groups)`, one for each row.
+        Codes are in sorted order of the key columns.
+    """
+    codes = np.zeros(len(df.index), dtype=np.int64)
+
+    for column in key_columns:
+        column_codes, uniques = pd.factorize(df[column], sort=True)
+        codes = codes * (len(uniques) + 1) + (column_codes + 1)
+
+        # Keep the codes dense so they can't overflow no matter
+        # how many key columns there are.
+        _, codes = np.unique(codes, return_inverse=True)
+        codes = codes.reshape(-1)
+
+    return codes
+
+
+def _moe_estimate(column: str) -> Optional[str]:
+    """If a column is a margin of error, return the name of the estimate it is for."""
+    if column.endswith("M"):
+        return column[:-1] + "E"
+    return None
+
+
+def _additive_columns(
+    df: pd.DataFrame,
+    dataset: str,
+    vintage: VintageType,
+    variable_cache: VariableCache,
+    exclude: Iterable[str],
+) -> List[str]:
+    """Find the columns in a data frame that are additive variables or their MOEs."""
+    exclude = set(exclude)
+
+    def is_additive(column: str) -> bool:
+        try:
+            return variable_cache.is_additive(dataset, vintage, column)
+        except (KeyError, CensusApiException):
+            # Not a variable we know about, e.g. a geography
+            # or derived column. Anything else, like a network
+            # failure, is a real error.
+            return False
+
+    additive = {
+        column for column in df.columns if column not in exclude and is_additive(column)
+    }
+
+    return [
+        column
+        for column in df.columns
+        if column in additive
+        or (column not in exclude and _moe_estimate(column) in additive)
+    ]
+
+
+def _resolve_variables(
+    df: pd.DataFrame,
+    key_columns: List[str],
+    *,
+    dataset: Optional[str],
+    vintage: Optional[VintageType],
+    variables: Optional[Union[str, Iterable[str]]],
+    moe_variables: Optional[Union[str, Iterable[str]]],
+    variable_cache: Optional[VariableCache],
+) -> Tuple[List[str], List[str]]:
+    """
+    Determine which columns are estimates to sum and which are margins of error.
+
+    See :py:func:`rollup` for the meaning of the arguments.
+
+    Returns
+    -------
+        The estimate columns and the margin of error columns.
+    """
+    if variables is None:
+        if dataset is None or vintage is None:
+            raise ValueError(
+                "If `variables` is not given, `dataset` and `vintage` are needed "
+                "to determine which variables are additive."
+            )
+        if variable_cache is None:
+            variable_cache = ced.variables
+
+        columns = _additive_columns(
+            df, dataset, vintage, variable_cache, list(key_columns) + GEO_HIERARCHY
+        )
+        variables = [
+            column for column in columns if _moe_estimate(column) not in columns
+        ]
+        if moe_variables is None:
+            moe_variables = [column for column in columns if column not in variables]
+    else:
+        if isinstance(variables, str):
+            variables = [variables]
+        variables = list(variables)
+
+        if moe_variables is None:
+            moe_variables = [
+                column
+                for column in df.columns
+                if column not in variables and _moe_estimate(column) in variables
+            ]
+
+    if isinstance(moe_variables, str):
+        moe_variables = [moe_variables]
+    moe_variables = list(moe_variables)
+
+    return variables, moe_variables
+
+
+def rollup(
+    df: pd.DataFrame,
+    to: Union[str, Iterable[str]],
+    *,
+    dataset: Optional[str] = None,
+    vintage: Optional[VintageType] = None,
+    variables: Optional[Union[str, Iterable[str]]] = None,
+    moe_variables: Optional[Union[str, Iterable[str]]] = None,
+    variable_cache: Optional[VariableCache] = None,
+) -> pd.DataFrame:
+    """
+    Roll up data for fine geographies to coarser geographies.
+
+    For example, if `df` has tract level data with columns
+    `STATE`, `COUNTY`, `TRACT`, `B03002_001E` and `B03002_001M`, then
+    `rollup(df, "county", dataset=ACS5, vintage=2020)` will produce county
+    level data by summing the estimates of all the tracts in each county.
+
+    Estimates are summed. Margins of error are combined with the usual
+    root-sum-of-squares approximation. If any value in a group is missing,
+    the result for that group is missing.
+
+    Parameters
+    ----------
+    df
+        The fine grained data.
+    to
+        The level to roll up to. Either one of the levels in :py:data:`GEO_HIERARCHY`,
+        for example `"county"` or `"COUNTY"`, or a list of columns in `df` that
+        identify a custom region, for example `["STATE", "REGION"]`.
+    dataset
+        The dataset `df` came from. Used together with `vintage` to look up
+        which variables are additive if `variables` is not given.
+    vintage
+        The vintage `df` came from.
+    variables
+        The estimate columns to sum. If `None`, all columns that
+        `variable_cache` says are additive for `dataset` and `vintage`
+        are used, along with their margins of error.
+    moe_variables
+        The margin of error columns to combine by root-sum-of-squares. If
+        `None` and `variables` is given, any column whose name ends in `M`
+        corresponding to an estimate ending in `E` in `variables` is used.
+    variable_cache
+        A cache of metadata about variables. Defaults to
+        :py:data:`censusdis.data.variables`.
+
+    Returns
+    -------
+        A data frame with one row for each group and columns for the keys
+        of the group followed by the rolled up variables.
+    """
+    if isinstance(to, str):
+        level = to.upper().replace(" ", "_")
+        if level not in GEO_HIERARCHY:
+            raise ValueError(
+                f"Unknown geography level '{to}'. Expected one of {GEO_HIERARCHY} "
+                "or a list of columns."
+            )
+        key_columns = GEO_HIERARCHY[: GEO_HIERARCHY.index(level) + 1]
+    else:
+        key_columns = list(to)
+
+    missing_keys = [column for column in key_columns if column not in df.columns]
+    if missing_keys:
+        raise ValueError(f"Columns {missing_keys} needed to roll up are not in df.")
+
+    variables, moe_variables = _resolve_variables(
+        df,
+        key_columns,
+        dataset=dataset,
+        vintage=vintage,
+        variables=variables,
+        moe_variables=moe_variables,
+        variable_cache=variable_cache,
+    )
+
+    codes = _group_codes(df, key_columns)
+    n_groups = codes.max() + 1 if len(codes) else 0
+
+    # The first row in each group gives us the keys.
+    _, first_rows = np.unique(codes, return_index=True)
+    df_rollup = df[key_columns].iloc[first_rows].reset_index(drop=True)
+
+    rolled_up = {}
+
+    for column in df.columns:
+        if column in variables:
+            values = df[column].to_numpy(dtype=float)
+            sums = np.bincount(codes, weights=values, minlength=n_groups)
+        elif column in moe_variables:
+            values = df[column].to_numpy(dtype=float)
+            sums = np.sqrt(np.bincount(codes, weights=values**2, minlength=n_groups))
+        else:
+            continue
+
+        # Keep integers as integers if we can.
+        if pd.api.types.is_integer_dtype(df[column].dtype):
+            sums = np.rint(sums).astype(df[column].dtype)
+
+        rolled_up[column] = sums
+
+    return pd.concat(
+        [df_rollup, pd.DataFrame(rolled_up, index=df_rollup.index)], axis="columns"
+    )
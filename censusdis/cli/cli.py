@@ -1,9 +1,12 @@
 # Copyright (c) 2023 Darren Erik Vengroff
 """Main module for the command line interface to censusdis."""
-from typing import Optional
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import argparse
 import logging
 import sys
+import time
 from logging import getLogger
 
 import geopandas as gpd
@@ -11,7 +14,10 @@ import matplotlib.pyplot as plt
 
 from logargparser import LoggingArgumentParser
 
+import censusdis.data as ced
+from censusdis.cli.writers import needs_geometry, write
 from censusdis.cli.yamlspec import DataSpec, PlotSpec
+from censusdis.impl.concurrency import concurrent_imap_unordered
 
 logger = getLogger(__name__)
 
@@ -44,12 +50,58 @@ def main():
         type=str,
         required=True,
         help="Output file to store the data in. Format will be determined from the "
-        "file extansion. .csv or .geojson (the latter if your spec has with_geometry: true.",
+        "file extansion. .csv, .parquet or .feather, or .geoparquet, .fgb or .geojson "
+        "(the latter three if your spec has with_geometry: true). Parquet and Feather "
+        "keep geometry if there is any.",
     )
     download_parser.add_argument("dataspec", type=str, help="A dataspec YAML file.")
 
     download_parser.set_defaults(func=download)
 
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Download data for many data specifications concurrently in one process.",
+    )
+
+    batch_parser.add_argument(
+        "--api-key",
+        type=str,
+        help="Optional API key. Alternatively, store your key in "
+        "~/.censusdis/api_key.txt. It you don't have a key, you "
+        "may get throttled or blocked. Get one from "
+        "https://api.census.gov/data/key_signup.html",
+    )
+    batch_parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        required=True,
+        help="Directory to store the data in. Each data spec's data is written to a file "
+        "named after the data spec file, as soon as it is downloaded.",
+    )
+    batch_parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        default="csv",
+        help="File extension, and thus format, of the output files. csv by default. "
+        "See the download command for the other choices.",
+    )
+    batch_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="The maximum number of data specs to download concurrently.",
+    )
+    batch_parser.add_argument(
+        "dataspecs",
+        type=str,
+        nargs="+",
+        help="Dataspec YAML files, or directories containing them.",
+    )
+
+    batch_parser.set_defaults(func=batch)
+
     plot_parser = subparsers.add_parser("plot", help="Plot data on a map.")
 
     data_group = plot_parser.add_mutually_exclusive_group(required=True)
@@ -96,7 +148,7 @@ def main():
     args.func(args)
 
 
-def _read_dataspec(dataspec_file: str) -> DataSpec:
+def _read_dataspec(dataspec_file: Union[str, Path]) -> DataSpec:
     logger.info(f"Loading data spec from {dataspec_file}.")
     dataspec = DataSpec.load_yaml(dataspec_file)
     logger.info("Loaded.")
@@ -131,28 +183,185 @@ def download(args):
 
     dataspec_file = args.dataspec
     output = args.output
-    needs_geometry = output.endswith(".geojson")
 
     dataspec = _read_dataspec(dataspec_file)
 
-    df_or_gdf = _download_data(dataspec, needs_geometry, args.api_key)
+    df_or_gdf = _download_data(dataspec, needs_geometry(output), args.api_key)
+
+    _write_data(df_or_gdf, output)
+
 
+def _write_data(df_or_gdf, output: str):
     logger.info(f"Writing data to {output}.")
+    write(df_or_gdf, output)
+    logger.info("Writing complete.")
+
+
+def _dataspec_files(paths: Iterable[str]) -> List[Path]:
+    """Expand directories into the YAML files in them."""
+    dataspec_files = []
 
-    if output.endswith(".csv"):
-        if dataspec.with_geometry:
-            logger.warning(
-                "Data with geometry being written to a csv file. You might prefer .geojson."
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            dataspec_files.extend(
+                sorted(
+                    file
+                    for file in path.iterdir()
+                    if file.suffix in (".yaml", ".yml") and file.is_file()
+                )
             )
-        df_or_gdf.to_csv(output, index=False)
-    elif output.endswith(".geojson"):
-        df_or_gdf.to_file(output, driver="GeoJson")
-    else:
-        logger.warning(
-            f"Unrecognized file type {output}. This might or might not work."
+        else:
+            dataspec_files.append(path)
+
+    return dataspec_files
+
+
+def batch(args):
+    """Execute the batch command from the CLI."""
+    logger.debug("Batch command selected.")
+
+    output_dir = Path(args.output_dir)
+    output_format = args.format.lstrip(".")
+
+    dataspec_files = _dataspec_files(args.dataspecs)
+
+    stems = [dataspec_file.stem for dataspec_file in dataspec_files]
+    duplicate_stems = sorted({stem for stem in stems if stems.count(stem) > 1})
+    if duplicate_stems:
+        logger.critical(
+            f"More than one data spec file is named {', '.join(duplicate_stems)}, "
+            "so their outputs would overwrite one another."
         )
-        df_or_gdf.to_file(output)
-    logger.info("Writing complete.")
+        sys.exit(2)
+
+    failures = 0
+
+    # Each unique data spec, and all the files it was loaded from. Identical
+    # specs are only downloaded once and written to each of their outputs.
+    unique_dataspecs: Dict[DataSpec, List[Path]] = defaultdict(list)
+
+    for dataspec_file in dataspec_files:
+        try:
+            dataspec = DataSpec.load_yaml(dataspec_file)
+        except Exception as e:
+            logger.error(f"Failed to load data spec {dataspec_file}: {e}")
+            failures += 1
+            continue
+
+        if not isinstance(dataspec, DataSpec):
+            logger.error(
+                f"{dataspec_file} does not contain YAML for a data spec. "
+                "It should start with the tag '!DataSpec'"
+            )
+            failures += 1
+        elif needs_geometry(f".{output_format}") and not dataspec.with_geometry:
+            logger.error(
+                f"Data specification {dataspec_file} does not have `with_geometry: true`, "
+                f"but geometry is needed to save in .{output_format} format."
+            )
+            failures += 1
+        else:
+            unique_dataspecs[dataspec].append(dataspec_file)
+
+    # Overlapping specs, that differ only in their variables, are combined into
+    # shared queries, as in `download_many`. Specs contained within other
+    # geographies are downloaded on their own.
+    combiner = ced._QueryCombiner(ced.variables)
+    query_dataspecs: Dict[int, List[Tuple[DataSpec, Optional[List[str]]]]] = (
+        defaultdict(list)
+    )
+    contained_dataspecs: List[DataSpec] = []
+
+    for dataspec, files in unique_dataspecs.items():
+        if dataspec.contained_within is not None:
+            contained_dataspecs.append(dataspec)
+            continue
+
+        try:
+            query_index, spec_variables = combiner.add(dataspec.download_arguments())
+        except Exception as e:
+            logger.error(f"Failed to plan download for {_names(files)}: {e}")
+            failures += len(files)
+            continue
+
+        query_dataspecs[query_index].append((dataspec, spec_variables))
+
+    logger.info(
+        f"Downloading {len(unique_dataspecs)} unique data specs from "
+        f"{len(dataspec_files)} files with "
+        f"{len(query_dataspecs) + len(contained_dataspecs)} queries."
+    )
+
+    combiner.prefetch()
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    def download_query(query: Union[int, DataSpec]):
+        # Everything runs in this process, so all the queries share
+        # the caches of metadata and shapefiles.
+        start = time.perf_counter()
+        try:
+            if isinstance(query, DataSpec):
+                df_or_gdf = query.download(api_key=args.api_key)
+            else:
+                df_or_gdf = combiner.download(query, api_key=args.api_key)
+        except Exception as e:
+            df_or_gdf = e
+
+        return query, df_or_gdf, time.perf_counter() - start
+
+    for query, df_or_gdf, elapsed in concurrent_imap_unordered(
+        download_query,
+        list(query_dataspecs) + contained_dataspecs,
+        workers=args.workers,
+    ):
+        if isinstance(query, DataSpec):
+            dataspecs = [(query, None)]
+        else:
+            dataspecs = query_dataspecs[query]
+
+        for dataspec, spec_variables in dataspecs:
+            files = unique_dataspecs[dataspec]
+
+            if isinstance(df_or_gdf, Exception):
+                logger.error(
+                    f"Failed to download data for {_names(files)}: {df_or_gdf}"
+                )
+                failures += len(files)
+                continue
+
+            try:
+                if isinstance(query, DataSpec):
+                    df_spec = df_or_gdf
+                else:
+                    df_spec = dataspec.variable_spec.with_synthesized(
+                        combiner.spec_result(query, spec_variables, df_or_gdf)
+                    )
+
+                for dataspec_file in files:
+                    _write_data(
+                        df_spec,
+                        str(output_dir / f"{dataspec_file.stem}.{output_format}"),
+                    )
+            except Exception as e:
+                logger.error(f"Failed to write data for {_names(files)}: {e}")
+                failures += len(files)
+                continue
+
+            logger.info(
+                f"Downloaded {len(df_spec.index)} rows for {_names(files)} "
+                f"in {elapsed:.2f}s."
+            )
+
+    if failures > 0:
+        logger.critical(f"Failed to download data for {failures} data specs.")
+        sys.exit(1)
+
+
+def _names(files: Iterable[Path]) -> str:
+    """Join the names of data spec files for messages."""
+    return ", ".join(map(str, files))
 
 
 def plot(args):
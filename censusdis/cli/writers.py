@@ -0,0 +1,203 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""
+Writers for the output files of the CLI.
+
+The format of each output file is determined by its extension. Columnar
+formats (Parquet, GeoParquet and Feather) and CSV are written in groups
+of rows, so that no more than one group is ever serialized in memory at
+a time, no matter how large the data is.
+"""
+
+import json
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Union
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = getLogger(__name__)
+
+
+ROWS_PER_GROUP = 65_536
+"""How many rows to serialize and write at a time."""
+
+GEOMETRY_FORMATS = frozenset([".geojson", ".geoparquet", ".fgb"])
+"""Extensions of formats that can only be written for data with geometry."""
+
+
+def needs_geometry(output: Union[str, Path]) -> bool:
+    """Determine whether an output file's format requires data with geometry."""
+    return Path(output).suffix.lower() in GEOMETRY_FORMATS
+
+
+def _row_groups(df: pd.DataFrame, rows_per_group: int) -> Iterator[pd.DataFrame]:
+    """Split a data frame into consecutive groups of rows."""
+    for start in range(0, max(len(df.index), 1), rows_per_group):
+        yield df.iloc[start : start + rows_per_group]  # noqa: E203
+
+
+def _geo_metadata(gdf: gpd.GeoDataFrame) -> Dict[str, Any]:
+    """
+    Construct GeoParquet metadata for a geo data frame.
+
+    The metadata is for the whole frame, so it is computed once rather
+    than separately for each group of rows.
+    """
+    geometry_types = sorted(
+        geom_type for geom_type in gdf.geom_type.unique() if geom_type is not None
+    )
+
+    return {
+        "version": "1.0.0",
+        "primary_column": gdf.geometry.name,
+        "columns": {
+            gdf.geometry.name: {
+                "encoding": "WKB",
+                "geometry_types": geometry_types,
+                "crs": None if gdf.crs is None else gdf.crs.to_json_dict(),
+            }
+        },
+    }
+
+
+def _record_batches(
+    df_or_gdf: Union[pd.DataFrame, gpd.GeoDataFrame], rows_per_group: int
+) -> Iterator[Union[pa.Schema, pa.RecordBatch]]:
+    """
+    Convert a data frame to Arrow one group of rows at a time.
+
+    The first item generated is the schema of the whole frame, so that all
+    the groups of rows have the same schema. Geometry is encoded as WKB and
+    described in GeoParquet metadata, which both Parquet and Feather readers
+    in geopandas understand.
+    """
+    is_geo = isinstance(df_or_gdf, gpd.GeoDataFrame)
+
+    if is_geo:
+        geometry_name = df_or_gdf.geometry.name
+        metadata = {b"geo": json.dumps(_geo_metadata(df_or_gdf)).encode("utf-8")}
+        # Infer the types of all the other columns from the whole frame.
+        schema = pa.Schema.from_pandas(
+            pd.DataFrame(df_or_gdf.drop(columns=geometry_name)), preserve_index=False
+        )
+        schema = schema.insert(
+            df_or_gdf.columns.get_loc(geometry_name),
+            pa.field(geometry_name, pa.binary()),
+        ).with_metadata(metadata)
+    else:
+        schema = pa.Schema.from_pandas(df_or_gdf, preserve_index=False)
+
+    yield schema
+
+    for df_group in _row_groups(df_or_gdf, rows_per_group):
+        if is_geo:
+            df_group = pd.DataFrame(df_group).assign(
+                **{geometry_name: df_group.geometry.to_wkb()}
+            )
+
+        yield pa.RecordBatch.from_pandas(df_group, schema=schema, preserve_index=False)
+
+
+def _write_parquet(df_or_gdf, output: Path, rows_per_group: int) -> None:
+    """Write Parquet, or GeoParquet if there is geometry, one row group at a time."""
+    batches = _record_batches(df_or_gdf, rows_per_group)
+    schema = next(batches)
+
+    with pq.ParquetWriter(output, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch, row_group_size=rows_per_group)
+
+
+def _write_feather(df_or_gdf, output: Path, rows_per_group: int) -> None:
+    """Write Feather (Arrow IPC) one record batch at a time."""
+    batches = _record_batches(df_or_gdf, rows_per_group)
+    schema = next(batches)
+
+    with pa.OSFile(str(output), "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+
+def _write_csv(df_or_gdf, output: Path, rows_per_group: int) -> None:
+    """Write CSV one group of rows at a time."""
+    if isinstance(df_or_gdf, gpd.GeoDataFrame):
+        logger.warning(
+            "Data with geometry being written to a csv file. You might prefer .geoparquet."
+        )
+
+    with open(output, "w", newline="") as file:
+        for ii, df_group in enumerate(_row_groups(df_or_gdf, rows_per_group)):
+            df_group.to_csv(file, index=False, header=(ii == 0))
+
+
+def _write_geojson(gdf: gpd.GeoDataFrame, output: Path, rows_per_group: int) -> None:
+    """Write GeoJSON."""
+    gdf.to_file(output, driver="GeoJSON")
+
+
+def _write_flatgeobuf(gdf: gpd.GeoDataFrame, output: Path, rows_per_group: int) -> None:
+    """
+    Write FlatGeobuf.
+
+    The format's spatial index is built over all the features when the file
+    is closed, so it cannot be appended to a group of rows at a time.
+    """
+    gdf.to_file(output, driver="FlatGeobuf")
+
+
+_WRITERS: Dict[str, Callable[[Any, Path, int], None]] = {
+    ".csv": _write_csv,
+    ".parquet": _write_parquet,
+    ".geoparquet": _write_parquet,
+    ".feather": _write_feather,
+    ".arrow": _write_feather,
+    ".geojson": _write_geojson,
+    ".fgb": _write_flatgeobuf,
+}
+"""Writers for each output file extension."""
+
+
+def write(
+    df_or_gdf: Union[pd.DataFrame, gpd.GeoDataFrame],
+    output: Union[str, Path],
+    *,
+    rows_per_group: int = ROWS_PER_GROUP,
+) -> None:
+    """
+    Write data to a file in the format indicated by its extension.
+
+    Supported extensions are `.csv`, `.parquet`, `.geoparquet`, `.feather`,
+    `.arrow`, `.geojson` and `.fgb`. Data with geometry written to `.parquet`
+    is GeoParquet, and to `.feather` or `.arrow` is Feather with WKB geometry
+    and GeoParquet metadata, readable with :py:func:`gpd.read_parquet` and
+    :py:func:`gpd.read_feather`. Other extensions are passed on to :py:meth:`gpd.GeoDataFrame.to_file`.
+
+    Parameters
+    ----------
+    df_or_gdf
+        The data to write.
+    output
+        The file to write it to.
+    rows_per_group
+        How many rows to serialize and write at a time, where the format
+        allows it. For Parquet, this is also the size of row groups.
+    """
+    output = Path(output)
+    suffix = output.suffix.lower()
+
+    if suffix in GEOMETRY_FORMATS and not isinstance(df_or_gdf, gpd.GeoDataFrame):
+        raise ValueError(f"Data without geometry cannot be written to {output}.")
+
+    writer = _WRITERS.get(suffix, None)
+
+    if writer is None:
+        logger.warning(
+            f"Unrecognized file type {output}. This might or might not work."
+        )
+        df_or_gdf.to_file(output)
+    else:
+        writer(df_or_gdf, output, rows_per_group)
@@ -4,7 +4,7 @@ from abc import ABC
 import itertools
 from importlib import import_module
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, ClassVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union, ClassVar
 
 import geopandas as gpd
 import pandas as pd
@@ -20,6 +20,51 @@ from censusdis.geography import InSpecType
 from censusdis.impl.varsource.base import VintageType
 
 
+DerivationType = Callable[[pd.DataFrame, pd.Series], pd.DataFrame]
+"""
+The type of a function that derives variables from downloaded ones.
+
+It is given a block of downloaded variables and a denominator and returns
+a block of derived variables, one per downloaded variable. It should work
+on the whole block at once, rather than column by column.
+"""
+
+
+def _fraction(variables: pd.DataFrame, denominator: pd.Series) -> pd.DataFrame:
+    """Divide each variable by the denominator."""
+    return variables.div(denominator, axis="index")
+
+
+_DERIVATIONS: Dict[str, DerivationType] = {
+    "frac": _fraction,
+    "pct": lambda variables, denominator: _fraction(variables, denominator) * 100.0,
+    "per_1000": lambda variables, denominator: _fraction(variables, denominator)
+    * 1000.0,
+    "diff": lambda variables, denominator: variables.sub(denominator, axis="index"),
+}
+"""The kinds of derived variables a :py:class:`~VariableSpec` can synthesize, by name."""
+
+
+def register_derivation(name: str, derivation: DerivationType) -> None:
+    """
+    Register a new kind of derived variable.
+
+    Once registered, `name` can be passed as the `derivation` of any
+    :py:class:`~VariableSpec`, including in YAML files.
+
+    Parameters
+    ----------
+    name
+        The name of the derivation. It is also the default prefix
+        of the derived variables, followed by `'_'`.
+    derivation
+        A function that takes a data frame of downloaded variables and a
+        series containing their denominator and returns a data frame of
+        derived variables with the same columns.
+    """
+    _DERIVATIONS[name] = derivation
+
+
 def _class_constructor(clazz: ClassVar):
     def constructor(
         loader: yaml.SafeLoader, node: yaml.nodes.MappingNode
@@ -46,7 +91,16 @@ class VariableSpec(ABC):
         variables.
     frac_prefix
         The prefix to prepend to fractional variables. If `None` a default
-        prefix of `'frac_'` is used.
+        prefix of the name of the derivation followed by `'_'`, e.g. `'frac_'`,
+        is used.
+    frac_not
+        If `True`, derive variables from the remainder of the denominator after
+        subtracting each variable, e.g. 1 - fraction instead of fraction.
+    derivation
+        The kind of variables to derive. One of `'frac'` (the default) for fractions,
+        `'pct'` for percentages, `'per_1000'` for rates per thousand, `'diff'` for the
+        difference from the denominator, or a name registered with
+        :py:func:`~register_derivation`.
     """
 
     def __init__(
@@ -55,16 +109,24 @@ class VariableSpec(ABC):
         denominator: Union[str, bool] = False,
         frac_prefix: Optional[str] = None,
         frac_not: bool = False,
+        derivation: str = "frac",
     ):
+        if derivation not in _DERIVATIONS:
+            raise ValueError(
+                f"Unknown derivation '{derivation}'. Expected one of {sorted(_DERIVATIONS)}."
+            )
+
         self._denominator = denominator
 
         if frac_prefix is None:
-            frac_prefix = "frac_"
+            frac_prefix = f"{derivation}_"
 
         self._frac_prefix = frac_prefix
 
         self._frac_not = frac_not
 
+        self._derivation = derivation
+
     @property
     def denominator(self) -> Union[str, bool]:
         """The denominator to divide by when constructing fractional variables."""
@@ -80,6 +142,11 @@ class VariableSpec(ABC):
         """Should we return 1 - fraction instead of fraction."""
         return self._frac_not
 
+    @property
+    def derivation(self) -> str:
+        """The kind of variables to derive."""
+        return self._derivation
+
     def variables_to_download(self) -> List[str]:
         """Return a list of the variables that need to be downloaded from the U.S. Census API."""
         if isinstance(self._denominator, str):
@@ -97,10 +164,41 @@ class VariableSpec(ABC):
         """
         return []
 
+    def _derive(self, variables: pd.DataFrame, denominator: pd.Series) -> pd.DataFrame:
+        """Derive variables from a block of downloaded variables in one operation."""
+        if self._frac_not:
+            variables = variables.rsub(denominator, axis="index")
+
+        return _DERIVATIONS[self._derivation](variables, denominator).add_prefix(
+            self._frac_prefix
+        )
+
+    def derive(
+        self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]
+    ) -> pd.DataFrame:
+        """
+        Compute synthesized variables, like fractional variables.
+
+        Parameters
+        ----------
+        df_downloaded
+            A data frame of variables that were downloaded.
+
+        Returns
+        -------
+            A data frame with the same index as `df_downloaded` and a
+            column for each synthesized variable.
+        """
+        return pd.DataFrame(index=df_downloaded.index)
+
     def synthesize(self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]) -> None:
         """
         Post-process after downloading to compute variables like fractional variables are constructed.
 
+        The variables from :py:meth:`~derive` are computed as a single block and
+        assigned to `df_downloaded` in one step. To get a new, unfragmented data
+        frame instead, use :py:meth:`~with_synthesized`.
+
         Parameters
         ----------
         df_downloaded
@@ -111,7 +209,63 @@ class VariableSpec(ABC):
         -------
             None. Any additions are made in-place in `df_downloaded`.
         """
-        return df_downloaded
+        df_derived = self.derive(df_downloaded)
+
+        if len(df_derived.columns) > 0:
+            df_downloaded[list(df_derived.columns)] = df_derived
+
+    def with_synthesized(
+        self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]
+    ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+        """
+        Construct a new data frame with synthesized variables added to downloaded ones.
+
+        Unlike :py:meth:`~synthesize`, `df_downloaded` is not modified. The variables
+        from :py:meth:`~derive` are attached with a single concatenation, so wide
+        groups do not leave a fragmented data frame.
+
+        Parameters
+        ----------
+        df_downloaded
+            A data frame of variables that were downloaded.
+
+        Returns
+        -------
+            A copy of `df_downloaded` with any synthesized variables added as new columns.
+        """
+        df_derived = self.derive(df_downloaded)
+
+        # Synthesized variables replace any downloaded ones of the same name.
+        overlap = df_downloaded.columns.intersection(df_derived.columns)
+        if len(overlap) > 0:
+            df_downloaded = df_downloaded.drop(columns=overlap)
+
+        return pd.concat([df_downloaded, df_derived], axis="columns")
+
+    def download_arguments(self) -> Dict[str, Any]:
+        """
+        Construct the arguments to :py:func:`~ced.download` that select our variables.
+
+        Returns
+        -------
+            The `download_variables`, `group` and `leaves_of_group` arguments.
+        """
+        group_list = self.groups_to_download()
+
+        groups = [group for group, leaves_only in group_list if not leaves_only]
+        leaves_of_groups = [group for group, leaves_only in group_list if leaves_only]
+
+        if len(groups) == 0:
+            groups = None
+
+        if len(leaves_of_groups) == 0:
+            leaves_of_groups = None
+
+        return dict(
+            download_variables=self.variables_to_download(),
+            group=groups,
+            leaves_of_group=leaves_of_groups,
+        )
 
     def download(
         self,
@@ -182,17 +336,6 @@ class VariableSpec(ABC):
         -------
             A :py:class:`~pd.DataFrame` or `~gpd.GeoDataFrame` containing the requested US Census data.
         """
-        group_list = self.groups_to_download()
-
-        groups = [group for group, leaves_only in group_list if not leaves_only]
-        leaves_of_groups = [group for group, leaves_only in group_list if leaves_only]
-
-        if len(groups) == 0:
-            groups = None
-
-        if len(leaves_of_groups) == 0:
-            leaves_of_groups = None
-
         # Our download might be scoped to be contained
         # within some other geometries.
         if contained_within:
@@ -203,9 +346,7 @@ class VariableSpec(ABC):
         df_or_gdf = download_scope.download(
             dataset=dataset,
             vintage=vintage,
-            download_variables=self.variables_to_download(),
-            group=groups,
-            leaves_of_group=leaves_of_groups,
+            **self.download_arguments(),
             set_to_nan=set_to_nan,
             skip_annotations=skip_annotations,
             with_geometry=with_geometry,
@@ -215,9 +356,7 @@ class VariableSpec(ABC):
             **kwargs,
         )
 
-        self.synthesize(df_or_gdf)
-
-        return df_or_gdf
+        return self.with_synthesized(df_or_gdf)
 
     @classmethod
     def _yaml_loader(cls):
@@ -255,6 +394,10 @@ class VariableList(VariableSpec):
     frac_prefix
         The prefix to prepend to fractional variables. If `None` a default
         prefix of `'frac_'` is used.
+    frac_not
+        If `True`, compute 1 - fraction instead of fraction.
+    derivation
+        The kind of variables to derive. See :py:class:`~VariableSpec`.
     """
 
     def __init__(
@@ -264,9 +407,13 @@ class VariableList(VariableSpec):
         denominator: Union[str, bool] = False,
         frac_prefix: Optional[str] = None,
         frac_not: Optional[bool] = False,
+        derivation: str = "frac",
     ):
         super().__init__(
-            denominator=denominator, frac_prefix=frac_prefix, frac_not=frac_not
+            denominator=denominator,
+            frac_prefix=frac_prefix,
+            frac_not=frac_not,
+            derivation=derivation,
         )
         if isinstance(variables, str):
             self._variables = [variables]
@@ -291,40 +438,35 @@ class VariableList(VariableSpec):
             # We don't need to fetch an extra variable for the denominator.
             return self._variables
 
-    def synthesize(self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]):
+    def derive(
+        self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]
+    ) -> pd.DataFrame:
         """
-        Post-process after downloading to compute variables like fractional variables are constructed.
+        Compute fractional variables, or other derived variables.
 
-        This is where fractional variables are generated.
+        All of them are computed in a single operation over the block of
+        variables in the list.
 
         Parameters
         ----------
         df_downloaded
-            A data frame of variables that were downloaded. Any systhesized variables
-            are added as new columns.
+            A data frame of variables that were downloaded.
 
         Returns
         -------
-            None. Any additions are made in-place in `df_downloaded`.
+            A data frame with a column for each synthesized variable.
         """
         if not self.denominator:
-            return df_downloaded
+            return super().derive(df_downloaded)
+
+        variables = df_downloaded[self._variables]
 
         if isinstance(self.denominator, str):
-            for variable in self._variables:
-                frac = df_downloaded[variable] / df_downloaded[self.denominator]
-                if self.frac_not:
-                    df_downloaded[f"{self.frac_prefix}{variable}"] = 1.0 - frac
-                else:
-                    df_downloaded[f"{self.frac_prefix}{variable}"] = frac
-        elif self.denominator:
-            denominator = df_downloaded[self._variables].sum(axis="columns")
-            for variable in self._variables:
-                frac = df_downloaded[variable] / denominator
-                if self.frac_not:
-                    df_downloaded[f"{self.frac_prefix}{variable}"] = 1.0 - frac
-                else:
-                    df_downloaded[f"{self.frac_prefix}{variable}"] = frac
+            denominator = df_downloaded[self.denominator]
+        else:
+            denominator = variables.sum(axis="columns")
+
+        return self._derive(variables, denominator)
 
     def __eq__(self, other) -> bool:
         """Are two `VariableList`'s equal."""
@@ -334,6 +476,9 @@ class VariableList(VariableSpec):
         return (
             sorted(self._variables) == sorted(other._variables)
             and self.denominator == other.denominator
+            and self.frac_prefix == other.frac_prefix
+            and self.frac_not == other.frac_not
+            and self.derivation == other.derivation
         )
 
 
@@ -359,6 +504,10 @@ class CensusGroup(VariableSpec):
     frac_prefix
         The prefix to prepend to fractional variables. If `None` a default
         prefix of `'frac_'` is used.
+    frac_not
+        If `True`, compute 1 - fraction instead of fraction.
+    derivation
+        The kind of variables to derive. See :py:class:`~VariableSpec`.
     """
 
     def __init__(
@@ -369,12 +518,16 @@ class CensusGroup(VariableSpec):
         denominator: Optional[str] = None,
         frac_prefix: Optional[str] = None,
         frac_not: bool = False,
+        derivation: str = "frac",
     ):
         if denominator is None:
             denominator = False
 
         super().__init__(
-            denominator=denominator, frac_prefix=frac_prefix, frac_not=frac_not
+            denominator=denominator,
+            frac_prefix=frac_prefix,
+            frac_not=frac_not,
+            derivation=derivation,
         )
         self._group = [group] if isinstance(group, str) else list(group)
         self._leaves_only = leaves_only
@@ -391,47 +544,52 @@ class CensusGroup(VariableSpec):
         """
         return [(group, self._leaves_only) for group in self._group]
 
-    def synthesize(self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]):
+    def derive(
+        self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]
+    ) -> pd.DataFrame:
         """
-        Post-process after downloading to compute variables like fractional variables are constructed.
+        Compute fractional variables, or other derived variables.
 
-        This is where fractional variables are generated.
+        With a denominator variable, all of them are computed in a single operation
+        over the block of variables in all the groups. Otherwise, each group is a
+        block divided by its own sum.
 
         Parameters
         ----------
         df_downloaded
-            A data frame of variables that were downloaded. Any systhesized variables
-            are added as new columns.
+            A data frame of variables that were downloaded.
 
         Returns
         -------
-            None. Any additions are made in-place in `df_downloaded`.
+            A data frame with a column for each synthesized variable.
         """
+        if not self.denominator or not self._group:
+            return super().derive(df_downloaded)
+
+        columns = df_downloaded.columns
+
         if isinstance(self.denominator, str):
-            for group in self._group:
-                for variable in df_downloaded.columns:
-                    if variable.startswith(group):
-                        frac = df_downloaded[variable] / df_downloaded[self.denominator]
-                        if self.frac_not:
-                            df_downloaded[f"{self.frac_prefix}{variable}"] = 1.0 - frac
-                        else:
-                            df_downloaded[f"{self.frac_prefix}{variable}"] = frac
-        elif self.denominator:
-            for group in self._group:
-                denominator = df_downloaded[
-                    [
-                        variable
-                        for variable in df_downloaded.columns
-                        if variable.startswith(group)
-                    ]
-                ].sum(axis="columns")
-                for variable in df_downloaded.columns:
-                    if variable.startswith(group):
-                        frac = df_downloaded[variable] / denominator
-                        if self.frac_not:
-                            df_downloaded[f"{self.frac_prefix}{variable}"] = 1.0 - frac
-                        else:
-                            df_downloaded[f"{self.frac_prefix}{variable}"] = frac
+            variables = columns[columns.str.startswith(tuple(self._group))]
+            return self._derive(
+                df_downloaded[variables], df_downloaded[self.denominator]
+            )
+
+        df_derived = pd.concat(
+            [
+                self._derive(
+                    df_downloaded[variables],
+                    df_downloaded[variables].sum(axis="columns"),
+                )
+                for variables in (
+                    columns[columns.str.startswith(group)] for group in self._group
+                )
+            ],
+            axis="columns",
+        )
+
+        # A variable can be in more than one group if one group's name is a prefix
+        # of another's. The last group it is in determines its denominator.
+        return df_derived.loc[:, ~df_derived.columns.duplicated(keep="last")]
 
     def __eq__(self, other) -> bool:
         """Are two `CensusGroup`'s equal."""
@@ -442,6 +600,9 @@ class CensusGroup(VariableSpec):
             sorted(self._group) == sorted(other._group)
             and self.denominator == other.denominator
             and self._leaves_only == other._leaves_only
+            and self.frac_prefix == other.frac_prefix
+            and self.frac_not == other.frac_not
+            and self.derivation == other.derivation
         )
 
 
@@ -497,25 +658,31 @@ class VariableSpecCollection(VariableSpec):
             )
         )
 
-    def synthesize(self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]):
+    def derive(
+        self, df_downloaded: Union[pd.DataFrame, gpd.GeoDataFrame]
+    ) -> pd.DataFrame:
         """
-        Post-process after downloading to compute variables like fractional variables are constructed.
+        Compute synthesized variables, like fractional variables.
 
-        We do this by calling `synthesize` on each of our constituent variable specifications.
+        We do this by calling `derive` on each of our constituent variable specifications.
 
         Parameters
         ----------
         df_downloaded
-            A data frame of variables that were downloaded. Any systhesized variables
-            are added as new columns.
+            A data frame of variables that were downloaded.
 
         Returns
         -------
-            None. Any additions are made in-place in `df_downloaded`.
+            A data frame with a column for each synthesized variable.
         """
-        df = df_downloaded
-        for spec in self._variable_specs:
-            spec.synthesize(df)
+        df_derived = pd.concat(
+            [super().derive(df_downloaded)]
+            + [spec.derive(df_downloaded) for spec in self._variable_specs],
+            axis="columns",
+        )
+
+        # As when synthesizing one at a time, later specs win.
+        return df_derived.loc[:, ~df_derived.columns.duplicated(keep="last")]
 
     def __eq__(self, other) -> bool:
         """Are two `VariableSpecCollection`s equal."""
@@ -532,7 +699,7 @@ class VariableSpecCollection(VariableSpec):
             match = False
             # We use ii to record those in other that have been
             # matched so we don't try to match again.
-            for ii, other_spec in enumerate(self._variable_specs):
+            for ii, other_spec in enumerate(other._variable_specs):
                 if ii not in matched and self_spec == other_spec:
                     match = True
                     matched.add(ii)
@@ -738,6 +905,48 @@ class DataSpec:
             **self._geography,
         )
 
+    def download_arguments(self) -> Dict[str, Any]:
+        """
+        Construct the arguments to :py:func:`~ced.download` for the data we want.
+
+        This does not include `contained_within`, which has to be
+        downloaded through the :py:class:`~ced.ContainedWithin` itself.
+
+        Returns
+        -------
+            Arguments suitable for :py:func:`~ced.download` or as a spec for
+            :py:func:`~ced.download_many`.
+        """
+        return dict(
+            dataset=self._dataset,
+            vintage=self._vintage,
+            **self._variable_spec.download_arguments(),
+            with_geometry=self._with_geometry,
+            remove_water=self._remove_water,
+            **self._geography,
+        )
+
+    def __eq__(self, other) -> bool:
+        """Are two `DataSpec`s equal, in the sense that they download the same data."""
+        if not isinstance(other, DataSpec):
+            return False
+
+        return (
+            self._dataset == other._dataset
+            and self._vintage == other._vintage
+            and self._variable_spec == other._variable_spec
+            and self._geography == other._geography
+            and self._contained_within == other._contained_within
+            and self._with_geometry == other._with_geometry
+            and self._remove_water == other._remove_water
+        )
+
+    def __hash__(self) -> int:
+        """Hash consistently with `__eq__`, so `DataSpec`s can be in sets and dictionary keys."""
+        return hash(
+            (self._dataset, self._vintage, self._with_geometry, self._remove_water)
+        )
+
     @classmethod
     def _yaml_loader(cls):
         loader = VariableSpec._yaml_loader()
@@ -0,0 +1,463 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""
+Crosswalks to reallocate data between different sets of geographies.
+
+The most common use is to compare data across vintages whose geographies
+differ, for example census tracts from the 2010 census and the 2020 census.
+A :py:class:`Crosswalk` holds a sparse matrix of area weights from each source
+geography to each target geography it overlaps. Once built, it can be saved
+and reused to reallocate the values of additive variables cheaply.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import censusdis.data as ced
+from censusdis.aggregate import _resolve_variables
+from censusdis.impl.varcache import VariableCache
+from censusdis.impl.varsource.base import VintageType
+
+_CROSSWALK_PATH: Optional[Path] = None
+"""Where we cache crosswalks. If `None`, use the default under the home directory."""
+
+
+def set_crosswalk_path(crosswalk_path: Optional[Union[str, Path]]) -> None:
+    """
+    Set the path to the directory to cache crosswalks.
+
+    This is where :py:meth:`Crosswalk.build` will save the crosswalks it
+    builds and look for ones it built before.
+
+    Parameters
+    ----------
+    crosswalk_path
+        The path to use for caching crosswalks. If `None`, use the
+        default, `~/.censusdis/data/crosswalks`.
+    """
+    global _CROSSWALK_PATH
+
+    _CROSSWALK_PATH = None if crosswalk_path is None else Path(crosswalk_path)
+
+
+def get_crosswalk_path() -> Path:
+    """
+    Get the path to the directory to cache crosswalks.
+
+    Returns
+    -------
+        The path to use for caching crosswalks.
+    """
+    if _CROSSWALK_PATH is None:
+        return Path.home() / ".censusdis" / "data" / "crosswalks"
+    return _CROSSWALK_PATH
+
+
+class Crosswalk:
+    """
+    A sparse matrix of area weights from source geographies to target geographies.
+
+    Each non-zero entry `(i, j, w)` says that a fraction `w` of source geography `i`
+    lies in target geography `j`. The value of an additive variable for each
+    target is estimated by allocating the value of each source in proportion
+    to these weights, which assumes the variable is spread evenly over the
+    area of the source.
+
+    Users will normally construct these with :py:meth:`build` or
+    :py:meth:`from_geometries`.
+    """
+
+    def __init__(
+        self,
+        source_keys: pd.DataFrame,
+        target_keys: pd.DataFrame,
+        source_index: np.ndarray,
+        target_index: np.ndarray,
+        weights: np.ndarray,
+    ):
+        """
+        Construct a crosswalk from a sparse matrix in coordinate form.
+
+        Parameters
+        ----------
+        source_keys
+            The key columns, e.g. `STATE`, `COUNTY` and `TRACT`, identifying
+            each source geography. Row `i` is source geography `i`.
+        target_keys
+            The key columns identifying each target geography.
+        source_index
+            The source geography of each non-zero entry in the matrix.
+        target_index
+            The target geography of each non-zero entry in the matrix.
+        weights
+            The weight of each non-zero entry in the matrix.
+        """
+        self._source_keys = source_keys.reset_index(drop=True)
+        self._target_keys = target_keys.reset_index(drop=True)
+        self._source_index = np.asarray(source_index, dtype=np.int64)
+        self._target_index = np.asarray(target_index, dtype=np.int64)
+        self._weights = np.asarray(weights, dtype=float)
+
+    @property
+    def source_keys(self) -> pd.DataFrame:
+        """The keys of the source geographies."""
+        return self._source_keys
+
+    @property
+    def target_keys(self) -> pd.DataFrame:
+        """The keys of the target geographies."""
+        return self._target_keys
+
+    def __len__(self) -> int:
+        """Return the number of non-zero entries in the matrix."""
+        return len(self._weights)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Convert to a data frame with one row per non-zero entry in the matrix.
+
+        Returns
+        -------
+            A data frame with source key columns with a `_source` suffix,
+            target key columns with a `_target` suffix, and a `WEIGHT` column.
+        """
+        return pd.concat(
+            [
+                self._source_keys.iloc[self._source_index]
+                .add_suffix("_source")
+                .reset_index(drop=True),
+                self._target_keys.iloc[self._target_index]
+                .add_suffix("_target")
+                .reset_index(drop=True),
+                pd.DataFrame({"WEIGHT": self._weights}),
+            ],
+            axis="columns",
+        )
+
+    @classmethod
+    def from_geometries(
+        cls,
+        gdf_source: gpd.GeoDataFrame,
+        gdf_target: gpd.GeoDataFrame,
+        *,
+        source_key_columns: Optional[Iterable[str]] = None,
+        target_key_columns: Optional[Iterable[str]] = None,
+        normalize: bool = True,
+        area_epsg: int = 3857,
+    ) -> "Crosswalk":
+        """
+        Build a crosswalk from the geometries of the source and target geographies.
+
+        Candidate pairs of overlapping geographies are found with a spatial
+        index, and the areas of all their intersections are then computed
+        in a single vectorized operation.
+
+        Parameters
+        ----------
+        gdf_source
+            The source geographies.
+        gdf_target
+            The target geographies.
+        source_key_columns
+            The columns that identify the source geographies. If `None`,
+            all columns other than `NAME` and the geometry.
+        target_key_columns
+            The columns that identify the target geographies. If `None`,
+            all columns other than `NAME` and the geometry.
+        normalize
+            If `True`, normalize the weights for each source geography so they
+            sum to one, so that totals are preserved even if the source and target
+            geometries differ slightly, for example along coastlines. If `False`
+            weights are the fraction of the area of each source that intersects
+            each target.
+        area_epsg
+            The CRS to project to before doing area calculations.
+            Defaults to 3857. (https://epsg.io/3857)
+
+        Returns
+        -------
+            The crosswalk.
+        """
+        source_key_columns = _key_columns(gdf_source, source_key_columns)
+        target_key_columns = _key_columns(gdf_target, target_key_columns)
+
+        source_geometries = np.asarray(gdf_source.geometry.to_crs(epsg=area_epsg))
+        target_geometries = np.asarray(gdf_target.geometry.to_crs(epsg=area_epsg))
+
+        tree = shapely.STRtree(target_geometries)
+        source_index, target_index = tree.query(
+            source_geometries, predicate="intersects"
+        )
+
+        areas = shapely.area(
+            shapely.intersection(
+                source_geometries[source_index], target_geometries[target_index]
+            )
+        )
+
+        # Pairs that only touch along a boundary are not really overlapping.
+        overlapping = areas > 0
+        source_index = source_index[overlapping]
+        target_index = target_index[overlapping]
+        areas = areas[overlapping]
+
+        if normalize:
+            denominators = np.bincount(
+                source_index, weights=areas, minlength=len(source_geometries)
+            )
+        else:
+            denominators = shapely.area(source_geometries)
+
+        weights = areas / denominators[source_index]
+
+        return cls(
+            pd.DataFrame(gdf_source[source_key_columns]),
+            pd.DataFrame(gdf_target[target_key_columns]),
+            source_index,
+            target_index,
+            weights,
+        )
+
+    @classmethod
+    def build(
+        cls,
+        dataset: str,
+        source_vintage: VintageType,
+        target_vintage: VintageType,
+        *,
+        normalize: bool = True,
+        use_cache: bool = True,
+        **kwargs: ced.GeoFilterType,
+    ) -> "Crosswalk":
+        """
+        Build a crosswalk between the geographies of two vintages.
+
+        The geometries are downloaded with :py:func:`censusdis.data.download`,
+        so they come from the locally cached shapefiles if they are there. The
+        crosswalk is saved under :py:func:`get_crosswalk_path` and subsequent
+        calls with the same arguments load it from there.
+
+        Parameters
+        ----------
+        dataset
+            The dataset whose geographies we want, for example `ACS5`.
+        source_vintage
+            The vintage of the source geographies.
+        target_vintage
+            The vintage of the target geographies.
+        normalize
+            See :py:meth:`from_geometries`.
+        use_cache
+            If `True` look for a saved crosswalk before building and
+            save the one we build.
+        kwargs
+            A specification of the geographies, for example
+            `state=NJ, county="*", tract="*"`.
+
+        Returns
+        -------
+            The crosswalk.
+        """
+        cache_path = get_crosswalk_path() / _cache_file_name(
+            dataset, source_vintage, target_vintage, normalize, **kwargs
+        )
+
+        if use_cache and cache_path.exists():
+            return cls.load(cache_path)
+
+        gdf_source = ced.download(
+            dataset, source_vintage, ["NAME"], with_geometry=True, **kwargs
+        )
+        gdf_target = ced.download(
+            dataset, target_vintage, ["NAME"], with_geometry=True, **kwargs
+        )
+
+        crosswalk = cls.from_geometries(gdf_source, gdf_target, normalize=normalize)
+
+        if use_cache:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            crosswalk.save(cache_path)
+
+        return crosswalk
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Save the crosswalk to a file.
+
+        Parameters
+        ----------
+        path
+            The path to save to. By convention this ends in `.npz`.
+        """
+        with open(path, "wb") as file:
+            np.savez_compressed(
+                file,
+                source_key_columns=np.asarray(self._source_keys.columns, dtype=str),
+                source_keys=self._source_keys.to_numpy(dtype=str),
+                target_key_columns=np.asarray(self._target_keys.columns, dtype=str),
+                target_keys=self._target_keys.to_numpy(dtype=str),
+                source_index=self._source_index,
+                target_index=self._target_index,
+                weights=self._weights,
+            )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Crosswalk":
+        """
+        Load a crosswalk from a file written by :py:meth:`save`.
+
+        Parameters
+        ----------
+        path
+            The path to load from.
+
+        Returns
+        -------
+            The crosswalk.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                pd.DataFrame(
+                    arrays["source_keys"],
+                    columns=list(arrays["source_key_columns"]),
+                    dtype=object,
+                ),
+                pd.DataFrame(
+                    arrays["target_keys"],
+                    columns=list(arrays["target_key_columns"]),
+                    dtype=object,
+                ),
+                arrays["source_index"],
+                arrays["target_index"],
+                arrays["weights"],
+            )
+
+    def apply(
+        self,
+        df: pd.DataFrame,
+        *,
+        dataset: Optional[str] = None,
+        vintage: Optional[VintageType] = None,
+        variables: Optional[Union[str, Iterable[str]]] = None,
+        moe_variables: Optional[Union[str, Iterable[str]]] = None,
+        variable_cache: Optional[VariableCache] = None,
+    ) -> pd.DataFrame:
+        """
+        Reallocate data for the source geographies to the target geographies.
+
+        Estimates are reallocated in proportion to the weights. Margins of
+        error are approximated by root-sum-of-squares of the weighted margins
+        of error. If the value for any source that overlaps a target is missing,
+        including because the source geography is not in `df`, the result for
+        that target is missing.
+
+        Parameters
+        ----------
+        df
+            Data for the source geographies. It must have the source key columns.
+        dataset
+            The dataset `df` came from. Used together with `vintage` to look up
+            which variables are additive if `variables` is not given.
+        vintage
+            The vintage `df` came from.
+        variables
+            The estimate columns to reallocate. If `None`, all columns that
+            `variable_cache` says are additive for `dataset` and `vintage`
+            are used, along with their margins of error.
+        moe_variables
+            The margin of error columns to reallocate. If `None`, see
+            :py:func:`censusdis.aggregate.rollup`.
+        variable_cache
+            A cache of metadata about variables. Defaults to
+            :py:data:`censusdis.data.variables`.
+
+        Returns
+        -------
+            A data frame with one row per target geography, with the target
+            key columns followed by the reallocated variables.
+        """
+        source_key_columns = list(self._source_keys.columns)
+
+        variables, moe_variables = _resolve_variables(
+            df,
+            source_key_columns,
+            dataset=dataset,
+            vintage=vintage,
+            variables=variables,
+            moe_variables=moe_variables,
+            variable_cache=variable_cache,
+        )
+
+        # Where is each row of df in our source geographies?
+        row_positions = pd.MultiIndex.from_frame(
+            self._source_keys.astype(str)
+        ).get_indexer(pd.MultiIndex.from_frame(df[source_key_columns].astype(str)))
+        found = row_positions >= 0
+
+        n_target = len(self._target_keys.index)
+        reallocated = {}
+
+        for column in df.columns:
+            if column not in variables and column not in moe_variables:
+                continue
+
+            # Values for each source, in source order.
+            values = np.full(len(self._source_keys.index), np.nan)
+            values[row_positions[found]] = df[column].to_numpy(dtype=float)[found]
+
+            weighted = values[self._source_index] * self._weights
+
+            if column in variables:
+                reallocated[column] = np.bincount(
+                    self._target_index, weights=weighted, minlength=n_target
+                )
+            else:
+                reallocated[column] = np.sqrt(
+                    np.bincount(
+                        self._target_index, weights=weighted**2, minlength=n_target
+                    )
+                )
+
+        return pd.concat(
+            [
+                self._target_keys,
+                pd.DataFrame(reallocated, index=self._target_keys.index),
+            ],
+            axis="columns",
+        )
+
+
+def _key_columns(
+    gdf: gpd.GeoDataFrame, key_columns: Optional[Iterable[str]]
+) -> List[str]:
+    """Determine the key columns of a geo data frame."""
+    if key_columns is not None:
+        return list(key_columns)
+
+    return [
+        column
+        for column in gdf.columns
+        if column != "NAME" and column != gdf.geometry.name
+    ]
+
+
+def _cache_file_name(
+    dataset: str,
+    source_vintage: VintageType,
+    target_vintage: VintageType,
+    normalize: bool,
+    **kwargs: ced.GeoFilterType,
+) -> str:
+    """Construct the name of the file to cache a crosswalk in."""
+    geography = ",".join(f"{k}={ced._gf2s(v)}" for k, v in sorted(kwargs.items()))
+    digest = hashlib.sha1(geography.encode()).hexdigest()[:16]
+
+    return (
+        f"{dataset.replace('/', '_')}_{source_vintage}_{target_vintage}"
+        f"_{'n' if normalize else 'a'}_{digest}.npz"
+    )
@@ -6,10 +6,21 @@ This module relies on the US Census API, which
 it wraps in a pythonic manner.
 """
 
+import collections.abc
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
 import warnings
+from dataclasses import dataclass
 from logging import getLogger
 from typing import (
+    Any,
+    Callable,
     Dict,
+    Generator,
     Iterable,
     List,
     Mapping,
@@ -21,6 +32,8 @@ from typing import (
 import io
 import requests
 import gzip
+from pathlib import Path
+from urllib.parse import quote_plus
 
 import geopandas as gpd
 import numpy as np
@@ -28,6 +41,8 @@ import pandas as pd
 
 import censusdis.geography as cgeo
 import censusdis.maps as cmap
+from censusdis.impl.cache import UNCHANGED, CacheInfo
+from censusdis.impl.concurrency import concurrent_imap_unordered, concurrent_map
 from censusdis.impl.exceptions import CensusApiException
 from censusdis.impl.fetch import data_from_url
 from censusdis.impl.us_census_shapefiles import (
@@ -36,14 +51,19 @@ from censusdis.impl.us_census_shapefiles import (
     infer_geo_level,
     geo_query_from_data_query_inner_geo,
 )
+from censusdis.impl.metastore import SqliteMetadataStore
+from censusdis.impl.resultcache import ResultCache
 from censusdis.impl.varcache import VariableCache
 from censusdis.impl.varsource.base import VintageType
 from censusdis.impl.varsource.censusapi import CensusApiVariableSource
+from censusdis.impl.varsource.sqlite import SqliteVariableSource
 from censusdis.values import ALL_SPECIAL_VALUES
 from censusdis.datasets import ACS5, DECENNIAL_PUBLIC_LAW_94_171
 from censusdis.states import ABBREVIATIONS_FROM_IDS
 
+import censusdis.impl.concurrency
 import censusdis.impl.fetch
+import censusdis.impl.snapshot
 
 
 logger = getLogger(__name__)
@@ -96,6 +116,66 @@ together be either merging or concatenation. This is all handled in
 """
 
 
+_MAX_URL_LENGTH = 8000
+"""
+The maximum length of a URL we will send to the census API.
+
+Long lists of geographies, for example in the `ucgid` argument to
+:py:func:`~download` or a geography like `place=[...]`, can produce URLs
+longer than the servers will accept. When that happens, we split the list
+into batches that each fit within this limit, make the queries concurrently,
+and concatenate the results. See :py:func:`~_census_table_requests`.
+"""
+
+
+def _url_length(url: str, params: Mapping[str, str]) -> int:
+    """Compute the length of a URL once the parameters are encoded."""
+    return len(requests.Request("GET", url, params=params).prepare().url)
+
+
+def _batch_values(values: List[str], max_length: int) -> List[List[str]]:
+    """
+    Batch values so the encoded, comma-separated values in each batch fit.
+
+    Parameters
+    ----------
+    values
+        The values to batch.
+    max_length
+        The maximum length of each batch of values after they are
+        joined with commas and URL-encoded.
+
+    Returns
+    -------
+        The values, in the original order, broken into batches.
+    """
+    # An encoded comma.
+    separator_length = len(quote_plus(","))
+
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    batch_length = 0
+
+    for value in values:
+        value_length = len(quote_plus(value))
+        if batch:
+            value_length = value_length + separator_length
+
+        if batch and batch_length + value_length > max_length:
+            batches.append(batch)
+            batch = []
+            value_length = value_length - separator_length
+            batch_length = 0
+
+        batch.append(value)
+        batch_length = batch_length + value_length
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
 __dw_strategy_metrics = {"merge": 0, "concat": 0}
 """
 Counters for how often we use each strategy for wide tables.
@@ -114,6 +194,53 @@ def _download_wide_strategy_metrics() -> Dict[str, int]:
     return dict(**__dw_strategy_metrics)
 
 
+def _variable_groups(
+    download_variables: List[str], row_keys: Optional[List[str]] = None
+) -> List[List[str]]:
+    """
+    Divide variables into groups small enough to download in one query each.
+
+    If row keys are provided, include them in each group of variables,
+    while respecting the maximum number of variables per query.
+
+    Parameters
+    ----------
+    download_variables
+        The census variables to download.
+    row_keys
+        Variables that identify each row, if any.
+
+    Returns
+    -------
+        The groups of variables.
+    """
+    if row_keys:
+        chunk_size = _MAX_VARIABLES_PER_DOWNLOAD - len(row_keys)
+        return [
+            # black and flake8 disagree about the whitespace before ':' here...
+            # We need to drop duplicates in each chunk of variables
+            # since the row_key variables might already be present in one of the chunks
+            [
+                item
+                for item in row_keys
+                + download_variables[start : start + chunk_size]  # noqa: E203
+                if item not in row_keys
+                or row_keys.index(item)
+                == (
+                    row_keys
+                    + download_variables[start : start + chunk_size]  # noqa: E203
+                ).index(item)
+            ]
+            for start in range(0, len(download_variables), chunk_size)
+        ]
+    else:
+        return [
+            # black and flake8 disagree about the whitespace before ':' here...
+            download_variables[start : start + _MAX_VARIABLES_PER_DOWNLOAD]  # noqa: 203
+            for start in range(0, len(download_variables), _MAX_VARIABLES_PER_DOWNLOAD)
+        ]
+
+
 def _download_multiple(
     dataset: str,
     vintage: VintageType,
@@ -126,6 +253,7 @@ def _download_multiple(
     with_geometry_columns: bool,
     tiger_shapefiles_only: bool,
     row_keys: Union[str, Iterable[str]],
+    ucgid: Optional[List[str]] = None,
     **kwargs: cgeo.InSpecType,
 ) -> pd.DataFrame:
     """
@@ -184,6 +312,9 @@ def _download_multiple(
         An optional set of identifier keys to help merge together requests for more than the census API limit of
         50 variables per query. These keys are useful for census datasets such as the Current Population Survey
         where the geographic identifiers do not uniquely identify each row.
+    ucgid
+        An optional list of Uniform Census Geography Identifiers to download
+        data for instead of a geography specified in `kwargs`.
     kwargs
         A specification of the geometry that we want data for.
 
@@ -192,33 +323,8 @@ def _download_multiple(
         The full results of the query with all columns.
 
     """
-    # Divide the variables into groups. If row keys are provided, include them in each chunk of variables,
-    # while respecting the variable max
-    if row_keys:
-        chunk_size = _MAX_VARIABLES_PER_DOWNLOAD - len(row_keys)
-        variable_groups = [
-            # black and flake8 disagree about the whitespace before ':' here...
-            # We need to drop duplicates in each chunk of variables
-            # since the row_key variables might already be present in one of the chunks
-            [
-                item
-                for item in row_keys
-                + download_variables[start : start + chunk_size]  # noqa: E203
-                if item not in row_keys
-                or row_keys.index(item)
-                == (
-                    row_keys
-                    + download_variables[start : start + chunk_size]  # noqa: E203
-                ).index(item)
-            ]
-            for start in range(0, len(download_variables), chunk_size)
-        ]
-    else:
-        variable_groups = [
-            # black and flake8 disagree about the whitespace before ':' here...
-            download_variables[start : start + _MAX_VARIABLES_PER_DOWNLOAD]  # noqa: 203
-            for start in range(0, len(download_variables), _MAX_VARIABLES_PER_DOWNLOAD)
-        ]
+    # Divide the variables into groups.
+    variable_groups = _variable_groups(download_variables, row_keys)
 
     if len(variable_groups) < 2:
         raise ValueError(
@@ -227,23 +333,70 @@ def _download_multiple(
             "use download instead."
         )
 
-    # Get the data for each chunk. Note that we leave out
-    # extra geometry columns at this point. We will get them
-    # later if we need them, but they get in the way at this
-    # point.
-    dfs = [
-        download(
+    def download_group(
+        ii: int, with_geometry: bool, with_geometry_columns: bool
+    ) -> pd.DataFrame:
+        return download(
             dataset,
             vintage,
-            variable_group,
+            variable_groups[ii],
             query_filter=query_filter,
             api_key=api_key,
             variable_cache=census_variables,
-            with_geometry=with_geometry and (ii == 0),
-            with_geometry_columns=False,
+            with_geometry=with_geometry,
+            with_geometry_columns=with_geometry_columns,
+            tiger_shapefiles_only=tiger_shapefiles_only,
+            ucgid=ucgid,
             **kwargs,
         )
-        for ii, variable_group in enumerate(variable_groups)
+
+    return _combine_variable_groups(
+        variable_groups,
+        download_group,
+        with_geometry=with_geometry,
+        with_geometry_columns=with_geometry_columns,
+        row_keys=row_keys,
+    )
+
+
+def _combine_variable_groups(
+    variable_groups: List[List[str]],
+    download_group: Callable[[int, bool, bool], pd.DataFrame],
+    *,
+    with_geometry: bool,
+    with_geometry_columns: bool,
+    row_keys: Optional[List[str]],
+) -> pd.DataFrame:
+    """
+    Download each group of variables and combine the results into one wide data frame.
+
+    Parameters
+    ----------
+    variable_groups
+        The groups of variables, from :py:func:`_variable_groups`.
+    download_group
+        A function that downloads the group of variables at an index, given
+        whether to include geometry and geometry columns.
+    with_geometry
+        If `True` add geometry to the result.
+    with_geometry_columns
+        If `True` keep all the additional columns that come with shapefiles
+        downloaded to get geometry information.
+    row_keys
+        An optional set of identifier keys to help merge the groups together,
+        as in :py:func:`_download_multiple`.
+
+    Returns
+    -------
+        The full results of the query with all columns.
+    """
+    # Get the data for each chunk. Note that we leave out
+    # extra geometry columns at this point. We will get them
+    # later if we need them, but they get in the way at this
+    # point.
+    dfs = [
+        download_group(ii, with_geometry and (ii == 0), False)
+        for ii in range(len(variable_groups))
     ]
 
     # What variables came back in the first df but were not
@@ -256,18 +409,7 @@ def _download_multiple(
     # Now that we know the geometry keys, we may have to get back the other
     # geometry columns we left out the first time.
     if with_geometry and with_geometry_columns:
-        dfs[0] = download(
-            dataset,
-            vintage,
-            variable_groups[0],
-            query_filter=query_filter,
-            api_key=api_key,
-            variable_cache=census_variables,
-            with_geometry=with_geometry,
-            with_geometry_columns=with_geometry_columns,
-            tiger_shapefiles_only=tiger_shapefiles_only,
-            **kwargs,
-        )
+        dfs[0] = download_group(0, with_geometry, with_geometry_columns)
 
     # If we put in the geometry column, it's not part of the
     # key.
@@ -586,6 +728,90 @@ def download_lodes(
     return df_lodes
 
 
+_RESULT_CACHE: Optional[ResultCache] = None
+"""
+The cache of download results, if there is one.
+
+See :py:func:`set_result_cache_path`.
+"""
+
+_RESULT_CACHE_IGNORED_ARGUMENTS = {"api_key", "variable_cache"}
+"""Arguments to :py:func:`download` that do not change what it returns."""
+
+_download_state = threading.local()
+"""How deeply nested in calls to :py:func:`download` each thread is."""
+
+
+def _reiterable(value: Any) -> Any:
+    """
+    Copy an argument that can only be iterated once, like a generator, into a list.
+
+    Arguments are iterated to compute cache keys before they are used, so
+    one-shot iterables would otherwise arrive empty. Dictionaries are copied
+    value by value.
+    """
+    if isinstance(value, (str, collections.abc.Sequence, collections.abc.Set)):
+        return value
+    if isinstance(value, collections.abc.Mapping):
+        return {k: _reiterable(v) for k, v in value.items()}
+    if isinstance(value, collections.abc.Iterable):
+        return list(value)
+    return value
+
+
+def _cache_result(func):
+    """
+    Decorate :py:func:`download` so its results are kept in the result cache.
+
+    Only the outermost call in each thread is cached. Calls that `download`
+    makes to itself, for example to fetch wide tables in pieces, are
+    parts of the outer result and are not worth keeping on their own.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result_cache = _RESULT_CACHE
+        depth = getattr(_download_state, "depth", 0)
+
+        _download_state.depth = depth + 1
+        try:
+            if result_cache is None or depth > 0:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            for name, value in bound.arguments.items():
+                bound.arguments[name] = _reiterable(value)
+
+            query = {
+                name: value
+                for name, value in bound.arguments.items()
+                if name not in _RESULT_CACHE_IGNORED_ARGUMENTS
+            }
+
+            key = result_cache.key(**query)
+
+            df = result_cache.get(key)
+            if df is not None:
+                logger.info(
+                    "Loaded %s in %s from the result cache.",
+                    query["dataset"],
+                    query["vintage"],
+                )
+                return df
+
+            df = func(*bound.args, **bound.kwargs)
+            result_cache.put(key, df)
+
+            return df
+        finally:
+            _download_state.depth = depth
+
+    return wrapper
+
+
+@_cache_result
 def download(
     dataset: str,
     vintage: VintageType,
@@ -605,6 +831,7 @@ def download(
     api_key: Optional[str] = None,
     variable_cache: Optional["VariableCache"] = None,
     row_keys: Optional[Union[str, Iterable[str]]] = None,
+    ucgid: Optional[Union[str, Iterable[str]]] = None,
     **kwargs: cgeo.InSpecType,
 ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
     """
@@ -710,6 +937,14 @@ def download(
         An optional set of identifier keys to help merge together requests for more than the census API limit of
         50 variables per query. These keys are useful for census datasets such as the Current Population Survey
         where the geographic identifiers do not uniquely identify each row.
+    ucgid
+        One or more Uniform Census Geography Identifiers, for example
+        `["1400000US34013001400", "1400000US36061000100"]`, to download data
+        for. This is an efficient way to get data for a scattered set of
+        geographies of the same or different types. Long lists are split into
+        batches that are downloaded concurrently. Results will have a `UCGID`
+        column. This cannot be combined with geographic `kwargs` or
+        `with_geometry=True`.
     kwargs
         A specification of the geometry that we want data for. For example,
         `state = "*", county = "*"` will download county-level data for
@@ -718,7 +953,29 @@ def download(
     Returns
     -------
         A :py:class:`~pd.DataFrame` or `~gpd.GeoDataFrame` containing the requested US Census data.
+        If a result cache has been set with :py:func:`set_result_cache_path` and the same
+        query has been made before, the result is loaded from there.
     """
+    if ucgid is not None:
+        if isinstance(ucgid, str):
+            ucgid = [ucgid]
+        else:
+            ucgid = list(ucgid)
+
+        if kwargs:
+            raise ValueError(
+                "`ucgid` cannot be combined with geographic arguments "
+                f"{list(kwargs.keys())}. Include all the geographies in `ucgid` instead."
+            )
+        if with_geometry:
+            raise ValueError("`with_geometry=True` is not supported with `ucgid`.")
+        if download_contained_within is not None:
+            raise ValueError(
+                "`download_contained_within` is not supported with `ucgid`."
+            )
+        if dataset.startswith("lodes/"):
+            raise ValueError("`ucgid` is not supported for LODES data sets.")
+
     if dataset.startswith("lodes/"):
         # Special case for the LODES data sets, which go down a completely
         # different path.
@@ -811,6 +1068,7 @@ def download(
             with_geometry_columns=with_geometry_columns,
             tiger_shapefiles_only=tiger_shapefiles_only,
             row_keys=row_keys,
+            ucgid=ucgid,
             **kwargs,
         )
 
@@ -837,107 +1095,1270 @@ def download(
         remove_water=remove_water,
         api_key=api_key,
         variable_cache=variable_cache,
+        ucgid=ucgid,
         **string_kwargs,
     )
 
 
-def _download_remote(
-    dataset: str,
-    vintage: VintageType,
-    *,
-    download_variables: List[str],
-    set_to_nan: Union[bool, Iterable[float]] = True,
-    query_filter: Optional[Dict[str, str]] = None,
-    with_geometry: bool,
-    with_geometry_columns: bool,
-    tiger_shapefiles_only: bool,
-    remove_water: bool,
-    api_key: Optional[str],
-    variable_cache: "VariableCache",
-    **kwargs,
-) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+_DOWNLOAD_PARAMETERS = set(inspect.signature(download).parameters) - {"kwargs"}
+"""The names of the non-geographic arguments to :py:func:`download`."""
+
+
+@dataclass(frozen=True)
+class DownloadPlan:
     """
-    Make the actual remote call to download the data.
+    The plan for a call to :py:func:`download`.
 
-    This is the final step after we have parsed out and
-    validated the variables and geometry.
+    This is what :py:func:`plan_download` returns. It describes what would
+    be downloaded and how, without downloading any data. It can be used to
+    budget API calls and to estimate how much memory a download will need
+    before doing it.
+    """
 
-    Parameters
-    ----------
-    dataset
-        The dataset to download from. For example `"acs/acs5"`,
-        `"dec/pl"`, or `"timeseries/poverty/saipe/schdist"`.
-    vintage
-        The vintage to download data for. For most data sets this is
-        an integer year, for example, `2020`. But for
-        a timeseries data set, pass the string `'timeseries'`.
-    download_variables
-        The census variables to download, for example `["NAME", "B01001_001E"]`.
-    set_to_nan
-        A list of values that should be set to NaN. Normally these are special
-        values that the U.S. Census API sometimes returns. If `True`, then all
-        values in :py:ref:`censusdis.values.ALL_SPECIAL_VALUES` will be replaced.
-        If `False`, no replacements will be made.
-    query_filter
-        A dictionary of values to filter on. For example, if
-        `query_filter={'NAICS2017': '72251'}` then only rows
-        where the variable `NAICS2017` has a value of `'72251'`
-        will be returned.
+    dataset: str
+    """The data set."""
 
-        This filtering is done on the server side, not the client
-        side, so it is far more efficient than querying without a
-        query filter and then manually filtering the results.
-    with_geometry
-        If `True` a :py:class:`gpd.GeoDataFrame` will be returned and each row
-        will have a geometry that is a cartographic boundary suitable for platting
-        a map. See https://www.census.gov/geographies/mapping-files/time-series/geo/cartographic-boundary.2020.html
-        for details of the shapefiles that will be downloaded on your behalf to
-        generate these boundaries.
-    with_geometry_columns
-        If `True` keep all the additional columns that come with shapefiles
-        downloaded to get geometry information.
-    tiger_shapefiles_only
-        If `True` only look for TIGER shapefiles. If `False`, first look
-        for CB shapefiles
-        (https://www.census.gov/geographies/mapping-files/time-series/geo/carto-boundary-file.html),
-        which are more suitable for plotting maps, then fall back on the full
-        TIGER files
-        (https://www.census.gov/geographies/mapping-files/time-series/geo/tiger-line-file.html)
-        only if CB is not available. This is mainly set to `True` only
-        when `with_geometry_columns` is also set to `True`. The reason
-        is that the additional columns in the shapefiles are different
-        in the CB files than in the TIGER files.
-    api_key
-        An optional API key. If you don't have or don't use a key, the number
-        of calls you can make will be limited.
-    variable_cache
-        A cache of metadata about variables.
-    kwargs
-        A specification of the geometry that we want data for.
+    vintage: VintageType
+    """The vintage."""
 
-    Returns
-    -------
-        The downloaded variables, with or without added geometry, as
-        either a `pd.DataFrame` or `gpd.GeoDataFrame`.
+    variables: List[str]
+    """The variables, after groups and leaves of groups have been expanded."""
+
+    variable_groups: List[List[str]]
     """
-    url, params, bound_path = census_table_url(
-        dataset,
-        vintage,
-        download_variables,
-        query_filter=query_filter,
-        api_key=api_key,
-        **kwargs,
-    )
-    df_data = data_from_url(url, params)
+    The variables, divided into groups that can be downloaded in one query each.
 
-    # Coerce the types based on metadata about the variables.
-    _coerce_downloaded_variable_types(
-        dataset, vintage, download_variables, df_data, variable_cache
-    )
+    The census API allows at most 50 variables per query.
+    """
 
-    download_variables_upper = [dv.upper() for dv in download_variables]
+    strategy: str
+    """
+    How the results of the queries for each variable group are combined.
 
-    # Put the geo fields (STATE, COUNTY, etc...) that came back up front.
+    `"single"` if there is only one variable group. Otherwise `"merge_or_concat"`.
+    Wide results are merged on the geography columns (and `row_keys`, if given)
+    if they uniquely identify every row, and concatenated column-wise if not.
+    Which one happens can only be decided once the data is downloaded.
+    """
+
+    geography: Dict[str, str]
+    """
+    The geography the data is for, with a value, a comma-separated list
+    of values, or `"*"` for each component.
+    """
+
+    geo_level: Optional[str]
+    """The innermost component of the geography, or `None` if there is none."""
+
+    requests: List[Tuple[str, Mapping[str, str]]]
+    """
+    The URL and parameters of every query to the census API.
+
+    These include queries for each group of variables, each batch of a
+    long list of geographies, and, in some cases, a second query for the
+    first variable group to get extra geometry columns.
+    """
+
+    shapefiles: List[Tuple[str, str]]
+    """
+    The scope, e.g. a state or `"us"`, and geography level of each shapefile
+    needed to add geometry. Empty if `with_geometry=False`.
+    """
+
+    tiger_shapefiles_only: bool
+    """Whether only TIGER shapefiles are used, rather than trying CB ones first."""
+
+    remove_water: bool
+    """Whether water areas will be clipped out of the geometry."""
+
+    estimated_rows: Optional[int]
+    """
+    An estimate of the number of rows in the result.
+
+    This is only available when the geography has no wildcards, in which
+    case it assumes one row per geography. It is `None` otherwise.
+    """
+
+    estimated_bytes: Optional[int]
+    """
+    A rough estimate of the memory the result will use, at 8 bytes per value,
+    not counting geometry. `None` if `estimated_rows` is.
+    """
+
+    @property
+    def request_count(self) -> int:
+        """The number of queries to the census API."""
+        return len(self.requests)
+
+
+def plan_download(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: Optional[Union[str, Iterable[str]]] = None,
+    *,
+    group: Optional[Union[str, Iterable[str]]] = None,
+    leaves_of_group: Optional[Union[str, Iterable[str]]] = None,
+    skip_annotations: bool = True,
+    query_filter: Optional[Dict[str, str]] = None,
+    with_geometry: bool = False,
+    with_geometry_columns: bool = False,
+    tiger_shapefiles_only: bool = False,
+    remove_water: bool = False,
+    api_key: Optional[str] = None,
+    variable_cache: Optional["VariableCache"] = None,
+    row_keys: Optional[Union[str, Iterable[str]]] = None,
+    ucgid: Optional[Union[str, Iterable[str]]] = None,
+    **kwargs: cgeo.InSpecType,
+) -> DownloadPlan:
+    """
+    Plan a download without downloading any data.
+
+    This takes the same arguments as :py:func:`download` and works out
+    what it would do: which variables it would download, how they would be
+    split into queries, what geographies it would query, which shapefiles it
+    would need and roughly how large the result would be. Metadata on the data
+    set and its variables is fetched if it is not already cached, but no data
+    is.
+
+    See :py:func:`download` for the parameters.
+
+    Returns
+    -------
+        The plan.
+    """
+    if dataset.startswith("lodes/"):
+        raise ValueError("`plan_download` is not supported for LODES data sets.")
+
+    if isinstance(ucgid, str):
+        ucgid = [ucgid]
+    elif ucgid is not None:
+        ucgid = list(ucgid)
+
+    if variable_cache is None:
+        variable_cache = variables
+
+    if row_keys:
+        row_keys = list(row_keys)
+
+    # The side effect here is to prime the cache.
+    cgeo.geo_path_snake_specs(dataset, vintage)
+
+    kwargs = {
+        cgeo.path_component_from_snake(dataset, vintage, k): v
+        for k, v in kwargs.items()
+    }
+
+    download_variables = _parse_download_variables(
+        dataset,
+        vintage,
+        download_variables=download_variables,
+        group=group,
+        leaves_of_group=leaves_of_group,
+        skip_annotations=skip_annotations,
+        variable_cache=variable_cache,
+    )
+    _prefetch_variable_types(dataset, vintage, download_variables, variable_cache)
+
+    if len(download_variables) > _MAX_VARIABLES_PER_DOWNLOAD:
+        variable_groups = _variable_groups(download_variables, row_keys)
+        strategy = "merge_or_concat"
+    else:
+        variable_groups = [download_variables]
+        strategy = "single"
+
+    string_kwargs = {k: _gf2s(v) for k, v in kwargs.items()}
+
+    group_requests = []
+    for variable_group in variable_groups:
+        table_requests, bound_path = _census_table_requests(
+            dataset,
+            vintage,
+            variable_group,
+            query_filter=query_filter,
+            api_key=api_key,
+            ucgid=_gf2s(ucgid),
+            **string_kwargs,
+        )
+        group_requests.append(table_requests)
+
+    requests = [
+        request for table_requests in group_requests for request in table_requests
+    ]
+
+    if with_geometry and with_geometry_columns and len(variable_groups) > 1:
+        # The first group is downloaded again to get the geometry columns.
+        requests.extend(group_requests[0])
+
+    path = bound_path.path_spec.path
+    geography = {component: _gf2s(bound_path.bindings[component]) for component in path}
+    geo_level = path[-1] if path else None
+
+    shapefiles = []
+    if with_geometry and geo_level is not None:
+        shapefile_scope, shapefile_geo_level, _, _ = (
+            geo_query_from_data_query_inner_geo(vintage, geo_level)
+        )
+        if shapefile_scope is None:
+            shapefile_scope = geography[path[0]]
+        shapefiles = [
+            (sub_scope, shapefile_geo_level) for sub_scope in shapefile_scope.split(",")
+        ]
+
+    if ucgid is not None:
+        estimated_rows = len(ucgid)
+    elif "*" in geography.values():
+        estimated_rows = None
+    else:
+        estimated_rows = int(
+            np.prod([len(value.split(",")) for value in geography.values()])
+        )
+
+    estimated_bytes = (
+        None
+        if estimated_rows is None
+        else estimated_rows * (len(download_variables) + len(path)) * 8
+    )
+
+    return DownloadPlan(
+        dataset=dataset,
+        vintage=vintage,
+        variables=download_variables,
+        variable_groups=variable_groups,
+        strategy=strategy,
+        geography=geography,
+        geo_level=geo_level,
+        requests=requests,
+        shapefiles=shapefiles,
+        tiger_shapefiles_only=tiger_shapefiles_only,
+        remove_water=with_geometry and remove_water,
+        estimated_rows=estimated_rows,
+        estimated_bytes=estimated_bytes,
+    )
+
+
+_DOWNLOAD_MANY_RESERVED_ARGUMENTS = {"api_key", "variable_cache"}
+"""Arguments to :py:func:`download` that :py:func:`download_many` takes once for all specs."""
+
+
+def _select_spec_columns(
+    df: Union[pd.DataFrame, gpd.GeoDataFrame],
+    query_variables: List[str],
+    spec_variables: List[str],
+) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    """
+    Select the columns one spec asked for from the result of a query that served several.
+
+    The geography and any other columns are kept where they are, and the
+    query's variables are replaced with the spec's in the order it asked for them.
+    """
+    query_columns = {variable.upper() for variable in query_variables}
+    spec_columns = [variable.upper() for variable in spec_variables]
+
+    columns = []
+    for column in df.columns:
+        if column not in query_columns:
+            columns.append(column)
+        elif spec_columns:
+            # Put the spec's variables where the query's were.
+            columns.extend(spec_columns)
+            spec_columns = []
+
+    return df[columns].copy()
+
+
+class _QueryCombiner:
+    """
+    Combine download specs into as few queries to the census API as possible.
+
+    This is the machinery behind :py:func:`download_many`. Specs are added one
+    at a time, so callers that need to handle a bad spec on its own, like the
+    CLI's `batch` command, can catch errors for each of them.
+    """
+
+    def __init__(self, variable_cache: "VariableCache"):
+        self._variable_cache = variable_cache
+
+        # Each query is (dataset, vintage, variables, arguments, geography).
+        self.queries: List[
+            Tuple[str, VintageType, List[str], Dict[str, Any], Dict[str, str]]
+        ] = []
+        # Queries with the same arguments and geography, by key, and the variables
+        # each has so far.
+        self._combinable_queries: Dict[str, List[Tuple[int, List[str]]]] = {}
+        # The variables of each data set and vintage, for prefetching.
+        self._all_variables: Dict[Tuple[str, VintageType], Dict[str, None]] = {}
+
+    def add(self, spec: Mapping[str, Any]) -> Tuple[int, Optional[List[str]]]:
+        """
+        Add a spec.
+
+        Returns
+        -------
+            The index of the query that will serve it, and the variables
+            it asked for, or `None` if the query serves it alone.
+        """
+        spec = dict(spec)
+
+        reserved = _DOWNLOAD_MANY_RESERVED_ARGUMENTS.intersection(spec)
+        if reserved:
+            raise ValueError(
+                f"Pass {sorted(reserved)} to `download_many`, not in individual specs."
+            )
+
+        dataset = spec.pop("dataset")
+        vintage = spec.pop("vintage")
+        download_variables = spec.pop("download_variables", None)
+
+        arguments = {k: v for k, v in spec.items() if k in _DOWNLOAD_PARAMETERS}
+        geography = {k: v for k, v in spec.items() if k not in _DOWNLOAD_PARAMETERS}
+
+        if dataset.startswith("lodes/"):
+            # These don't come from the census API, so there is nothing to combine.
+            self.queries.append(
+                (dataset, vintage, download_variables, arguments, geography)
+            )
+            return len(self.queries) - 1, None
+
+        # The side effect here is to prime the cache.
+        cgeo.geo_path_snake_specs(dataset, vintage)
+
+        geography = {
+            cgeo.path_component_from_snake(dataset, vintage, k): _gf2s(v)
+            for k, v in geography.items()
+        }
+
+        spec_variables = _parse_download_variables(
+            dataset,
+            vintage,
+            download_variables=download_variables,
+            group=arguments.pop("group", None),
+            leaves_of_group=arguments.pop("leaves_of_group", None),
+            skip_annotations=arguments.pop("skip_annotations", True),
+            variable_cache=self._variable_cache,
+        )
+
+        self._all_variables.setdefault((dataset, vintage), {}).update(
+            dict.fromkeys(spec_variables)
+        )
+
+        if len(spec_variables) > _MAX_VARIABLES_PER_DOWNLOAD:
+            # Too wide to combine with anything else.
+            self.queries.append(
+                (dataset, vintage, spec_variables, arguments, geography)
+            )
+            return len(self.queries) - 1, spec_variables
+
+        key = ResultCache.key(
+            dataset=dataset, vintage=vintage, arguments=arguments, geography=geography
+        )
+
+        # Find a query we can add the variables to and still be
+        # within the limit.
+        for query_index, query_variables in self._combinable_queries.setdefault(
+            key, []
+        ):
+            combined_variables = list(dict.fromkeys(query_variables + spec_variables))
+            if len(combined_variables) <= _MAX_VARIABLES_PER_DOWNLOAD:
+                query_variables[:] = combined_variables
+                break
+        else:
+            query_index = len(self.queries)
+            query_variables = list(spec_variables)
+            self._combinable_queries[key].append((query_index, query_variables))
+            self.queries.append(
+                (dataset, vintage, query_variables, arguments, geography)
+            )
+
+        return query_index, spec_variables
+
+    def prefetch(self) -> None:
+        """Fetch metadata on all the variables of all the specs in bulk."""
+        for (dataset, vintage), names in self._all_variables.items():
+            self._variable_cache.prefetch(dataset, vintage, names)
+
+    def download(
+        self, query_index: int, *, api_key: Optional[str] = None
+    ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+        """Run one of the combined queries."""
+        dataset, vintage, query_variables, arguments, geography = self.queries[
+            query_index
+        ]
+        return download(
+            dataset,
+            vintage,
+            query_variables,
+            api_key=api_key,
+            variable_cache=self._variable_cache,
+            **arguments,
+            **geography,
+        )
+
+    def spec_result(
+        self,
+        query_index: int,
+        spec_variables: Optional[List[str]],
+        df: Union[pd.DataFrame, gpd.GeoDataFrame],
+    ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+        """Get the result for one spec from the result of the query that served it."""
+        if spec_variables is None:
+            return df.copy()
+
+        return _select_spec_columns(df, self.queries[query_index][2], spec_variables)
+
+
+def download_many(
+    specs: Iterable[Mapping[str, Any]],
+    *,
+    api_key: Optional[str] = None,
+    variable_cache: Optional["VariableCache"] = None,
+    workers: Optional[int] = None,
+) -> List[Union[pd.DataFrame, gpd.GeoDataFrame]]:
+    """
+    Download the data for many queries at once.
+
+    This is for applications, like report generators, that need many
+    overlapping pieces of data. Rather than calling :py:func:`download` for
+    each of them, pass them all here. Queries that differ only in the variables
+    they ask for are combined into as few queries to the census API as the
+    limit of 50 variables per query allows, so identical and overlapping queries
+    are only made once. Metadata on all the variables is fetched in bulk up
+    front, and the combined queries are run concurrently.
+
+    Parameters
+    ----------
+    specs
+        The queries. Each is a dictionary of arguments to :py:func:`download`,
+        including `"dataset"`, `"vintage"` and the geography, for example
+        `{"dataset": ACS5, "vintage": 2022, "download_variables": ["B01003_001E"],
+        "state": "34", "county": "*"}`.
+    api_key
+        An optional API key, used for all the queries.
+    variable_cache
+        A cache of metadata about variables.
+    workers
+        The most queries to run at once. If `None`, use the value set with
+        :py:func:`set_max_workers`.
+
+    Returns
+    -------
+        The results for each spec, in the same order as `specs`. Each has the
+        columns :py:func:`download` would have returned for it.
+    """
+    if variable_cache is None:
+        variable_cache = variables
+
+    combiner = _QueryCombiner(variable_cache)
+
+    spec_queries = [combiner.add(spec) for spec in specs]
+
+    logger.info(
+        "Downloading %d specs with %d queries.",
+        len(spec_queries),
+        len(combiner.queries),
+    )
+
+    combiner.prefetch()
+
+    results = concurrent_map(
+        lambda query_index: combiner.download(query_index, api_key=api_key),
+        range(len(combiner.queries)),
+        workers,
+    )
+
+    return [
+        combiner.spec_result(query_index, spec_variables, results[query_index])
+        for query_index, spec_variables in spec_queries
+    ]
+
+
+class CompiledQuery:
+    """
+    A query that has been prepared once to be run for many geographies.
+
+    Construct these with :py:func:`compile_query`. All the work
+    :py:func:`download` does before it makes any requests for data, such as
+    expanding groups into variables, checking that the variables exist and
+    looking up what types to give them, is done once, when the query is
+    compiled. What is left to do on each call to :py:meth:`execute` is make
+    the requests and process the results.
+    """
+
+    def __init__(
+        self,
+        dataset: str,
+        vintage: VintageType,
+        download_variables: List[str],
+        *,
+        set_to_nan: Union[bool, Iterable[int]],
+        query_filter: Optional[Dict[str, str]],
+        with_geometry: bool,
+        with_geometry_columns: bool,
+        tiger_shapefiles_only: bool,
+        remove_water: bool,
+        api_key: Optional[str],
+        variable_cache: "VariableCache",
+        row_keys: Optional[List[str]],
+    ):
+        """
+        Construct a compiled query.
+
+        Users will normally construct these with :py:func:`compile_query`.
+        """
+        self._dataset = dataset
+        self._vintage = vintage
+        self._download_variables = download_variables
+        self._set_to_nan = ALL_SPECIAL_VALUES if set_to_nan is True else set_to_nan
+        self._query_filter = query_filter
+        self._with_geometry = with_geometry
+        self._with_geometry_columns = with_geometry_columns
+        self._tiger_shapefiles_only = tiger_shapefiles_only
+        self._remove_water = remove_water
+        self._api_key = api_key
+        self._variable_cache = variable_cache
+        self._row_keys = row_keys
+
+        # Queries for more variables than the API allows in one request are
+        # split into groups, each with its own request and type coercion.
+        if len(download_variables) > _MAX_VARIABLES_PER_DOWNLOAD:
+            self._variable_groups = _variable_groups(download_variables, row_keys)
+        else:
+            self._variable_groups = [download_variables]
+
+        self._dtype_plans = [
+            _dtype_plan(dataset, vintage, variable_group, variable_cache)
+            for variable_group in self._variable_groups
+        ]
+
+    @property
+    def dataset(self) -> str:
+        """The data set."""
+        return self._dataset
+
+    @property
+    def vintage(self) -> VintageType:
+        """The vintage."""
+        return self._vintage
+
+    @property
+    def variables(self) -> List[str]:
+        """The variables, after groups and leaves of groups have been expanded."""
+        return list(self._download_variables)
+
+    def execute(
+        self,
+        *,
+        ucgid: Optional[Union[str, Iterable[str]]] = None,
+        **kwargs: cgeo.InSpecType,
+    ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+        """
+        Run the query for a geography.
+
+        Parameters
+        ----------
+        ucgid
+            One or more Uniform Census Geography Identifiers to download
+            data for, as in :py:func:`download`.
+        kwargs
+            A specification of the geometry that we want data for. For example,
+            `state = "34", county = "*"` will download data for every county
+            in New Jersey.
+
+        Returns
+        -------
+            A :py:class:`~pd.DataFrame` or `~gpd.GeoDataFrame` containing the requested US Census data.
+        """
+        if isinstance(ucgid, str):
+            ucgid = [ucgid]
+        elif ucgid is not None:
+            ucgid = list(ucgid)
+
+        if ucgid is not None:
+            if kwargs:
+                raise ValueError(
+                    "`ucgid` cannot be combined with geographic arguments "
+                    f"{list(kwargs.keys())}. Include all the geographies in `ucgid` instead."
+                )
+            if self._with_geometry:
+                raise ValueError("`with_geometry=True` is not supported with `ucgid`.")
+
+        kwargs = {
+            cgeo.path_component_from_snake(self._dataset, self._vintage, k): v
+            for k, v in kwargs.items()
+        }
+
+        string_kwargs = {k: _gf2s(v) for k, v in kwargs.items()}
+
+        def download_group(
+            ii: int, with_geometry: bool, with_geometry_columns: bool
+        ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+            return _download_remote(
+                self._dataset,
+                self._vintage,
+                download_variables=self._variable_groups[ii],
+                set_to_nan=self._set_to_nan,
+                query_filter=self._query_filter,
+                with_geometry=with_geometry,
+                with_geometry_columns=with_geometry_columns,
+                tiger_shapefiles_only=self._tiger_shapefiles_only,
+                remove_water=self._remove_water,
+                api_key=self._api_key,
+                variable_cache=self._variable_cache,
+                ucgid=ucgid,
+                dtype_plan=self._dtype_plans[ii],
+                **string_kwargs,
+            )
+
+        if len(self._variable_groups) > 1:
+            return _combine_variable_groups(
+                self._variable_groups,
+                download_group,
+                with_geometry=self._with_geometry,
+                with_geometry_columns=self._with_geometry_columns,
+                row_keys=self._row_keys,
+            )
+
+        return download_group(0, self._with_geometry, self._with_geometry_columns)
+
+    def execute_many(
+        self,
+        geographies: Iterable[Mapping[str, cgeo.InSpecType]],
+        workers: Optional[int] = None,
+    ) -> List[Union[pd.DataFrame, gpd.GeoDataFrame]]:
+        """
+        Run the query for many geographies concurrently.
+
+        Parameters
+        ----------
+        geographies
+            The geographies, each a dictionary of the arguments to :py:meth:`execute`.
+            For example, `[{"state": "34", "county": "*"}, {"state": "36", "county": "*"}]`.
+        workers
+            The most queries to run at once. If `None`, use the value set with
+            :py:func:`set_max_workers`.
+
+        Returns
+        -------
+            The results for each geography, in the same order as `geographies`.
+        """
+        return concurrent_map(
+            lambda geography: self.execute(**geography), geographies, workers
+        )
+
+
+def compile_query(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: Optional[Union[str, Iterable[str]]] = None,
+    *,
+    group: Optional[Union[str, Iterable[str]]] = None,
+    leaves_of_group: Optional[Union[str, Iterable[str]]] = None,
+    set_to_nan: Union[bool, Iterable[int]] = True,
+    skip_annotations: bool = True,
+    query_filter: Optional[Dict[str, str]] = None,
+    with_geometry: bool = False,
+    with_geometry_columns: bool = False,
+    tiger_shapefiles_only: bool = False,
+    remove_water: bool = False,
+    api_key: Optional[str] = None,
+    variable_cache: Optional["VariableCache"] = None,
+    row_keys: Optional[Union[str, Iterable[str]]] = None,
+) -> CompiledQuery:
+    """
+    Prepare a query to be run for many different geographies.
+
+    This is useful when the same variables are downloaded again and again for
+    different geographies, as in a service that answers queries about any
+    place a user asks about. The work of resolving and checking variables is
+    done once, here. Then :py:meth:`CompiledQuery.execute` runs the query for
+    one geography and :py:meth:`CompiledQuery.execute_many` runs it for many
+    geographies concurrently. The results are the same as calling
+    :py:func:`download` with the same arguments and geography.
+
+    The arguments are those of :py:func:`download`, except for the geography.
+
+    Returns
+    -------
+        The compiled query.
+    """
+    if dataset.startswith("lodes/"):
+        raise ValueError("`compile_query` is not supported for LODES data sets.")
+
+    if variable_cache is None:
+        variable_cache = variables
+
+    if row_keys:
+        row_keys = list(row_keys)
+
+    # The side effect here is to prime the cache.
+    cgeo.geo_path_snake_specs(dataset, vintage)
+
+    download_variables = _parse_download_variables(
+        dataset,
+        vintage,
+        download_variables=download_variables,
+        group=group,
+        leaves_of_group=leaves_of_group,
+        skip_annotations=skip_annotations,
+        variable_cache=variable_cache,
+    )
+
+    _prefetch_variable_types(dataset, vintage, download_variables, variable_cache)
+    if row_keys:
+        _prefetch_variable_types(dataset, vintage, row_keys, variable_cache)
+
+    return CompiledQuery(
+        dataset,
+        vintage,
+        download_variables,
+        set_to_nan=set_to_nan,
+        query_filter=query_filter,
+        with_geometry=with_geometry,
+        with_geometry_columns=with_geometry_columns,
+        tiger_shapefiles_only=tiger_shapefiles_only,
+        remove_water=remove_water,
+        api_key=api_key,
+        variable_cache=variable_cache,
+        row_keys=row_keys,
+    )
+
+
+def _geography_chunks(
+    dataset: str,
+    vintage: VintageType,
+    chunk_by: Optional[str],
+    *,
+    api_key: Optional[str] = None,
+    **kwargs: cgeo.InSpecType,
+) -> List[Dict[str, cgeo.InSpecType]]:
+    """
+    Split the geography of a query into one geography per value of one component.
+
+    For example, `state="*", county="*", tract="*"` chunked by `"state"` becomes
+    one geography per state, each with `county="*", tract="*"`.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to download from.
+    vintage
+        The vintage to download data for.
+    chunk_by
+        The component of the geography to split on. It must be part of the
+        path the geography matches. If `None`, use the first component
+        of the path.
+    api_key
+        An optional API key, used if we have to query for the values of
+        wildcards in the geography.
+    kwargs
+        The geography to split, with keys already converted from snake case.
+
+    Returns
+    -------
+        The geographies, which together cover the geography we started with.
+    """
+    bound_path = _bind_path_if_possible(dataset, vintage, **kwargs)
+    path = bound_path.path_spec.path
+
+    if not path:
+        # Nothing to split, e.g. for the whole US in a data set with no geography.
+        return [kwargs]
+
+    if chunk_by is None:
+        chunk_by = path[0]
+    elif chunk_by not in path:
+        raise ValueError(
+            f"Cannot chunk by {chunk_by}. It is not part of the geography {path}."
+        )
+
+    prefix = path[: path.index(chunk_by) + 1]
+    prefix_bindings = {
+        component: _gf2s(bound_path.bindings[component]) for component in prefix
+    }
+
+    if "*" in prefix_bindings.values():
+        # We have to ask what the wildcards match.
+        df_prefix = download(
+            dataset, vintage, ["NAME"], api_key=api_key, **prefix_bindings
+        )
+        prefix_columns = [component.replace(" ", "_").upper() for component in prefix]
+        chunks = [
+            dict(zip(prefix, values))
+            for values in df_prefix[prefix_columns].itertuples(index=False, name=None)
+        ]
+    else:
+        chunks = [
+            dict(zip(prefix, values))
+            for values in itertools.product(
+                *(value.split(",") for value in prefix_bindings.values())
+            )
+        ]
+
+    return [{**kwargs, **chunk} for chunk in chunks]
+
+
+def _plan_chunks(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: Optional[Union[str, Iterable[str]]],
+    *,
+    chunk_by: Optional[str],
+    group: Optional[Union[str, Iterable[str]]],
+    leaves_of_group: Optional[Union[str, Iterable[str]]],
+    skip_annotations: bool,
+    api_key: Optional[str],
+    variable_cache: "VariableCache",
+    **kwargs: cgeo.InSpecType,
+) -> Tuple[List[str], List[Dict[str, str]]]:
+    """
+    Work out the variables and the geography of each chunk of a chunked download.
+
+    The variables are resolved and checked once, up front, rather than
+    once per chunk.
+
+    Returns
+    -------
+        The variables to download and the geography of each chunk, with
+        multiple values joined into comma-separated strings.
+    """
+    # The side effect here is to prime the cache.
+    cgeo.geo_path_snake_specs(dataset, vintage)
+
+    kwargs = {
+        cgeo.path_component_from_snake(dataset, vintage, k): v
+        for k, v in kwargs.items()
+    }
+    if chunk_by is not None:
+        chunk_by = cgeo.path_component_from_snake(dataset, vintage, chunk_by)
+
+    download_variables = _parse_download_variables(
+        dataset,
+        vintage,
+        download_variables=download_variables,
+        group=group,
+        leaves_of_group=leaves_of_group,
+        skip_annotations=skip_annotations,
+        variable_cache=variable_cache,
+    )
+    _prefetch_variable_types(dataset, vintage, download_variables, variable_cache)
+
+    chunks = _geography_chunks(dataset, vintage, chunk_by, api_key=api_key, **kwargs)
+
+    return download_variables, [
+        {k: _gf2s(v) for k, v in chunk.items()} for chunk in chunks
+    ]
+
+
+def iter_download(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: Optional[Union[str, Iterable[str]]] = None,
+    *,
+    chunk_by: Optional[str] = None,
+    group: Optional[Union[str, Iterable[str]]] = None,
+    leaves_of_group: Optional[Union[str, Iterable[str]]] = None,
+    set_to_nan: Union[bool, Iterable[int]] = True,
+    skip_annotations: bool = True,
+    query_filter: Optional[Dict[str, str]] = None,
+    with_geometry: bool = False,
+    with_geometry_columns: bool = False,
+    tiger_shapefiles_only: bool = False,
+    remove_water: bool = False,
+    api_key: Optional[str] = None,
+    variable_cache: Optional["VariableCache"] = None,
+    row_keys: Optional[Union[str, Iterable[str]]] = None,
+    workers: Optional[int] = None,
+    **kwargs: cgeo.InSpecType,
+) -> Generator[Union[pd.DataFrame, gpd.GeoDataFrame], None, None]:
+    """
+    Download data from the US Census API in chunks.
+
+    This is like :py:func:`download`, but instead of returning one data frame
+    with all the results, it splits the geography into chunks, one for each
+    value of one of the components of the geography, such as one for each state,
+    downloads them concurrently, and yields each chunk as soon as it is ready.
+    Only a few chunks are ever in memory at once, so this can be used to write
+    very large results, like every block in the country, to files or databases
+    without ever holding all of it in memory.
+
+    Chunks are yielded in the order they finish downloading, not any particular
+    order of geography. Each has the geography columns that identify its rows,
+    so concatenating all of them gives the same rows :py:func:`download` would
+    return.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to download from. For example `"acs/acs5"`.
+    vintage
+        The vintage to download data for. For example, `2020`.
+    download_variables
+        The census variables to download, for example `["NAME", "B01001_001E"]`.
+    chunk_by
+        The component of the geography to split on, for example `"state"` or
+        `"county"`. Wildcards for it, or for any component above it, are
+        resolved with a query for the names of the geographies they match. If
+        `None`, split on the first component of the geography, which is usually
+        the state.
+    workers
+        The most chunks to download at once. If `None`, use the value set with
+        :py:func:`set_max_workers`.
+    kwargs
+        A specification of the geometry that we want data for. For example,
+        `state = "*", county = "*", block="*"` with `chunk_by="state"` will
+        download block-level data for the entire US one state at a time.
+
+    See :py:func:`download` for the other parameters.
+
+    Returns
+    -------
+        A generator of :py:class:`~pd.DataFrame` or `~gpd.GeoDataFrame`
+        chunks of the requested US Census data.
+    """
+    if dataset.startswith("lodes/"):
+        raise ValueError("`iter_download` is not supported for LODES data sets.")
+
+    if variable_cache is None:
+        variable_cache = variables
+
+    download_variables, chunks = _plan_chunks(
+        dataset,
+        vintage,
+        download_variables,
+        chunk_by=chunk_by,
+        group=group,
+        leaves_of_group=leaves_of_group,
+        skip_annotations=skip_annotations,
+        api_key=api_key,
+        variable_cache=variable_cache,
+        **kwargs,
+    )
+
+    def download_chunk(
+        chunk_kwargs: Dict[str, cgeo.InSpecType]
+    ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+        return download(
+            dataset,
+            vintage,
+            download_variables,
+            set_to_nan=set_to_nan,
+            query_filter=query_filter,
+            with_geometry=with_geometry,
+            with_geometry_columns=with_geometry_columns,
+            tiger_shapefiles_only=tiger_shapefiles_only,
+            remove_water=remove_water,
+            api_key=api_key,
+            variable_cache=variable_cache,
+            row_keys=row_keys,
+            **chunk_kwargs,
+        )
+
+    return concurrent_imap_unordered(download_chunk, chunks, workers)
+
+
+_CHECKPOINT_MANIFEST = "manifest.json"
+"""The name of the file that tracks the progress of :py:func:`download_resumable`."""
+
+
+def _write_checkpoint_manifest(checkpoint_dir: Path, manifest: Dict) -> None:
+    """Write a manifest so that it is never seen half written."""
+    manifest_path = checkpoint_dir / _CHECKPOINT_MANIFEST
+    tmp_path = manifest_path.with_name(f"{manifest_path.name}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1))
+    tmp_path.replace(manifest_path)
+
+
+def download_resumable(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: Optional[Union[str, Iterable[str]]] = None,
+    *,
+    checkpoint_dir: Union[str, Path],
+    chunk_by: Optional[str] = None,
+    group: Optional[Union[str, Iterable[str]]] = None,
+    leaves_of_group: Optional[Union[str, Iterable[str]]] = None,
+    set_to_nan: Union[bool, Iterable[int]] = True,
+    skip_annotations: bool = True,
+    query_filter: Optional[Dict[str, str]] = None,
+    with_geometry: bool = False,
+    with_geometry_columns: bool = False,
+    tiger_shapefiles_only: bool = False,
+    remove_water: bool = False,
+    api_key: Optional[str] = None,
+    variable_cache: Optional["VariableCache"] = None,
+    row_keys: Optional[Union[str, Iterable[str]]] = None,
+    workers: Optional[int] = None,
+    remove_checkpoints: bool = False,
+    **kwargs: cgeo.InSpecType,
+) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    """
+    Download data from the US Census API in chunks that are saved as they complete.
+
+    This is for very large downloads that take many requests, like every block
+    in every county in the country. The geography is split into chunks just
+    as in :py:func:`iter_download`. A manifest of the chunks is written to
+    `checkpoint_dir`, and each chunk is saved there as soon as it is downloaded.
+    If the download fails or is interrupted, calling this again with the same
+    arguments picks up where it left off, downloading only the chunks that
+    are not already saved.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to download from. For example `"acs/acs5"`.
+    vintage
+        The vintage to download data for. For example, `2020`.
+    download_variables
+        The census variables to download, for example `["NAME", "B01001_001E"]`.
+    checkpoint_dir
+        The directory to keep the manifest and the chunks in. It is created if
+        it does not exist. It should not be shared with any other download.
+    chunk_by
+        The component of the geography to split on, as in :py:func:`iter_download`.
+    workers
+        The most chunks to download at once. If `None`, use the value set with
+        :py:func:`set_max_workers`.
+    remove_checkpoints
+        If `True`, remove the manifest and chunks once the download is complete.
+    kwargs
+        A specification of the geometry that we want data for.
+
+    See :py:func:`download` for the other parameters.
+
+    Returns
+    -------
+        A :py:class:`~pd.DataFrame` or `~gpd.GeoDataFrame` containing the requested US Census data.
+    """
+    if dataset.startswith("lodes/"):
+        raise ValueError("`download_resumable` is not supported for LODES data sets.")
+
+    if variable_cache is None:
+        variable_cache = variables
+
+    checkpoint_dir = Path(checkpoint_dir)
+    chunk_cache = ResultCache(checkpoint_dir)
+
+    # These are used for the key and then again for every chunk.
+    download_variables = _reiterable(download_variables)
+    group = _reiterable(group)
+    leaves_of_group = _reiterable(leaves_of_group)
+    set_to_nan = _reiterable(set_to_nan)
+    row_keys = _reiterable(row_keys)
+    kwargs = _reiterable(kwargs)
+
+    # Identifies the download, so we don't resume one with another's chunks.
+    query_key = ResultCache.key(
+        dataset=dataset,
+        vintage=vintage,
+        download_variables=download_variables,
+        chunk_by=chunk_by,
+        group=group,
+        leaves_of_group=leaves_of_group,
+        set_to_nan=set_to_nan,
+        skip_annotations=skip_annotations,
+        query_filter=query_filter,
+        with_geometry=with_geometry,
+        with_geometry_columns=with_geometry_columns,
+        tiger_shapefiles_only=tiger_shapefiles_only,
+        remove_water=remove_water,
+        row_keys=row_keys,
+        kwargs=kwargs,
+    )
+
+    manifest_path = checkpoint_dir / _CHECKPOINT_MANIFEST
+
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest["query"] != query_key:
+            raise ValueError(
+                f"The checkpoint directory {checkpoint_dir} holds a different "
+                "download. Use a new directory or remove its contents."
+            )
+        logger.info(
+            "Resuming download with %d of %d chunks complete.",
+            sum(chunk["done"] for chunk in manifest["chunks"]),
+            len(manifest["chunks"]),
+        )
+    else:
+        resolved_variables, chunks = _plan_chunks(
+            dataset,
+            vintage,
+            download_variables,
+            chunk_by=chunk_by,
+            group=group,
+            leaves_of_group=leaves_of_group,
+            skip_annotations=skip_annotations,
+            api_key=api_key,
+            variable_cache=variable_cache,
+            **kwargs,
+        )
+        manifest = {
+            "query": query_key,
+            "download_variables": resolved_variables,
+            "chunks": [{"geography": chunk, "done": False} for chunk in chunks],
+        }
+        _write_checkpoint_manifest(checkpoint_dir, manifest)
+
+    def chunk_key(ii: int) -> str:
+        return f"chunk-{ii:06d}"
+
+    def download_chunk(ii: int) -> Tuple[int, Union[pd.DataFrame, gpd.GeoDataFrame]]:
+        return ii, download(
+            dataset,
+            vintage,
+            manifest["download_variables"],
+            set_to_nan=set_to_nan,
+            query_filter=query_filter,
+            with_geometry=with_geometry,
+            with_geometry_columns=with_geometry_columns,
+            tiger_shapefiles_only=tiger_shapefiles_only,
+            remove_water=remove_water,
+            api_key=api_key,
+            variable_cache=variable_cache,
+            row_keys=row_keys,
+            **manifest["chunks"][ii]["geography"],
+        )
+
+    missing = [
+        ii
+        for ii, chunk in enumerate(manifest["chunks"])
+        if not (chunk["done"] and chunk_key(ii) in chunk_cache)
+    ]
+
+    for ii, df_chunk in concurrent_imap_unordered(download_chunk, missing, workers):
+        if not chunk_cache.put(chunk_key(ii), df_chunk):
+            raise ValueError(
+                f"Unable to save chunk {manifest['chunks'][ii]['geography']} "
+                f"in {checkpoint_dir}."
+            )
+        manifest["chunks"][ii]["done"] = True
+        _write_checkpoint_manifest(checkpoint_dir, manifest)
+
+    if not manifest["chunks"]:
+        # The geography matched nothing.
+        return pd.DataFrame()
+
+    df = pd.concat(
+        [chunk_cache.get(chunk_key(ii)) for ii in range(len(manifest["chunks"]))],
+        ignore_index=True,
+    )
+
+    if remove_checkpoints:
+        chunk_cache.clear()
+        manifest_path.unlink()
+
+    return df
+
+
+def _download_remote(
+    dataset: str,
+    vintage: VintageType,
+    *,
+    download_variables: List[str],
+    set_to_nan: Union[bool, Iterable[float]] = True,
+    query_filter: Optional[Dict[str, str]] = None,
+    with_geometry: bool,
+    with_geometry_columns: bool,
+    tiger_shapefiles_only: bool,
+    remove_water: bool,
+    api_key: Optional[str],
+    variable_cache: "VariableCache",
+    ucgid: Optional[List[str]] = None,
+    dtype_plan: Optional[Dict[str, str]] = None,
+    **kwargs,
+) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    """
+    Make the actual remote call to download the data.
+
+    This is the final step after we have parsed out and
+    validated the variables and geometry.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to download from. For example `"acs/acs5"`,
+        `"dec/pl"`, or `"timeseries/poverty/saipe/schdist"`.
+    vintage
+        The vintage to download data for. For most data sets this is
+        an integer year, for example, `2020`. But for
+        a timeseries data set, pass the string `'timeseries'`.
+    download_variables
+        The census variables to download, for example `["NAME", "B01001_001E"]`.
+    set_to_nan
+        A list of values that should be set to NaN. Normally these are special
+        values that the U.S. Census API sometimes returns. If `True`, then all
+        values in :py:ref:`censusdis.values.ALL_SPECIAL_VALUES` will be replaced.
+        If `False`, no replacements will be made.
+    query_filter
+        A dictionary of values to filter on. For example, if
+        `query_filter={'NAICS2017': '72251'}` then only rows
+        where the variable `NAICS2017` has a value of `'72251'`
+        will be returned.
+
+        This filtering is done on the server side, not the client
+        side, so it is far more efficient than querying without a
+        query filter and then manually filtering the results.
+    with_geometry
+        If `True` a :py:class:`gpd.GeoDataFrame` will be returned and each row
+        will have a geometry that is a cartographic boundary suitable for platting
+        a map. See https://www.census.gov/geographies/mapping-files/time-series/geo/cartographic-boundary.2020.html
+        for details of the shapefiles that will be downloaded on your behalf to
+        generate these boundaries.
+    with_geometry_columns
+        If `True` keep all the additional columns that come with shapefiles
+        downloaded to get geometry information.
+    tiger_shapefiles_only
+        If `True` only look for TIGER shapefiles. If `False`, first look
+        for CB shapefiles
+        (https://www.census.gov/geographies/mapping-files/time-series/geo/carto-boundary-file.html),
+        which are more suitable for plotting maps, then fall back on the full
+        TIGER files
+        (https://www.census.gov/geographies/mapping-files/time-series/geo/tiger-line-file.html)
+        only if CB is not available. This is mainly set to `True` only
+        when `with_geometry_columns` is also set to `True`. The reason
+        is that the additional columns in the shapefiles are different
+        in the CB files than in the TIGER files.
+    api_key
+        An optional API key. If you don't have or don't use a key, the number
+        of calls you can make will be limited.
+    variable_cache
+        A cache of metadata about variables.
+    ucgid
+        An optional list of Uniform Census Geography Identifiers to download
+        data for instead of a geography specified in `kwargs`.
+    dtype_plan
+        The types to coerce the variables to, from :py:func:`_dtype_plan`.
+        If `None`, they are looked up in `variable_cache`.
+    kwargs
+        A specification of the geometry that we want data for.
+
+    Returns
+    -------
+        The downloaded variables, with or without added geometry, as
+        either a `pd.DataFrame` or `gpd.GeoDataFrame`.
+    """
+    table_requests, bound_path = _census_table_requests(
+        dataset,
+        vintage,
+        download_variables,
+        query_filter=query_filter,
+        api_key=api_key,
+        ucgid=_gf2s(ucgid),
+        **kwargs,
+    )
+
+    df_data = pd.concat(
+        concurrent_map(lambda request: data_from_url(*request), table_requests),
+        ignore_index=True,
+    )
+
+    # Coerce the types based on metadata about the variables.
+    _coerce_downloaded_variable_types(
+        dataset, vintage, download_variables, df_data, variable_cache, dtype_plan
+    )
+
+    download_variables_upper = [dv.upper() for dv in download_variables]
+
+    # Put the geo fields (STATE, COUNTY, etc...) that came back up front.
     df_data = df_data[
         [col for col in df_data.columns if col not in download_variables_upper]
         + download_variables_upper
@@ -971,17 +2392,64 @@ def _download_remote(
     return df_data
 
 
+def _dtype_plan(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: List[str],
+    variable_cache: "VariableCache",
+) -> Dict[str, str]:
+    """
+    Look up the type each downloaded variable (column) should be coerced to.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to download from. For example `"acs/acs5"`,
+        `"dec/pl"`, or `"timeseries/poverty/saipe/schdist"`.
+    vintage
+        The vintage to download data for. For most data sets this is
+        an integer year, for example, `2020`. But for
+        a timeseries data set, pass the string `'timeseries'`.
+    download_variables
+        The census variables to download, for example `["NAME", "B01001_001E"]`.
+    variable_cache
+        A cache of metadata about variables.
+
+    Returns
+    -------
+        A dictionary from variable names to the `predicateType` in their
+        metadata, for the variables that have one we coerce to.
+    """
+    dtype_plan = {}
+
+    for variable in download_variables:
+        # predicateType does not exist in some older data sets like acs/acs3
+        # So in that case we just go with what we got in the JSON. But if we
+        # have it try to set the type.
+        field_type = variable_cache.get(dataset, vintage, variable).get(
+            "predicateType", None
+        )
+
+        # Strings and anything else we don't know are left as they came.
+        if field_type in ("int", "long", "float"):
+            dtype_plan[variable] = field_type
+
+    return dtype_plan
+
+
 def _coerce_downloaded_variable_types(
     dataset: str,
     vintage: VintageType,
     download_variables: List[str],
     df_data: pd.DataFrame,
     variable_cache: "VariableCache",
+    dtype_plan: Optional[Dict[str, str]] = None,
 ) -> None:
     """
     Coerce the type of each returned variable (column) in a data frame.
 
-    We look up the type in the metadata in `variable_cache`.
+    We look up the type in the metadata in `variable_cache`, unless
+    we are given a plan from :py:func:`_dtype_plan`.
 
     Parameters
     ----------
@@ -998,40 +2466,32 @@ def _coerce_downloaded_variable_types(
         The data that came back in JSON form from the census API.
     variable_cache
         A cache of metadata about variables.
-    """
-    for variable in download_variables:
-        # predicateType does not exist in some older data sets like acs/acs3
-        # So in that case we just go with what we got in the JSON. But if we
-        # have it try to set the type.
-        if "predicateType" in variable_cache.get(dataset, vintage, variable):
-            field_type = variable_cache.get(dataset, vintage, variable)["predicateType"]
-
-            if field_type == "int" or field_type == "long":
-                if df_data[variable].isnull().any():
-                    # Some Census data sets put in null in int fields.
-                    # We have to go with a float to make this a NaN.
-                    # Int has no representation for NaN or None.
-                    df_data[variable] = df_data[variable].astype(float, errors="ignore")
-                else:
-                    try:
-                        df_data[variable] = df_data[variable].astype(int)
-                    except ValueError:
-                        # Sometimes census metadata says int, but they
-                        # put in float values anyway, so fall back on
-                        # trying to get them as floats.
-                        df_data[variable] = df_data[variable].astype(
-                            float, errors="ignore"
-                        )
-                    except OverflowError:
-                        # Some long IDs are actually better handled as strings.
-                        df_data[variable] = df_data[variable].astype(str)
-            elif field_type == "float":
-                df_data[variable] = df_data[variable].astype(float)
-            elif field_type == "string":
-                pass
+    dtype_plan
+        The types to coerce to, if they have already been looked up.
+    """
+    if dtype_plan is None:
+        dtype_plan = _dtype_plan(dataset, vintage, download_variables, variable_cache)
+
+    for variable, field_type in dtype_plan.items():
+        if field_type == "int" or field_type == "long":
+            if df_data[variable].isnull().any():
+                # Some Census data sets put in null in int fields.
+                # We have to go with a float to make this a NaN.
+                # Int has no representation for NaN or None.
+                df_data[variable] = df_data[variable].astype(float, errors="ignore")
             else:
-                # Leave it as an object?
-                pass
+                try:
+                    df_data[variable] = df_data[variable].astype(int)
+                except ValueError:
+                    # Sometimes census metadata says int, but they
+                    # put in float values anyway, so fall back on
+                    # trying to get them as floats.
+                    df_data[variable] = df_data[variable].astype(float, errors="ignore")
+                except OverflowError:
+                    # Some long IDs are actually better handled as strings.
+                    df_data[variable] = df_data[variable].astype(str)
+        elif field_type == "float":
+            df_data[variable] = df_data[variable].astype(float)
 
 
 def _prefetch_variable_types(
@@ -1062,6 +2522,9 @@ def _prefetch_variable_types(
     variable_cache
         A cache of metadata about variables.
     """
+    # Load as much as we can in bulk first.
+    variable_cache.prefetch(dataset, vintage, download_variables)
+
     for variable in download_variables:
         try:
             variable_cache.get(dataset, vintage, variable)
@@ -1175,6 +2638,7 @@ def census_table_url(
     *,
     query_filter: Optional[Dict[str, str]] = None,
     api_key: Optional[str] = None,
+    ucgid: Optional[str] = None,
     **kwargs: cgeo.InSpecType,
 ) -> Tuple[str, Mapping[str, str], cgeo.BoundGeographyPath]:
     """
@@ -1203,6 +2667,9 @@ def census_table_url(
     api_key
         An optional API key. If you don't have or don't use a key, the number
         of calls you can make will be limited.
+    ucgid
+        An optional comma-separated list of Uniform Census Geography
+        Identifiers to query for instead of a geography specified in `kwargs`.
     kwargs
         A specification of the geometry that we want data for.
 
@@ -1217,11 +2684,122 @@ def census_table_url(
         dataset, vintage, list(download_variables), bound_path, api_key=api_key
     )
 
-    url, params = query_spec.table_url(query_filter=query_filter)
+    url, params = query_spec.table_url(query_filter=query_filter, ucgid=ucgid)
 
     return url, params, bound_path
 
 
+def _census_table_requests(
+    dataset: str,
+    vintage: VintageType,
+    download_variables: Iterable[str],
+    *,
+    query_filter: Optional[Dict[str, str]] = None,
+    api_key: Optional[str] = None,
+    ucgid: Optional[str] = None,
+    **kwargs: Optional[str],
+) -> Tuple[List[Tuple[str, Mapping[str, str]]], cgeo.BoundGeographyPath]:
+    """
+    Construct the one or more requests needed to download from the U.S. Census API.
+
+    Usually this is a single request, just like :py:func:`census_table_url`
+    would construct. But if there are long comma-separated lists of
+    geographies in `ucgid` or `kwargs`, the URL may be too long for the
+    servers to accept. In that case, we split the longest list into batches
+    that fit within :py:data:`_MAX_URL_LENGTH` and construct a request for each.
+    Concatenating the results of the requests gives the same results as the
+    single request would.
+
+    Parameters
+    ----------
+    dataset
+        The dataset to download from. For example `"acs/acs5"`,
+        `"dec/pl"`, or `"timeseries/poverty/saipe/schdist"`.
+    vintage
+        The vintage to download data for. For most data sets this is
+        an integer year, for example, `2020`. But for
+        a timeseries data set, pass the string `'timeseries'`.
+    download_variables
+        The census variables to download, for example `["NAME", "B01001_001E"]`.
+    query_filter
+        A dictionary of values to filter on.
+    api_key
+        An optional API key.
+    ucgid
+        An optional comma-separated list of Uniform Census Geography
+        Identifiers to query for instead of a geography specified in `kwargs`.
+    kwargs
+        A specification of the geometry that we want data for, with
+        multiple values already joined into comma-separated strings.
+
+    Returns
+    -------
+        A list of URLs and their parameters and the bound path for the full query.
+    """
+    url, params, bound_path = census_table_url(
+        dataset,
+        vintage,
+        download_variables,
+        query_filter=query_filter,
+        api_key=api_key,
+        ucgid=ucgid,
+        **kwargs,
+    )
+
+    if _url_length(url, params) <= _MAX_URL_LENGTH:
+        return [(url, params)], bound_path
+
+    geo_filters = dict(kwargs, ucgid=ucgid)
+
+    list_filters = {
+        name: value.split(",")
+        for name, value in geo_filters.items()
+        if value is not None and "," in value
+    }
+
+    if not list_filters:
+        raise CensusApiException(
+            f"Unable to construct a query for {url} with {params} short "
+            f"enough to fit within the maximum URL length of {_MAX_URL_LENGTH}."
+        )
+
+    # Split up the longest list.
+    name = max(list_filters, key=lambda k: len(quote_plus(geo_filters[k])))
+    values = list_filters[name]
+
+    # How much room is left for the values once everything
+    # else in the query is accounted for?
+    url_one, params_one, _ = census_table_url(
+        dataset,
+        vintage,
+        download_variables,
+        query_filter=query_filter,
+        api_key=api_key,
+        **{**geo_filters, name: values[0]},
+    )
+    max_length = _MAX_URL_LENGTH - (
+        _url_length(url_one, params_one) - len(quote_plus(values[0]))
+    )
+
+    # If there is not enough room, even for single values, we will
+    # end up with batches of one, and further lists will be split
+    # when we recurse.
+    table_requests = []
+
+    for batch in _batch_values(values, max_length):
+        batch_requests, _ = _census_table_requests(
+            dataset,
+            vintage,
+            download_variables,
+            query_filter=query_filter,
+            api_key=api_key,
+            **{**geo_filters, name: ",".join(batch)},
+        )
+        table_requests.extend(batch_requests)
+
+    return table_requests, bound_path
+
+
 def _bind_path_if_possible(dataset, vintage, **kwargs):
     """
     Bind the path if possible.
@@ -1338,10 +2916,263 @@ def geographies(dataset: str, vintage: VintageType) -> List[List[str]]:
 variables = VariableCache()
 
 
+_METADATA_CACHE_ENV_VAR = "CENSUSDIS_METADATA_CACHE"
+"""
+An environment variable with a path to a persistent metadata cache.
+
+If set, it is as if :py:func:`set_metadata_cache_path` were called
+with its value when this module is loaded.
+"""
+
+_METADATA_SNAPSHOT_ENV_VAR = "CENSUSDIS_METADATA_SNAPSHOT"
+"""
+An environment variable with a path to a metadata snapshot.
+
+If set, it is as if :py:func:`set_metadata_snapshot_path` were called
+with its value when this module is loaded.
+"""
+
+
+def _metadata_stores() -> Tuple[
+    Optional[SqliteMetadataStore], Optional[SqliteMetadataStore]
+]:
+    """Find the persistent metadata cache and snapshot behind `variables`, if any."""
+    cache_store = None
+    snapshot_store = None
+
+    source = variables.variable_source
+    while isinstance(source, SqliteVariableSource):
+        if source.store.read_only:
+            snapshot_store = source.store
+        else:
+            cache_store = source.store
+        source = source.backing_source
+
+    return cache_store, snapshot_store
+
+
+def _set_metadata_stores(
+    cache_store: Optional[SqliteMetadataStore],
+    snapshot_store: Optional[SqliteMetadataStore],
+) -> None:
+    """Put a persistent metadata cache and snapshot in front of the source of metadata."""
+    source = variables.variable_source
+    while isinstance(source, SqliteVariableSource):
+        source = source.backing_source
+
+    # Look in the snapshot first, then the cache, then the API.
+    if cache_store is not None:
+        source = SqliteVariableSource(cache_store, source)
+    if snapshot_store is not None:
+        source = SqliteVariableSource(snapshot_store, source)
+
+    variables.variable_source = source
+    cgeo.PathSpec.set_metadata_store(cache_store)
+    cgeo.PathSpec.set_snapshot_store(snapshot_store)
+
+
+def set_metadata_cache_path(metadata_cache_path: Optional[Union[str, Path]]) -> None:
+    """
+    Set the path to a persistent cache of metadata about variables and groups.
+
+    Metadata about the variables, groups and geographies in a published vintage
+    of a data set does not change, so there is no need for every process or notebook
+    kernel to fetch it from the census API again. With this set, metadata
+    is kept in a SQLite database at the given path that any number of processes
+    can share. Alternatively, set the environment variable `CENSUSDIS_METADATA_CACHE`.
+
+    Parameters
+    ----------
+    metadata_cache_path
+        The path to the SQLite database file. If `None`, metadata is only
+        cached in memory.
+    """
+    _, snapshot_store = _metadata_stores()
+
+    cache_store = (
+        None
+        if metadata_cache_path is None
+        else SqliteMetadataStore(metadata_cache_path)
+    )
+
+    _set_metadata_stores(cache_store, snapshot_store)
+
+
+def get_metadata_cache_path() -> Optional[Path]:
+    """
+    Get the path to a persistent cache of metadata about variables and groups.
+
+    Returns
+    -------
+        The path to the SQLite database file, or `None` if metadata is only
+        cached in memory.
+    """
+    cache_store, _ = _metadata_stores()
+    return None if cache_store is None else cache_store.path
+
+
+def set_metadata_snapshot_path(
+    metadata_snapshot_path: Optional[Union[str, Path]]
+) -> None:
+    """
+    Set the path to a read-only snapshot of metadata for commonly used data sets.
+
+    Snapshots are built with :py:func:`build_metadata_snapshot` somewhere that
+    has access to the census API, and can then be copied anywhere, including
+    machines that don't. Metadata is looked for in the snapshot before the
+    metadata cache, if there is one, and the census API. Alternatively,
+    set the environment variable `CENSUSDIS_METADATA_SNAPSHOT`.
+
+    Parameters
+    ----------
+    metadata_snapshot_path
+        The path to the snapshot. If `None`, don't use a snapshot.
+    """
+    cache_store, _ = _metadata_stores()
+
+    snapshot_store = (
+        None
+        if metadata_snapshot_path is None
+        else SqliteMetadataStore(metadata_snapshot_path, read_only=True)
+    )
+
+    _set_metadata_stores(cache_store, snapshot_store)
+
+
+def get_metadata_snapshot_path() -> Optional[Path]:
+    """
+    Get the path to a read-only snapshot of metadata for commonly used data sets.
+
+    Returns
+    -------
+        The path to the snapshot, or `None` if there isn't one.
+    """
+    _, snapshot_store = _metadata_stores()
+    return None if snapshot_store is None else snapshot_store.path
+
+
+build_metadata_snapshot = censusdis.impl.snapshot.build_snapshot
+"""
+Build a snapshot of the metadata for a collection of data sets and vintages.
+
+See :py:func:`censusdis.impl.snapshot.build_snapshot`.
+"""
+
+
+_RESULT_CACHE_ENV_VAR = "CENSUSDIS_RESULT_CACHE"
+"""
+An environment variable with a path to a directory to cache download results in.
+
+If set, it is as if :py:func:`set_result_cache_path` were called
+with its value when this module is loaded.
+"""
+
+
+def set_result_cache_path(result_cache_path: Optional[Union[str, Path]]) -> None:
+    """
+    Set the path to a directory to cache the results of :py:func:`download` in.
+
+    With this set, the data frame each call to :py:func:`download` returns is
+    saved, keyed on the data set, vintage, variables, groups, geography and all
+    the other arguments that determine it. The next time the same query is made,
+    the result is loaded from the cache instead of downloading it and adding
+    geometry again. This makes it cheap to re-run a pipeline in which only a
+    few steps have changed. Alternatively, set the environment variable
+    `CENSUSDIS_RESULT_CACHE`.
+
+    Data that has been published does not normally change, but if it is
+    revised, remove the contents of the directory to pick up the changes.
+
+    Parameters
+    ----------
+    result_cache_path
+        The directory to cache results in. If `None`, don't cache results.
+    """
+    global _RESULT_CACHE
+
+    _RESULT_CACHE = (
+        None if result_cache_path is None else ResultCache(result_cache_path)
+    )
+
+
+def get_result_cache_path() -> Optional[Path]:
+    """
+    Get the path to the directory the results of :py:func:`download` are cached in.
+
+    Returns
+    -------
+        The directory, or `None` if results are not cached.
+    """
+    return None if _RESULT_CACHE is None else _RESULT_CACHE.path
+
+
+if os.environ.get(_METADATA_CACHE_ENV_VAR, None):
+    set_metadata_cache_path(os.environ[_METADATA_CACHE_ENV_VAR])
+
+if os.environ.get(_METADATA_SNAPSHOT_ENV_VAR, None):
+    set_metadata_snapshot_path(os.environ[_METADATA_SNAPSHOT_ENV_VAR])
+
+if os.environ.get(_RESULT_CACHE_ENV_VAR, None):
+    set_result_cache_path(os.environ[_RESULT_CACHE_ENV_VAR])
+
+
+def cache_info() -> Dict[str, CacheInfo]:
+    """
+    Describe the current footprint of the in-memory metadata caches.
+
+    This is useful in long-lived processes, like servers, to see how
+    much memory cached metadata is using and how often it is reused.
+
+    Returns
+    -------
+        A dictionary from the name of each cache to information on its
+        size in entries and estimated bytes, its limits, and its hits and
+        misses. The caches are those of :py:meth:`VariableCache.cache_info`
+        plus `"path_specs"`, the geography hierarchies of each dataset and vintage.
+    """
+    return {
+        **variables.cache_info(),
+        "path_specs": cgeo.PathSpec._PATH_SPECS_CACHE.info(),
+    }
+
+
+def set_cache_limits(
+    cache: str,
+    *,
+    max_entries: Optional[int] = UNCHANGED,
+    max_bytes: Optional[int] = UNCHANGED,
+) -> None:
+    """
+    Limit the size of one of the in-memory metadata caches.
+
+    When a cache goes over a limit, the least recently used entries are
+    evicted. They will be fetched again if they are needed.
+
+    Parameters
+    ----------
+    cache
+        The name of the cache, as in the keys of what :py:func:`cache_info`
+        returns.
+    max_entries
+        The most entries to hold, or `None` for no limit. If not
+        specified, the current limit is left as it is.
+    max_bytes
+        The most bytes of memory the entries should use, or `None` for no limit.
+        Sizes are estimates. If not specified, the current limit is left as it is.
+    """
+    if cache == "path_specs":
+        cgeo.PathSpec._PATH_SPECS_CACHE.set_limits(
+            max_entries=max_entries, max_bytes=max_bytes
+        )
+    else:
+        variables.set_cache_limits(cache, max_entries=max_entries, max_bytes=max_bytes)
+
+
 def _intersecting_geos_kws(
     dataset: str,
     vintage: VintageType,
     containing_geo_kwargs: cgeo.InSpecType,
+    gdf_within: Optional[gpd.GeoDataFrame] = None,
     **kwargs: cgeo.InSpecType,
 ) -> cgeo.InSpecType:
     """
@@ -1363,6 +3194,9 @@ def _intersecting_geos_kws(
         looking for intersections with. For example
         `dict(metropolitan_statistical_area_micropolitan_statistical_area="35620")`
         for the New York area CBSA.
+    gdf_within
+        The geometry of the containing geography, if we already have it. If
+        `None`, it will be downloaded.
     kwargs
         A specification of the geometry that we want data for, limited to those
         geographies that are contained in the geography specified by `containing_geo_kwargs`.
@@ -1383,10 +3217,11 @@ def _intersecting_geos_kws(
     if len(kwargs) == 1 or list(kwargs.values())[0] != "*":
         return kwargs
 
-    # Download the geometry of the outer scope.
-    gdf_within = download(
-        dataset, vintage, ["NAME"], with_geometry=True, **containing_geo_kwargs
-    )
+    # Download the geometry of the outer scope if we don't already have it.
+    if gdf_within is None:
+        gdf_within = download(
+            dataset, vintage, ["NAME"], with_geometry=True, **containing_geo_kwargs
+        )
 
     # See if we can find a matching path spec.
     bound_path = _bind_path_if_possible(dataset, vintage, **kwargs)
@@ -1451,6 +3286,18 @@ class ContainedWithin:
         self._area_threshold = area_threshold
         self._containing_kwargs = kwargs
 
+        # Memoized geometry of the containing geography, keyed
+        # by (dataset, vintage).
+        self._container_gdfs: Dict[Tuple[str, VintageType], gpd.GeoDataFrame] = {}
+
+        # Memoized results of resolving which geographies are contained
+        # within us, keyed by dataset, vintage, and the geography being
+        # queried. Each value is the geography kwargs to actually query
+        # with and a data frame of the keys of the contained geographies.
+        self._contained_geos: Dict[
+            Tuple, Tuple[Dict[str, cgeo.InSpecType], pd.DataFrame]
+        ] = {}
+
     def __eq__(self, other) -> bool:
         """Are two objects equal."""
         if not isinstance(other, ContainedWithin):
@@ -1581,11 +3428,16 @@ class ContainedWithin:
         -------
             A :py:class:`~pd.DataFrame` or `~gpd.GeoDataFrame` containing the requested US Census data.
         """
-        geos_kwargs = _intersecting_geos_kws(
-            dataset, vintage, self._containing_kwargs, **kwargs
+        geos_kwargs, df_contained_keys = self._resolve_contained_geos(
+            dataset,
+            vintage,
+            tiger_shapefiles_only=tiger_shapefiles_only,
+            remove_water=remove_water,
+            api_key=api_key,
+            **kwargs,
         )
 
-        gdf = download(
+        df_or_gdf = download(
             dataset,
             vintage,
             download_variables,
@@ -1594,7 +3446,7 @@ class ContainedWithin:
             set_to_nan=set_to_nan,
             skip_annotations=skip_annotations,
             query_filter=query_filter,
-            with_geometry=True,
+            with_geometry=with_geometry,
             with_geometry_columns=with_geometry_columns,
             tiger_shapefiles_only=tiger_shapefiles_only,
             remove_water=remove_water,
@@ -1604,61 +3456,194 @@ class ContainedWithin:
             **geos_kwargs,
         )
 
-        # See which of these geometries are mostly contained by
-        # the geography we want to be within.
+        # Keys are normalized the same way they are when geometry is added.
+        if "TRACT" in df_or_gdf.columns:
+            df_or_gdf["TRACT"] = df_or_gdf["TRACT"].str.ljust(6, "0")
+
+        key_columns = [
+            col
+            for col in df_contained_keys.columns
+            if col in df_or_gdf.columns and col != "geometry"
+        ]
+
+        # Filter down to only the geographies that are mostly contained
+        # in the geography we want to be within.
+        df_contained = df_contained_keys.merge(df_or_gdf, on=key_columns, how="inner")
 
-        gdf_container = download(
-            dataset, vintage, ["NAME"], with_geometry=True, **self._containing_kwargs
-        ).drop("NAME", axis="columns")
+        if with_geometry:
+            df_contained = gpd.GeoDataFrame(
+                df_contained, geometry="geometry", crs=df_or_gdf.crs
+            )
 
-        gdf_contained = cmap.sjoin_mostly_contains(
-            gdf_container, gdf, area_threshold=self._area_threshold
+        container_columns = self._container_gdfs[(dataset, vintage)].columns.drop(
+            "NAME"
         )
 
-        # Drop all the large container columns we don't need.
-        gdf_contained = gdf_contained[
-            [col for col in gdf_contained.columns if not col.endswith("_large")]
+        # Keep the columns from the larger result first.
+        return df_contained[
+            [
+                col
+                for col in container_columns
+                if col in df_contained.columns and col != "geometry"
+            ]
+            + [
+                col
+                for col in df_contained.columns
+                if col not in container_columns or col == "geometry"
+            ]
         ].reset_index(drop=True)
 
-        # Drop the "_small" suffix.
+    def _container_gdf(
+        self, dataset: str, vintage: VintageType, api_key: Optional[str]
+    ) -> gpd.GeoDataFrame:
+        """
+        Get the geometry of the containing geography.
 
-        gdf_contained.rename(
-            lambda col: col[:-6] if col.endswith("_small") else col,
-            axis="columns",
-            inplace=True,
+        This is downloaded once per dataset and vintage and then memoized.
+
+        Parameters
+        ----------
+        dataset
+            The dataset to download from.
+        vintage
+            The vintage to download data for.
+        api_key
+            An optional API key.
+
+        Returns
+        -------
+            The geometry of the containing geography, including a `NAME` column.
+        """
+        key = (dataset, vintage)
+
+        if key not in self._container_gdfs:
+            self._container_gdfs[key] = download(
+                dataset,
+                vintage,
+                ["NAME"],
+                with_geometry=True,
+                api_key=api_key,
+                **self._containing_kwargs,
+            )
+
+        return self._container_gdfs[key]
+
+    def _resolve_contained_geos(
+        self,
+        dataset: str,
+        vintage: VintageType,
+        *,
+        tiger_shapefiles_only: bool,
+        remove_water: bool,
+        api_key: Optional[str],
+        **kwargs: cgeo.InSpecType,
+    ) -> Tuple[Dict[str, cgeo.InSpecType], pd.DataFrame]:
+        """
+        Determine which geographies are contained within us.
+
+        The first time this is called for a given dataset, vintage, and
+        contained geography, we find the intersecting geographies, download
+        their geometry, and do the spatial join based on our area threshold.
+        The results are memoized, so subsequent calls, for example to download
+        different variables, need only make plain API queries for the data.
+
+        Parameters
+        ----------
+        dataset
+            The dataset to download from.
+        vintage
+            The vintage to download data for.
+        tiger_shapefiles_only
+            If `True` only look for TIGER shapefiles.
+        remove_water
+            If `True` remove water areas from the geometry before
+            checking containment.
+        api_key
+            An optional API key.
+        kwargs
+            A specification of the geometry that we want data for.
+
+        Returns
+        -------
+            The geography kwargs to query with and a data frame with the keys of
+            the contained geographies along with the keys of the containing
+            geography each is contained in.
+        """
+        key = (
+            dataset,
+            vintage,
+            tuple((k, _gf2s(v)) for k, v in kwargs.items()),
+            tiger_shapefiles_only,
+            remove_water,
         )
 
-        if with_geometry:
-            # Keep the columns from the larger result.
-            return gdf_contained[
-                [
-                    col
-                    for col in gdf_container.columns
-                    if col in gdf_contained.columns and col != "geometry"
-                ]
-                + [
-                    col
-                    for col in gdf_contained.columns
-                    if col not in gdf_container.columns or col == "geometry"
-                ]
+        if key not in self._contained_geos:
+            gdf_container = self._container_gdf(dataset, vintage, api_key)
+
+            geos_kwargs = _intersecting_geos_kws(
+                dataset,
+                vintage,
+                self._containing_kwargs,
+                gdf_within=gdf_container,
+                **kwargs,
+            )
+
+            gdf = download(
+                dataset,
+                vintage,
+                ["NAME"],
+                with_geometry=True,
+                tiger_shapefiles_only=tiger_shapefiles_only,
+                remove_water=remove_water,
+                api_key=api_key,
+                **geos_kwargs,
+            )
+
+            # The geographic key columns, e.g. STATE, COUNTY, and TRACT.
+            key_columns = [
+                col for col in gdf.columns if col not in ["NAME", "geometry"]
             ]
-        else:
-            # Drop the geometry and return a `pd.DataFrame`
-            return pd.DataFrame(
+
+            # See which of these geometries are mostly contained by
+            # the geography we want to be within.
+            gdf_contained = cmap.sjoin_mostly_contains(
+                gdf_container.drop("NAME", axis="columns"),
+                gdf,
+                area_threshold=self._area_threshold,
+            )
+
+            # Drop all the large container columns we don't need.
+            gdf_contained = gdf_contained[
+                [col for col in gdf_contained.columns if not col.endswith("_large")]
+            ].reset_index(drop=True)
+
+            # Drop the "_small" suffix.
+            gdf_contained.rename(
+                lambda col: col[:-6] if col.endswith("_small") else col,
+                axis="columns",
+                inplace=True,
+            )
+
+            # Keep the keys of the containing geography along with
+            # the keys of the contained geographies.
+            df_contained_keys = pd.DataFrame(
                 gdf_contained[
                     [
-                        col
-                        for col in gdf_container.columns
-                        if col in gdf_contained.columns and col != "geometry"
-                    ]
-                    + [
                         col
                         for col in gdf_contained.columns
-                        if col not in gdf_container.columns and col != "geometry"
+                        if col in key_columns
+                        or (
+                            col in gdf_container.columns
+                            and col not in ["NAME", "geometry"]
+                        )
                     ]
                 ]
             )
 
+            self._contained_geos[key] = (geos_kwargs, df_contained_keys)
+
+        return self._contained_geos[key]
+
 
 def contained_within(
     area_threshold: float = 0.8, **kwargs: cgeo.InSpecType
@@ -1796,3 +3781,10 @@ def add_inferred_geography(
 
 
 certificates = censusdis.impl.fetch.certificates
+
+set_max_workers = censusdis.impl.concurrency.set_max_workers
+"""
+Set the maximum number of threads used to make concurrent calls to the census API.
+
+See :py:func:`censusdis.impl.concurrency.set_max_workers`.
+"""
@@ -2,13 +2,11 @@
 """Utilities for managing hierarchies of geographies."""
 
 import os
-from collections import defaultdict
 from dataclasses import dataclass
 from pathlib import Path
 from typing import (
     Any,
     ClassVar,
-    DefaultDict,
     Dict,
     Iterable,
     List,
@@ -20,8 +18,10 @@ from typing import (
 
 import requests
 
+from .impl.cache import LRUCache, SingleFlight
 from .impl.exceptions import CensusApiException
 from .impl.fetch import certificates
+from .impl.metastore import SqliteMetadataStore
 
 
 InSpecType = Union[str, Iterable[str]]
@@ -134,9 +134,17 @@ class PathSpec:
         """Find all partial matches for the path."""
         kwargs = PathSpec._u2s(**kwargs)
 
+        path_specs = PathSpec.get_path_specs(dataset, year)
+
+        if is_prefix:
+            return [
+                BoundGeographyPath(num, path_specs[num], **kwargs)
+                for num in PathSpec._match_index(dataset, year).get(tuple(kwargs), [])
+            ]
+
         return [
             BoundGeographyPath(num, path_spec, **kwargs)
-            for num, path_spec in PathSpec.get_path_specs(dataset, year).items()
+            for num, path_spec in path_specs.items()
             if path_spec._partial_match(is_prefix, **kwargs)
         ]
 
@@ -158,10 +166,13 @@ class PathSpec:
     @classmethod
     def full_match(cls, dataset: str, year: int, **kwargs: InSpecType):
         """Find a full match."""
+        key = tuple(PathSpec._u2s(**kwargs))
+        path_specs = cls.get_path_specs(dataset, year)
+
         full_matches = [
-            (num, path_spec)
-            for num, path_spec in cls.get_path_specs(dataset, year).items()
-            if path_spec._full_match(**kwargs)
+            (num, path_specs[num])
+            for num in PathSpec._match_index(dataset, year).get(key, [])
+            if len(path_specs[num]) == len(key)
         ]
         if not full_matches:
             return None, None
@@ -187,6 +198,54 @@ class PathSpec:
         else:
             return f"https://api.census.gov/data/{dataset}/geography.json"
 
+    @staticmethod
+    def _build_match_index(
+        path_specs: Dict[str, "PathSpec"]
+    ) -> Dict[Tuple[str, ...], List[str]]:
+        """
+        Index path specs by the bound components that partially prefix match them.
+
+        The keys are the components that could be bound, in order, and the
+        values are the numbers of the path specs they match, in the order the path
+        specs are in. A path spec is matched by its first component followed by any
+        subsequence of the rest, so finding matches is a dictionary lookup instead of
+        a scan over all the path specs.
+        """
+        index: Dict[Tuple[str, ...], List[str]] = {}
+
+        for num, path_spec in path_specs.items():
+            path = path_spec.path
+
+            if not path:
+                index.setdefault((), []).append(num)
+                continue
+
+            first, rest = path[0], path[1:]
+
+            for mask in range(1 << len(rest)):
+                key = (first,) + tuple(
+                    component
+                    for ii, component in enumerate(rest)
+                    if mask & (1 << ii)
+                )
+                nums = index.setdefault(key, [])
+                if not nums or nums[-1] != num:
+                    nums.append(num)
+
+        return index
+
+    @staticmethod
+    def _match_index(dataset: str, year: int) -> Dict[Tuple[str, ...], List[str]]:
+        """Get the index of path specs by the components that match them."""
+        if dataset.startswith("lodes/"):
+            if PathSpec._LODES_MATCH_INDEX is None:
+                PathSpec._LODES_MATCH_INDEX = PathSpec._build_match_index(
+                    PathSpec.get_path_specs(dataset, year)
+                )
+            return PathSpec._LODES_MATCH_INDEX
+
+        return PathSpec._path_specs_entry(dataset, year)[3]
+
     @staticmethod
     def empty_path_spec() -> "PathSpec":
         """Construct an empty path spec."""
@@ -224,18 +283,57 @@ class PathSpec:
             f"Census API request to {request.url} failed with status {request.status_code}. {request.text}"
         )
 
-    _PATH_SPECS_BY_DATASET_YEAR: DefaultDict[str, Dict[int, Dict[str, "PathSpec"]]] = (
-        defaultdict(dict)
-    )
+    _PATH_SPECS_CACHE = LRUCache(max_entries=512)
+    """
+    Path specs for each dataset and vintage we have seen, keyed by `(dataset, vintage)`.
+
+    The values are tuples of the path specs, the map from snake case path
+    components to the real ones, the inverse of that map, and the
+    index built by :py:meth:`_build_match_index`.
+    """
 
-    _PATH_SPEC_SNAKE_MAP: DefaultDict[str, Dict[int, Dict[str, str]]] = defaultdict(
-        dict
-    )
-    _PATH_SPEC_SNAKE_INV_MAP: DefaultDict[str, Dict[int, Dict[str, str]]] = defaultdict(
-        dict
-    )
+    _PATH_SPECS_SINGLE_FLIGHT = SingleFlight()
+    """Makes sure only one thread fetches the path specs for each dataset and vintage."""
 
     _LODES_PATH_SPECS: Optional[Dict[str, "PathSpec"]] = None
+    _LODES_MATCH_INDEX: Optional[Dict[Tuple[str, ...], List[str]]] = None
+
+    _METADATA_STORE: Optional[SqliteMetadataStore] = None
+    """If not `None`, path specs are persisted here so other processes don't refetch them."""
+
+    _SNAPSHOT_STORE: Optional[SqliteMetadataStore] = None
+    """If not `None`, a read-only snapshot to look for path specs in before anywhere else."""
+
+    _GEOGRAPHY_DOCUMENT = "geography"
+    """The kind of document path specs are persisted as."""
+
+    @staticmethod
+    def set_metadata_store(store: Optional[SqliteMetadataStore]) -> None:
+        """
+        Set a persistent store to keep path specs in.
+
+        Normally this is done by :py:func:`censusdis.data.set_metadata_cache_path`.
+
+        Parameters
+        ----------
+        store
+            The store, or `None` to keep path specs only in memory.
+        """
+        PathSpec._METADATA_STORE = store
+
+    @staticmethod
+    def set_snapshot_store(store: Optional[SqliteMetadataStore]) -> None:
+        """
+        Set a read-only snapshot to look for path specs in before anywhere else.
+
+        Normally this is done by :py:func:`censusdis.data.set_metadata_snapshot_path`.
+
+        Parameters
+        ----------
+        store
+            The snapshot, or `None` to not use one.
+        """
+        PathSpec._SNAPSHOT_STORE = store
 
     @staticmethod
     def get_path_specs(dataset: str, vintage: int) -> Dict[str, "PathSpec"]:
@@ -258,30 +356,82 @@ class PathSpec:
 
             return PathSpec._LODES_PATH_SPECS
 
-        if vintage not in PathSpec._PATH_SPECS_BY_DATASET_YEAR[dataset]:
-            PathSpec._PATH_SPECS_BY_DATASET_YEAR[dataset][vintage] = (
-                PathSpec._fetch_path_specs(dataset, vintage)
+        return PathSpec._path_specs_entry(dataset, vintage)[0]
+
+    @staticmethod
+    def _path_specs_entry(
+        dataset: str, vintage: int
+    ) -> Tuple[
+        Dict[str, "PathSpec"],
+        Dict[str, str],
+        Dict[str, str],
+        Dict[Tuple[str, ...], List[str]],
+    ]:
+        """Get the path specs, snake case maps and match index for a dataset and vintage."""
+        entry = PathSpec._PATH_SPECS_CACHE.get((dataset, vintage), None)
+
+        if entry is None:
+            with PathSpec._PATH_SPECS_SINGLE_FLIGHT.lock((dataset, vintage)):
+                # Another thread may have fetched them while we waited.
+                entry = PathSpec._PATH_SPECS_CACHE.get((dataset, vintage), None)
+
+                if entry is None:
+                    path_specs = PathSpec._load_path_specs(dataset, vintage)
+
+                    snake_map = {
+                        component.replace(" ", "_")
+                        .replace("/", "_")
+                        .replace("-", "_")
+                        .replace("(", "")
+                        .replace(")", "")
+                        .lower(): component
+                        for path_spec in path_specs.values()
+                        for component in path_spec.path
+                    }
+                    snake_inv_map = {
+                        name: py_name for py_name, name in snake_map.items()
+                    }
+
+                    entry = (
+                        path_specs,
+                        snake_map,
+                        snake_inv_map,
+                        PathSpec._build_match_index(path_specs),
+                    )
+                    PathSpec._PATH_SPECS_CACHE[(dataset, vintage)] = entry
+
+        return entry
+
+    @staticmethod
+    def _load_path_specs(dataset: str, vintage: int) -> Dict[str, "PathSpec"]:
+        """Load path specs from a snapshot or the persistent store, or fetch and persist them."""
+        store = PathSpec._METADATA_STORE
+
+        for load_store in [PathSpec._SNAPSHOT_STORE, store]:
+            if load_store is None:
+                continue
+
+            paths = load_store.get_document(
+                dataset, vintage, PathSpec._GEOGRAPHY_DOCUMENT
             )
-            PathSpec._PATH_SPEC_SNAKE_MAP[dataset][vintage] = {
-                component.replace(" ", "_")
-                .replace("/", "_")
-                .replace("-", "_")
-                .replace("(", "")
-                .replace(")", "")
-                .lower(): component
-                for path_spec in PathSpec._PATH_SPECS_BY_DATASET_YEAR[dataset][
-                    vintage
-                ].values()
-                for component in path_spec.path
-            }
-            PathSpec._PATH_SPEC_SNAKE_INV_MAP[dataset][vintage] = {
-                name: py_name
-                for py_name, name in PathSpec._PATH_SPEC_SNAKE_MAP[dataset][
-                    vintage
-                ].items()
-            }
-
-        return PathSpec._PATH_SPECS_BY_DATASET_YEAR[dataset][vintage]
+
+            if paths is not None:
+                return {
+                    num: PathSpec(path, PathSpec.__init_key)
+                    for num, path in paths.items()
+                }
+
+        path_specs = PathSpec._fetch_path_specs(dataset, vintage)
+
+        if store is not None:
+            store.put_document(
+                dataset,
+                vintage,
+                PathSpec._GEOGRAPHY_DOCUMENT,
+                {num: path_spec.path for num, path_spec in path_specs.items()},
+            )
+
+        return path_specs
 
 
 class BoundGeographyPath:
@@ -445,7 +595,10 @@ class CensusGeographyQuerySpec:
         return None
 
     def table_url(
-        self, *, query_filter: Optional[Dict[str, str]] = None
+        self,
+        *,
+        query_filter: Optional[Dict[str, str]] = None,
+        ucgid: Optional[str] = None,
     ) -> Tuple[str, Mapping[str, str]]:
         """
         Construct the URL to query census data.
@@ -461,6 +614,11 @@ class CensusGeographyQuerySpec:
             This filtering is done on the server side, not the client
             side, so it is far more efficient than querying without a
             query filter and then manually filtering the results.
+        ucgid
+            An optional comma-separated list of Uniform Census Geography
+            Identifiers, like `"1400000US34013001400"`, to query for. This
+            is an alternative to the `for` and `in` clauses derived from the
+            bound path, so the bound path should be empty if it is used.
 
         Returns
         -------
@@ -478,6 +636,9 @@ class CensusGeographyQuerySpec:
         if self.bound_path.bindings:
             params["for"] = self.for_component
 
+        if ucgid is not None:
+            params["ucgid"] = ucgid
+
         if query_filter is not None:
             params.update(query_filter)
 
@@ -501,12 +662,16 @@ def geo_path_specs(dataset: str, year: int) -> Dict[str, List[str]]:
 
 def path_component_to_snake(dataset: str, year: int, component: str) -> str:
     """Convert path components to snake case."""
-    return PathSpec._PATH_SPEC_SNAKE_INV_MAP[dataset][year].get(component, component)
+    if dataset.startswith("lodes/"):
+        return component
+    return PathSpec._path_specs_entry(dataset, year)[2].get(component, component)
 
 
 def path_component_from_snake(dataset: str, year: int, component: str) -> str:
     """Convert path components out of snake case."""
-    return PathSpec._PATH_SPEC_SNAKE_MAP[dataset][year].get(component, component)
+    if dataset.startswith("lodes/"):
+        return component
+    return PathSpec._path_specs_entry(dataset, year)[1].get(component, component)
 
 
 def geo_path_snake_specs(dataset: str, year: int) -> Dict[str, List[str]]:
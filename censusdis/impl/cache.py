@@ -0,0 +1,330 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Utilities for in-process caches that are shared between threads."""
+
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+import pandas as pd
+
+
+class SingleFlight:
+    """
+    Make sure at most one thread at a time fetches the value for any given key.
+
+    The typical use is a double-checked cache lookup::
+
+        value = cache.get(key)
+        if value is None:
+            with single_flight.lock(key):
+                # Another thread may have fetched it while we waited.
+                value = cache.get(key)
+                if value is None:
+                    value = fetch(key)
+                    cache[key] = value
+
+    Threads that miss on the same key wait for the first one to finish
+    fetching rather than all fetching the same thing. Threads that miss
+    on different keys do not wait for one another.
+    """
+
+    def __init__(self):
+        """Construct a single flight group with no keys in flight."""
+        self._lock = threading.Lock()
+
+        # A lock and the number of threads holding or waiting for it, per key.
+        self._key_locks: Dict[Hashable, List] = {}
+
+    @contextmanager
+    def lock(self, key: Hashable) -> Generator[None, None, None]:
+        """
+        Hold the lock for a key.
+
+        The lock is reentrant, so a thread that already holds it, for example
+        because fetching one value requires fetching another with the same key,
+        will not deadlock.
+
+        Parameters
+        ----------
+        key
+            The key.
+        """
+        with self._lock:
+            key_lock = self._key_locks.get(key, None)
+            if key_lock is None:
+                key_lock = [threading.RLock(), 0]
+                self._key_locks[key] = key_lock
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                yield
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                # Don't accumulate locks for keys no one is fetching.
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+
+    def __len__(self) -> int:
+        """Return the number of keys that are currently in flight."""
+        with self._lock:
+            return len(self._key_locks)
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate how many bytes of memory a value uses.
+
+    This is meant for the kinds of values we cache: JSON-like nests of
+    dictionaries, lists and strings, data frames and numpy arrays. Objects
+    that know their own size can say so with an `nbytes` attribute.
+
+    Parameters
+    ----------
+    value
+        The value.
+
+    Returns
+    -------
+        The estimated size in bytes.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    return sys.getsizeof(value)
+
+
+UNCHANGED: Any = object()
+"""A default for a cache limit that should be left as it is."""
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    """A snapshot of the footprint and effectiveness of a cache."""
+
+    entries: int
+    """The number of entries in the cache."""
+
+    nbytes: int
+    """The estimated number of bytes used by the values in the cache."""
+
+    max_entries: Optional[int]
+    """The most entries the cache will hold, or `None` if there is no limit."""
+
+    max_bytes: Optional[int]
+    """The most bytes the cache will hold, or `None` if there is no limit."""
+
+    hits: int
+    """The number of lookups that found what they were looking for."""
+
+    misses: int
+    """The number of lookups that did not."""
+
+
+class LRUCache:
+    """
+    A thread-safe mapping that evicts the least recently used entries.
+
+    The cache can be limited in the number of entries, the estimated number of
+    bytes the values use, or both. When an insertion takes it over a limit,
+    the least recently used entries are evicted until it is back under.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = estimate_size,
+    ):
+        """
+        Construct an empty cache.
+
+        Parameters
+        ----------
+        max_entries
+            The most entries to hold, or `None` for no limit.
+        max_bytes
+            The most bytes the values may use, or `None` for no limit.
+        sizeof
+            A function that estimates the size of a value in bytes.
+        """
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._sizeof = sizeof
+        self._max_entries = None
+        self._max_bytes = None
+
+        self.set_limits(max_entries=max_entries, max_bytes=max_bytes)
+
+    def set_limits(
+        self,
+        *,
+        max_entries: Optional[int] = UNCHANGED,
+        max_bytes: Optional[int] = UNCHANGED,
+    ) -> None:
+        """
+        Change the limits on the size of the cache.
+
+        If the cache is over a new limit, entries are evicted right away.
+
+        Parameters
+        ----------
+        max_entries
+            The most entries to hold, or `None` for no limit. If not
+            specified, the current limit is left as it is.
+        max_bytes
+            The most bytes the values may use, or `None` for no limit. If not
+            specified, the current limit is left as it is.
+        """
+        if max_entries is not UNCHANGED and max_entries is not None and max_entries < 0:
+            raise ValueError(f"max_entries must be >= 0, not {max_entries}.")
+        if max_bytes is not UNCHANGED and max_bytes is not None and max_bytes < 0:
+            raise ValueError(f"max_bytes must be >= 0, not {max_bytes}.")
+
+        with self._lock:
+            if max_entries is not UNCHANGED:
+                self._max_entries = max_entries
+            if max_bytes is not UNCHANGED:
+                self._max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self) -> None:
+        """Evict least recently used entries until we are within limits. Hold the lock."""
+        while self._entries and (
+            (self._max_entries is not None and len(self._entries) > self._max_entries)
+            or (self._max_bytes is not None and self._nbytes > self._max_bytes)
+        ):
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._nbytes -= nbytes
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a value and mark it as recently used.
+
+        Parameters
+        ----------
+        key
+            The key.
+        default
+            What to return if the key is not in the cache.
+
+        Returns
+        -------
+            The value, or `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self._misses += 1
+                return default
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def update(self, items: Iterable[Tuple[Hashable, Any]]) -> None:
+        """
+        Insert or replace any number of values.
+
+        Parameters
+        ----------
+        items
+            (key, value) pairs.
+        """
+        sized_items = [(key, (value, self._sizeof(value))) for key, value in items]
+
+        with self._lock:
+            for key, entry in sized_items:
+                old_entry = self._entries.pop(key, None)
+                if old_entry is not None:
+                    self._nbytes -= old_entry[1]
+                self._entries[key] = entry
+                self._nbytes += entry[1]
+            self._evict()
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value."""
+        self.update([(key, value)])
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a value and return it, or `default` if it is not there."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self._nbytes -= entry[1]
+            return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check whether a key is in the cache without marking it as used."""
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self) -> List[Hashable]:
+        """Return a snapshot of the keys, least recently used first."""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Return a snapshot of the items, least recently used first."""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def clear(self) -> None:
+        """Remove everything from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def info(self) -> CacheInfo:
+        """
+        Describe the current footprint of the cache.
+
+        Returns
+        -------
+            A snapshot of the size, limits, hits and misses of the cache.
+        """
+        with self._lock:
+            return CacheInfo(
+                entries=len(self._entries),
+                nbytes=self._nbytes,
+                max_entries=self._max_entries,
+                max_bytes=self._max_bytes,
+                hits=self._hits,
+                misses=self._misses,
+            )
@@ -0,0 +1,146 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Utilities for running independent remote calls concurrently."""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Generator, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+_MAX_WORKERS = 8
+"""
+The default maximum number of threads we use for concurrent calls.
+
+Most of the work we do concurrently is waiting on the census servers,
+so threads are appropriate. We keep the number modest so that we do not
+overwhelm the servers or trip rate limiting.
+"""
+
+
+def max_workers() -> int:
+    """
+    Get the maximum number of threads used for concurrent calls.
+
+    Returns
+    -------
+        The maximum number of worker threads.
+    """
+    return _MAX_WORKERS
+
+
+def set_max_workers(workers: int) -> None:
+    """
+    Set the maximum number of threads used for concurrent calls.
+
+    Parameters
+    ----------
+    workers
+        The maximum number of worker threads. Use `1` to make all calls
+        serially in the calling thread.
+    """
+    global _MAX_WORKERS
+
+    if workers < 1:
+        raise ValueError(f"The maximum number of workers must be >= 1, not {workers}.")
+
+    _MAX_WORKERS = workers
+
+
+def concurrent_map(
+    func: Callable[[T], R], items: Iterable[T], workers: Optional[int] = None
+) -> List[R]:
+    """
+    Apply a function to each of a collection of items concurrently.
+
+    This is like the built-in `map`, but the calls are made in a pool
+    of threads. The results are returned in the same order as the items.
+    If any call raises an exception, it is re-raised in the calling thread.
+
+    Parameters
+    ----------
+    func
+        The function to apply.
+    items
+        The items to apply it to.
+    workers
+        The maximum number of threads to use. If `None`, use
+        :py:func:`max_workers`.
+
+    Returns
+    -------
+        A list of the results of calling `func` on each item.
+    """
+    items = list(items)
+
+    if workers is None:
+        workers = _MAX_WORKERS
+
+    workers = min(workers, len(items))
+
+    # No point in a pool if there is only one thing to do.
+    if workers <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
+
+
+def concurrent_imap_unordered(
+    func: Callable[[T], R], items: Iterable[T], workers: Optional[int] = None
+) -> Generator[R, None, None]:
+    """
+    Apply a function to each of a collection of items concurrently, yielding results as they complete.
+
+    Unlike :py:func:`concurrent_map`, results are yielded in the order the
+    calls finish, not the order of the items, and at most `workers` calls are
+    in flight at any time. Items are not taken from `items` until there is a
+    worker free to process them. Together, these bound the number of results
+    held in memory at once, no matter how many items there are.
+
+    If any call raises an exception, it is re-raised in the consuming thread
+    and calls that have not started are cancelled. The same happens if the
+    consumer stops iterating early.
+
+    Parameters
+    ----------
+    func
+        The function to apply.
+    items
+        The items to apply it to.
+    workers
+        The maximum number of threads to use. If `None`, use
+        :py:func:`max_workers`.
+
+    Returns
+    -------
+        A generator of the results of calling `func` on each item.
+    """
+    items = iter(items)
+
+    if workers is None:
+        workers = _MAX_WORKERS
+
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    try:
+        pending = {executor.submit(func, item) for item in islice(items, workers)}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            # Keep the workers busy while the consumer deals with what is done.
+            pending.update(
+                executor.submit(func, item) for item in islice(items, len(done))
+            )
+
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
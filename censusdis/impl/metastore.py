@@ -0,0 +1,355 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""
+A persistent store of metadata about census data sets.
+
+Metadata about the variables and groups in a published vintage of a data set
+does not change, so once we have fetched it from the census API there is no
+need to fetch it again, even in a different process. This module stores it
+in a SQLite database on local disk that any number of processes can read
+concurrently.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from censusdis.impl.varsource.base import VintageType
+
+
+class SqliteMetadataStore:
+    """
+    Metadata about variables, groups and other documents, stored in SQLite.
+
+    Values are stored as JSON, keyed by data set, vintage and name. Each
+    thread gets its own connection, and the database is put in write-ahead
+    logging mode so that readers in other processes are not blocked by a
+    writer.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS variables (
+            dataset TEXT NOT NULL,
+            year TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (dataset, year, name)
+        );
+        CREATE TABLE IF NOT EXISTS groups (
+            dataset TEXT NOT NULL,
+            year TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (dataset, year, name)
+        );
+        CREATE TABLE IF NOT EXISTS documents (
+            dataset TEXT NOT NULL,
+            year TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (dataset, year, kind)
+        );
+    """
+
+    _MAX_PARAMETERS = 500
+
+    _MMAP_SIZE = 1 << 30
+    """How much of a read-only store to memory map."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        timeout: float = 30.0,
+        read_only: bool = False,
+    ):
+        """
+        Open or create a metadata store.
+
+        Parameters
+        ----------
+        path
+            The path to the SQLite database file. It will be created,
+            along with any missing parent directories, if it does not exist.
+        timeout
+            How long, in seconds, to wait for a lock held by another
+            process or thread before giving up.
+        read_only
+            If `True`, open an existing store that will not change, like
+            a snapshot built by :py:func:`censusdis.impl.snapshot.build_snapshot`.
+            It is memory mapped and not opened until it is first used.
+        """
+        self._path = Path(path)
+        self._timeout = timeout
+        self._read_only = read_only
+        self._local = threading.local()
+
+        if read_only:
+            if not self._path.is_file():
+                raise ValueError(f"There is no metadata store at {self._path}.")
+            return
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(self._SCHEMA)
+
+    @property
+    def path(self) -> Path:
+        """The path to the database file."""
+        return self._path
+
+    @property
+    def read_only(self) -> bool:
+        """Whether the store is read-only."""
+        return self._read_only
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread."""
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            if self._read_only:
+                # Immutable means SQLite can skip locking and change detection.
+                connection = sqlite3.connect(
+                    f"{self._path.resolve().as_uri()}?mode=ro&immutable=1",
+                    uri=True,
+                    timeout=self._timeout,
+                )
+                connection.execute(f"PRAGMA mmap_size={self._MMAP_SIZE}")
+            else:
+                connection = sqlite3.connect(self._path, timeout=self._timeout)
+            self._local.connection = connection
+
+        return connection
+
+    @staticmethod
+    def _year(year: VintageType) -> str:
+        return str(year)
+
+    @staticmethod
+    def _group(name: Optional[str]) -> str:
+        # The whole data set, for data sets without groups, is stored under "".
+        return "" if name is None else name
+
+    def _get(self, table: str, key_column: str, dataset, year, name) -> Optional[Any]:
+        row = (
+            self._connection()
+            .execute(
+                f"SELECT value FROM {table} WHERE dataset = ? AND year = ? AND {key_column} = ?",
+                (dataset, self._year(year), name),
+            )
+            .fetchone()
+        )
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def _put_many(
+        self,
+        table: str,
+        dataset: str,
+        year: VintageType,
+        items: Iterable[Tuple[str, Any]],
+    ) -> None:
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)",
+                (
+                    (dataset, self._year(year), name, json.dumps(value))
+                    for name, value in items
+                ),
+            )
+
+    def get_variable(
+        self, dataset: str, year: VintageType, name: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get the stored description of a variable.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        name
+            The name of the variable.
+
+        Returns
+        -------
+            The description of the variable, or `None` if it is not stored.
+        """
+        return self._get("variables", "name", dataset, year, name)
+
+    def get_variables(
+        self, dataset: str, year: VintageType, names: Iterable[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the stored descriptions of any number of variables.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        names
+            The names of the variables.
+
+        Returns
+        -------
+            A dictionary from the names of the variables that are stored
+            to their descriptions. Variables that are not stored are left out.
+        """
+        names = list(names)
+        connection = self._connection()
+
+        values = {}
+
+        # Stay well under SQLite's limit on the number of parameters.
+        for start in range(0, len(names), self._MAX_PARAMETERS):
+            batch = names[start : start + self._MAX_PARAMETERS]  # noqa: E203
+            rows = connection.execute(
+                "SELECT name, value FROM variables WHERE dataset = ? AND year = ? "
+                f"AND name IN ({','.join('?' * len(batch))})",
+                (dataset, self._year(year), *batch),
+            )
+            values.update((name, json.loads(value)) for name, value in rows)
+
+        return values
+
+    def put_variables(
+        self, dataset: str, year: VintageType, variables: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """
+        Store the descriptions of any number of variables.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        variables
+            A dictionary from the names of variables to their descriptions.
+        """
+        self._put_many("variables", dataset, year, variables.items())
+
+    def get_group(
+        self, dataset: str, year: VintageType, name: Optional[str]
+    ) -> Optional[List[str]]:
+        """
+        Get the names of the variables in a stored group.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        name
+            The name of the group, or `None` for all the variables in
+            a data set.
+
+        Returns
+        -------
+            The names of the variables in the group, or `None` if it is not stored.
+        """
+        return self._get("groups", "name", dataset, year, self._group(name))
+
+    def put_group(
+        self,
+        dataset: str,
+        year: VintageType,
+        name: Optional[str],
+        members: Iterable[str],
+    ) -> None:
+        """
+        Store the names of the variables in a group.
+
+        The descriptions of the variables themselves should be stored
+        with :py:meth:`put_variables`.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        name
+            The name of the group, or `None` for all the variables in
+            a data set.
+        members
+            The names of the variables in the group.
+        """
+        self._put_many("groups", dataset, year, [(self._group(name), list(members))])
+
+    def get_document(self, dataset: str, year: VintageType, kind: str) -> Optional[Any]:
+        """
+        Get some other stored metadata about a data set, like the list of all groups.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        kind
+            What kind of document it is, for example `"groups"`.
+
+        Returns
+        -------
+            The document, or `None` if it is not stored.
+        """
+        return self._get("documents", "kind", dataset, year, kind)
+
+    def put_document(self, dataset: str, year: VintageType, kind: str, value: Any):
+        """
+        Store some other metadata about a data set.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        kind
+            What kind of document it is, for example `"groups"`.
+        value
+            The document. It must be serializable as JSON.
+        """
+        self._put_many("documents", dataset, year, [(kind, value)])
+
+    def compact(self) -> None:
+        """
+        Make the store a single compact file.
+
+        This leaves write-ahead logging mode, so everything is in the main
+        database file, and reclaims unused space. It is done before a store
+        is distributed as a read-only snapshot.
+        """
+        connection = self._connection()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("PRAGMA journal_mode=DELETE")
+        connection.execute("VACUUM")
+
+    def close(self) -> None:
+        """Close the connection for the current thread, if there is one."""
+        connection = getattr(self._local, "connection", None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def clear(self) -> None:
+        """Remove everything from the store."""
+        connection = self._connection()
+        with connection:
+            for table in ["variables", "groups", "documents"]:
+                connection.execute(f"DELETE FROM {table}")
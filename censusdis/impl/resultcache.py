@@ -0,0 +1,197 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""
+A persistent cache of the results of :py:func:`censusdis.data.download`.
+
+Each result is kept in its own Arrow IPC (Feather V2) file, named after a
+hash of the query that produced it. Files are written uncompressed so
+they can be memory mapped when they are read back, which makes loading
+a large result far cheaper than downloading, parsing, coercing and
+joining geometry to it again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+
+logger = getLogger(__name__)
+
+
+_FORMAT_VERSION = 1
+"""
+The version of the layout of cache files.
+
+It is part of every key, so changing it orphans all existing entries
+rather than having them misread.
+"""
+
+_GEOMETRY_METADATA_KEY = b"censusdis.geometry"
+"""The schema metadata key that marks results that were :py:class:`gpd.GeoDataFrame`."""
+
+
+def _normalize(value: Any) -> Any:
+    """Convert a query argument into something that serializes to JSON canonically."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalize(v) for v in value), key=repr)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    # Other iterables, like generators or numpy arrays.
+    if hasattr(value, "__iter__"):
+        return [_normalize(v) for v in value]
+    return str(value)
+
+
+class ResultCache:
+    """
+    A directory of cached download results.
+
+    Any number of processes can share a cache directory. Entries are written
+    to a temporary file and then moved into place, so readers never see a
+    partially written entry.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Construct a cache.
+
+        Parameters
+        ----------
+        path
+            The directory to keep cached results in. It is created if
+            it does not exist.
+        """
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def path(self) -> Path:
+        """The directory cached results are kept in."""
+        return self._path
+
+    @staticmethod
+    def key(**query: Any) -> str:
+        """
+        Compute the key for a query.
+
+        Parameters
+        ----------
+        query
+            The arguments that determine the result, like the data set,
+            vintage, variables and geography.
+
+        Returns
+        -------
+            A key that is the same for any two queries with the same arguments.
+        """
+        document = json.dumps(
+            {"format": _FORMAT_VERSION, **_normalize(query)},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        """Get the path to the file for a key."""
+        return self._path / f"{key}.arrow"
+
+    def __contains__(self, key: str) -> bool:
+        """Check whether there is a result for a key."""
+        return self._entry_path(key).exists()
+
+    def get(self, key: str) -> Optional[Union[pd.DataFrame, gpd.GeoDataFrame]]:
+        """
+        Load a cached result.
+
+        Parameters
+        ----------
+        key
+            The key, from :py:meth:`key`.
+
+        Returns
+        -------
+            The result, or `None` if there isn't one.
+        """
+        entry_path = self._entry_path(key)
+
+        try:
+            source = pa.memory_map(str(entry_path), "r")
+        except FileNotFoundError:
+            return None
+
+        with source:
+            table = pa.ipc.open_file(source).read_all()
+
+            metadata = table.schema.metadata or {}
+            if _GEOMETRY_METADATA_KEY in metadata:
+                return gpd.GeoDataFrame.from_arrow(table)
+
+            # This copies numeric columns into ordinary, writable blocks. Handing
+            # out read-only views of the mapped file would break in-place updates.
+            return table.to_pandas()
+
+    def put(self, key: str, df: Union[pd.DataFrame, gpd.GeoDataFrame]) -> bool:
+        """
+        Store a result.
+
+        Parameters
+        ----------
+        key
+            The key, from :py:meth:`key`.
+        df
+            The result.
+
+        Returns
+        -------
+            `True` if the result was stored. Results with columns Arrow cannot
+            represent, for example of mixed types, are not stored.
+        """
+        try:
+            if isinstance(df, gpd.GeoDataFrame):
+                table = pa.table(df.to_arrow(index=None, geometry_encoding="WKB"))
+                table = table.replace_schema_metadata(
+                    {
+                        **(table.schema.metadata or {}),
+                        _GEOMETRY_METADATA_KEY: df.geometry.name.encode("utf-8"),
+                    }
+                )
+            else:
+                table = pa.Table.from_pandas(df)
+        except (pa.ArrowException, TypeError, ValueError) as exc:
+            logger.info("Not caching result %s: %s", key, exc)
+            return False
+
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_name(
+            f"{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+
+        try:
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            tmp_path.replace(entry_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        return True
+
+    def pop(self, key: str) -> None:
+        """Remove the result for a key, if there is one."""
+        self._entry_path(key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Remove all the results from the cache."""
+        for entry_path in self._path.glob("*.arrow"):
+            entry_path.unlink(missing_ok=True)
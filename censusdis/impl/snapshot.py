@@ -0,0 +1,129 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""
+Read-only snapshots of metadata about commonly used data sets.
+
+A snapshot is a :py:class:`~censusdis.impl.metastore.SqliteMetadataStore`
+that has been filled with metadata on all the variables, groups and
+geographies of a list of data sets and vintages, and then compacted into a
+single file. It can be built once on a machine with network access and then
+copied to machines without it, or baked into container images, so that
+processes start with the metadata they need already at hand.
+
+Snapshots are opened read-only and memory mapped, and nothing is read from
+them until it is needed.
+"""
+
+from collections import defaultdict
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+from censusdis.datasets import ACS1, ACS5, DECENNIAL_DHC, DECENNIAL_PUBLIC_LAW_94_171
+from censusdis.geography import PathSpec
+from censusdis.impl.metastore import SqliteMetadataStore
+from censusdis.impl.varcache import VariableCache
+from censusdis.impl.varindex import VariableIndex
+from censusdis.impl.varsource.base import VariableSource, VintageType
+from censusdis.impl.varsource.censusapi import CensusApiVariableSource
+
+logger = getLogger(__name__)
+
+
+DEFAULT_SNAPSHOT_DATASETS: List[Tuple[str, VintageType]] = (
+    [(ACS5, year) for year in range(2012, 2023)]
+    # There was no standard 1-year ACS release for 2020.
+    + [(ACS1, year) for year in range(2012, 2023) if year != 2020]
+    + [(DECENNIAL_PUBLIC_LAW_94_171, 2010), (DECENNIAL_PUBLIC_LAW_94_171, 2020)]
+    + [(DECENNIAL_DHC, 2020)]
+)
+"""The data sets and vintages snapshots contain by default."""
+
+
+def build_snapshot(
+    path: Union[str, Path],
+    datasets: Optional[Iterable[Tuple[str, VintageType]]] = None,
+    *,
+    variable_source: Optional[VariableSource] = None,
+) -> Path:
+    """
+    Build a snapshot of the metadata for a collection of data sets and vintages.
+
+    This has to be run somewhere with access to the census API. The resulting
+    file can then be used anywhere with
+    :py:func:`censusdis.data.set_metadata_snapshot_path`.
+
+    Parameters
+    ----------
+    path
+        Where to write the snapshot. If there is already a file there it
+        is replaced once the new snapshot is complete.
+    datasets
+        (dataset, vintage) pairs to put in the snapshot. If `None`, use
+        :py:data:`DEFAULT_SNAPSHOT_DATASETS`.
+    variable_source
+        Where to get metadata from. If `None`, the census API.
+
+    Returns
+    -------
+        The path to the snapshot.
+    """
+    path = Path(path)
+
+    if datasets is None:
+        datasets = DEFAULT_SNAPSHOT_DATASETS
+
+    if variable_source is None:
+        variable_source = CensusApiVariableSource()
+
+    # Build next to the destination and move it into place at the end, so
+    # no one ever opens a partial snapshot.
+    build_path = path.with_name(f"{path.name}.building")
+    if build_path.exists():
+        build_path.unlink()
+
+    store = SqliteMetadataStore(build_path)
+
+    for dataset, year in datasets:
+        logger.info("Adding %s in %s to the snapshot.", dataset, year)
+
+        variables = variable_source.get_group(dataset, year, None)["variables"]
+
+        store.put_variables(dataset, year, variables)
+        store.put_group(dataset, year, None, variables.keys())
+
+        # Derive the members of each group from the variables, rather than
+        # fetching every group separately.
+        group_members = defaultdict(list)
+        for name, variable in variables.items():
+            group = variable.get("group", None)
+            if group is not None and group != "N/A":
+                group_members[group].append(name)
+
+        for group, members in group_members.items():
+            store.put_group(dataset, year, group, members)
+
+        store.put_document(
+            dataset, year, "groups", variable_source.get_all_groups(dataset, year)
+        )
+        store.put_document(
+            dataset,
+            year,
+            VariableCache._VARIABLE_INDEX_DOCUMENT,
+            VariableIndex.from_variables(dataset, year, variables).to_document(),
+        )
+        store.put_document(
+            dataset,
+            year,
+            PathSpec._GEOGRAPHY_DOCUMENT,
+            {
+                num: path_spec.path
+                for num, path_spec in PathSpec._fetch_path_specs(dataset, year).items()
+            },
+        )
+
+    store.compact()
+    store.close()
+
+    build_path.replace(path)
+
+    return path
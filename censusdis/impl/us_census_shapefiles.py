@@ -6,6 +6,7 @@ Also includes utilities for managing downloaded shapefiles and
 for water clipping.
 """
 
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Callable, Tuple, Optional, List, Generator, Union
@@ -501,6 +502,7 @@ class _ShapefileRoot:
 
 __shapefile_root = _ShapefileRoot()
 __shapefile_readers: Dict[int, cmap.ShapeReader] = {}
+__shapefile_readers_lock = threading.Lock()
 
 
 def set_shapefile_path(shapefile_path: Union[Path, None]) -> None:
@@ -533,15 +535,16 @@ def get_shapefile_path() -> Union[Path, None]:
 
 
 def __shapefile_reader(year: int):
-    reader = __shapefile_readers.get(year, None)
+    with __shapefile_readers_lock:
+        reader = __shapefile_readers.get(year, None)
 
-    if reader is None:
-        reader = cmap.ShapeReader(
-            __shapefile_root.shapefile_root,
-            year,
-        )
+        if reader is None:
+            reader = cmap.ShapeReader(
+                __shapefile_root.shapefile_root,
+                year,
+            )
 
-        __shapefile_readers[year] = reader
+            __shapefile_readers[year] = reader
 
     return reader
 
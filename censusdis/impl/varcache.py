@@ -1,11 +1,9 @@
 # Copyright (c) 2022 Darren Erik Vengroff
 """Variable cache code to cache metatada about variables locally."""
 
-from collections import defaultdict
 from logging import getLogger
 from typing import (
     Any,
-    DefaultDict,
     Dict,
     Generator,
     Iterable,
@@ -19,8 +17,12 @@ import numpy as np
 import pandas as pd
 
 from censusdis import CensusApiException
+from censusdis.impl.cache import UNCHANGED, CacheInfo, LRUCache, SingleFlight
+from censusdis.impl.concurrency import concurrent_map
 from censusdis.impl.varsource.base import VariableSource
 from censusdis.impl.varsource.censusapi import CensusApiVariableSource
+from censusdis.impl.varsource.sqlite import SqliteVariableSource
+from censusdis.impl.varindex import VariableIndex
 
 import censusdis.datasets
 
@@ -30,6 +32,52 @@ import re
 logger = getLogger(__name__)
 
 
+class _GroupTreeArrays:
+    """
+    The nodes of a group tree, stored in parallel lists.
+
+    Node `i` has name `names[i]` and children `children[i]`, a
+    dictionary from path component to the index of the child.
+    """
+
+    __slots__ = ("names", "children")
+
+    def __init__(self):
+        self.names: List[Optional[str]] = []
+        self.children: List[Dict[str, int]] = []
+
+    def add_node(self, name: Optional[str] = None) -> int:
+        """Add a node with no children and return its index."""
+        self.names.append(name)
+        self.children.append({})
+        return len(self.names) - 1
+
+    def copy(self) -> "_GroupTreeArrays":
+        """Copy the tree, so that changes to the copy do not affect the original."""
+        tree = _GroupTreeArrays()
+        tree.names = list(self.names)
+        tree.children = [dict(children) for children in self.children]
+        return tree
+
+    def graft(self, other: "_GroupTreeArrays", index: int) -> int:
+        """Copy the subtree at `index` in another tree into this one and return its new index."""
+        new_index = self.add_node(other.names[index])
+        for component, child in other.children[index].items():
+            self.children[new_index][component] = self.graft(other, child)
+        return new_index
+
+    def leaves(self, index: int) -> Generator[int, None, None]:
+        """Generate the indices of the leaves at or below a node, depth first."""
+        stack = [index]
+        while stack:
+            index = stack.pop()
+            children = self.children[index]
+            if not children:
+                yield index
+            else:
+                stack.extend(reversed(children.values()))
+
+
 class VariableCache:
     """
     A cache of variables and groups.
@@ -42,20 +90,111 @@ class VariableCache:
     `censusdis.censusdata.variables`.
     """
 
+    _DEFAULT_CACHE_LIMITS: Dict[str, Dict[str, Optional[int]]] = {
+        "variables": {"max_entries": None, "max_bytes": 256 * 1024 * 1024},
+        "groups": {"max_entries": None, "max_bytes": 64 * 1024 * 1024},
+        "variable_indexes": {"max_entries": 32, "max_bytes": 256 * 1024 * 1024},
+        "group_trees": {"max_entries": 4096, "max_bytes": None},
+        "data_sets": {"max_entries": 64, "max_bytes": None},
+    }
+    """The default limits on the size of each of our in-memory caches."""
+
     def __init__(self, *, variable_source: Optional[VariableSource] = None):
         if variable_source is None:
             variable_source = CensusApiVariableSource()
 
         self._variable_source = variable_source
-        self._variable_cache: DefaultDict[str, DefaultDict[int, Dict[str, Any]]] = (
-            defaultdict(lambda: defaultdict(dict))
-        )
-        self._group_cache: DefaultDict[str, DefaultDict[int, Dict[str, Any]]] = (
-            defaultdict(lambda: defaultdict(dict))
-        )
+
+        # Descriptions of variables, keyed by (dataset, year, name).
+        self._variable_cache = LRUCache(**self._DEFAULT_CACHE_LIMITS["variables"])
+
+        # Names of the variables in groups, keyed by (dataset, year, group).
+        self._group_cache = LRUCache(**self._DEFAULT_CACHE_LIMITS["groups"])
+
+        # Indexes over all the variables in a data set, keyed by (dataset, year).
+        self._index_cache = LRUCache(**self._DEFAULT_CACHE_LIMITS["variable_indexes"])
+
+        # Trees, leaves and variables of groups, keyed by what they are,
+        # the dataset, year and group, and the flags used to build them.
+        self._group_tree_cache = LRUCache(**self._DEFAULT_CACHE_LIMITS["group_trees"])
 
         self._all_data_sets_cache: Optional[pd.DataFrame] = None
-        self._data_sets_by_year_cache: Dict[int, pd.DataFrame] = {}
+        self._data_sets_by_year_cache = LRUCache(
+            **self._DEFAULT_CACHE_LIMITS["data_sets"]
+        )
+
+        # Fetches from the source are made one at a time per key.
+        self._single_flight = SingleFlight()
+
+    @property
+    def variable_source(self) -> VariableSource:
+        """The source behind the cache that we get variables from on a miss."""
+        return self._variable_source
+
+    @variable_source.setter
+    def variable_source(self, variable_source: VariableSource) -> None:
+        """
+        Change the source behind the cache.
+
+        What is already in the cache is kept, since it came from the
+        same underlying data, just by a different route.
+        """
+        self._variable_source = variable_source
+
+    def _caches(self) -> Dict[str, LRUCache]:
+        return {
+            "variables": self._variable_cache,
+            "groups": self._group_cache,
+            "variable_indexes": self._index_cache,
+            "group_trees": self._group_tree_cache,
+            "data_sets": self._data_sets_by_year_cache,
+        }
+
+    def cache_info(self) -> Dict[str, CacheInfo]:
+        """
+        Describe the current footprint of each of our in-memory caches.
+
+        Returns
+        -------
+            A dictionary from the name of each cache, `"variables"`, `"groups"`,
+            `"variable_indexes"`, `"group_trees"` and `"data_sets"`, to
+            information on its size, limits, hits and misses.
+        """
+        return {name: cache.info() for name, cache in self._caches().items()}
+
+    def set_cache_limits(
+        self,
+        cache: str,
+        *,
+        max_entries: Optional[int] = UNCHANGED,
+        max_bytes: Optional[int] = UNCHANGED,
+    ) -> None:
+        """
+        Limit the size of one of our in-memory caches.
+
+        When a cache goes over a limit, the least recently used entries are
+        evicted. They will be fetched again if they are needed.
+
+        Parameters
+        ----------
+        cache
+            The name of the cache, as in the keys of what :py:meth:`cache_info`
+            returns.
+        max_entries
+            The most entries to hold, or `None` for no limit. If not
+            specified, the current limit is left as it is.
+        max_bytes
+            The most bytes of memory the entries should use, or `None` for no limit.
+            Sizes are estimates. If not specified, the current limit is left as it is.
+        """
+        caches = self._caches()
+
+        if cache not in caches:
+            raise ValueError(
+                f"Unknown cache '{cache}'. Must be one of {list(caches.keys())}."
+            )
+
+        caches[cache].set_limits(max_entries=max_entries, max_bytes=max_bytes)
 
     def get(
         self,
@@ -84,14 +223,21 @@ class VariableCache:
         -------
             The details of the variable.
         """
-        cached_value = self._variable_cache[dataset][year].get(name, None)
+        key = (dataset, year, name)
+
+        cached_value = self._variable_cache.get(key, None)
 
         if cached_value is not None:
             return cached_value
 
-        value = self._variable_source.get(dataset, year, name)
+        with self._single_flight.lock(("variable",) + key):
+            # Another thread may have fetched it while we waited.
+            value = self._variable_cache.get(key, None)
+
+            if value is None:
+                value = self._variable_source.get(dataset, year, name)
 
-        self._variable_cache[dataset][year][name] = value
+                self._variable_cache[key] = value
 
         return value
 
@@ -131,23 +277,32 @@ class VariableCache:
             the documentation for
             :py:meth:`VariableSource.get`.
         """
-        group_variable_names = self._group_cache[dataset][year].get(name, None)
+        key = (dataset, year, name)
+
+        group_variable_names = self._group_cache.get(key, None)
 
         if group_variable_names is None:
-            # Missed in the cache, so go fetch it.
-            value = self._variable_source.get_group(dataset, year, name)
+            with self._single_flight.lock(("group",) + key):
+                # Another thread may have fetched it while we waited.
+                group_variable_names = self._group_cache.get(key, None)
 
-            # Cache all the variables in the group.
-            group_variables = value["variables"]
+                if group_variable_names is None:
+                    # Missed in the cache, so go fetch it.
+                    value = self._variable_source.get_group(dataset, year, name)
 
-            for variable_name, variable_details in group_variables.items():
-                self._variable_cache[dataset][year][variable_name] = variable_details
+                    # Cache all the variables in the group.
+                    group_variables = value["variables"]
 
-            # Cache the names of the variables in the group.
-            group_variable_names = list(
-                variable_name for variable_name in group_variables
-            )
-            self._group_cache[dataset][year][name] = group_variable_names
+                    self._variable_cache.update(
+                        ((dataset, year, variable_name), variable_details)
+                        for variable_name, variable_details in group_variables.items()
+                    )
+
+                    # Cache the names of the variables in the group.
+                    group_variable_names = list(
+                        variable_name for variable_name in group_variables
+                    )
+                    self._group_cache[key] = group_variable_names
 
         # Optionally filter out the variables that are in
         # alphabetical subgroups.
@@ -169,22 +324,107 @@ class VariableCache:
             for group_variable_name in group_variable_names
         }
 
+    _MIN_PREFETCH_VARIABLES = 4
+    """If fewer than this many variables are missing, :py:meth:`prefetch` leaves them to :py:meth:`get`."""
+
+    _MAX_PREFETCH_GROUPS = 8
+    """
+    The most groups :py:meth:`prefetch` will fetch individually.
+
+    If the variables come from more groups than this, we fetch
+    metadata on all the variables in the data set instead.
+    """
+
+    def prefetch(self, dataset: str, year: int, names: Iterable[str]) -> None:
+        """
+        Bulk load metadata on many variables into the cache.
+
+        Rather than fetching each variable that is not already in the
+        cache separately, we fetch the groups they belong to, or, if they
+        come from many groups, all the variables in the data set, in a small
+        number of calls to the source.
+
+        This is an optimization only. Any variables that are still not in
+        the cache afterwards, for example because they are not in any group,
+        will be fetched individually by :py:meth:`get` as usual. Errors are
+        also left to :py:meth:`get` to report.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        names
+            The names of the variables.
+        """
+        missing = [
+            name
+            for name in dict.fromkeys(names)
+            if (dataset, year, name) not in self._variable_cache
+        ]
+
+        if len(missing) < self._MIN_PREFETCH_VARIABLES:
+            return
+
+        # Variables like B01001_001E are in groups like B01001.
+        groups = list(
+            dict.fromkeys(name.split("_")[0] for name in missing if "_" in name)
+        )
+
+        def get_group_eat_errors(group_name: Optional[str]) -> None:
+            try:
+                self.get_group(dataset, year, group_name)
+            except CensusApiException as exc:
+                logger.debug(
+                    "Unable to prefetch group %s of %s in %s.",
+                    group_name,
+                    dataset,
+                    year,
+                    exc_info=exc,
+                )
+
+        if 0 < len(groups) <= self._MAX_PREFETCH_GROUPS:
+            concurrent_map(get_group_eat_errors, groups)
+        else:
+            get_group_eat_errors(None)
+
     class GroupTreeNode:
-        """A node in a tree of variables that make up a group."""
+        """
+        A node in a tree of variables that make up a group.
+
+        All the nodes of a tree share a compact array-backed representation.
+        Each node is just a lightweight view of one position in it.
+        """
+
+        __slots__ = ("_tree", "_index")
 
         def __init__(self, name: Optional[str] = None):
-            self._name = name
+            self._tree = _GroupTreeArrays()
+            self._index = self._tree.add_node(name)
+
+        @classmethod
+        def _view(
+            cls, tree: "_GroupTreeArrays", index: int
+        ) -> "VariableCache.GroupTreeNode":
+            """Construct a node that is a view of a position in an existing tree."""
+            node = cls.__new__(cls)
+            node._tree = tree
+            node._index = index
+            return node
 
-            self._children: Dict[str, "VariableCache.GroupTreeNode"] = {}
+        @property
+        def _children(self) -> Dict[str, int]:
+            return self._tree.children[self._index]
 
         @property
         def name(self):
             """The name of the node."""
-            return self._name
+            return self._tree.names[self._index]
 
         @name.setter
         def name(self, name: Optional[str]):
-            self._name = name
+            self._tree.names[self._index] = name
 
         def add_child(self, path_component: str, child: "VariableCache.GroupTreeNode"):
             """
@@ -202,7 +442,13 @@ class VariableCache:
             -------
                 None
             """
-            self._children[path_component] = child
+            if child._tree is not self._tree:
+                # Copy the child's subtree into our tree and
+                # make the child a view of the copy.
+                child._index = self._tree.graft(child._tree, child._index)
+                child._tree = self._tree
+
+            self._children[path_component] = child._index
 
         def is_leaf(self) -> bool:
             """
@@ -224,7 +470,9 @@ class VariableCache:
 
         def __getitem__(self, component: str):
             """Get a child of a node."""
-            return self._children[component]
+            return VariableCache.GroupTreeNode._view(
+                self._tree, self._children[component]
+            )
 
         def keys(self) -> Generator[str, None, None]:
             """
@@ -261,8 +509,8 @@ class VariableCache:
             -------
                 The items
             """
-            for component, node in self._children.items():
-                yield component, node
+            for component, index in self._children.items():
+                yield component, VariableCache.GroupTreeNode._view(self._tree, index)
 
         def get(
             self, component, default: Optional["VariableCache.GroupTreeNode"] = None
@@ -281,7 +529,10 @@ class VariableCache:
             -------
                 The node below us or `default` if it is not there,
             """
-            return self._children.get(component, default)
+            index = self._children.get(component, None)
+            if index is None:
+                return default
+            return VariableCache.GroupTreeNode._view(self._tree, index)
 
         def leaves(self) -> Generator["VariableCache.GroupTreeNode", None, None]:
             """
@@ -294,10 +545,8 @@ class VariableCache:
             -------
                 All the leaves below us.
             """
-            if self.is_leaf():
-                yield self
-            for child in self._children.values():
-                yield from child.leaves()
+            for index in self._tree.leaves(self._index):
+                yield VariableCache.GroupTreeNode._view(self._tree, index)
 
         def leaf_variables(self) -> Generator[str, None, None]:
             """
@@ -310,7 +559,8 @@ class VariableCache:
             -------
                 The names of the leaves below us.
             """
-            yield from (leaf.name for leaf in self.leaves())
+            names = self._tree.names
+            yield from (names[index] for index in self._tree.leaves(self._index))
 
         @property
         def min_leaf_name(self) -> str:
@@ -319,7 +569,7 @@ class VariableCache:
 
         def _node_str(self, level: int, component: str, indent_prefix: str) -> str:
             line = indent_prefix * level
-            if len(self._children) > 0 or self._name is not None:
+            if len(self._children) > 0 or self.name is not None:
                 line = f"{line}+ {component}"
             if self.name is not None:
                 line = f"{line} ({self.name})"
@@ -334,7 +584,7 @@ class VariableCache:
             """
             rep = self._node_str(level, component, indent_prefix)
             for path_component, child in sorted(
-                self._children.items(), key=lambda t: t[1].min_leaf_name
+                self.items(), key=lambda t: t[1].min_leaf_name
             ):
                 rep = (
                     rep
@@ -348,7 +598,7 @@ class VariableCache:
             return "\n".join(
                 child.subtree_str(0, path_component, indent_prefix="    ")
                 for path_component, child in sorted(
-                    self._children.items(), key=lambda t: t[1].min_leaf_name
+                    self.items(), key=lambda t: t[1].min_leaf_name
                 )
             )
 
@@ -367,9 +617,13 @@ class VariableCache:
             A data frame of all the data sets for all years.
         """
         if self._all_data_sets_cache is None:
-            datasets = self._variable_source.get_datasets(year=None)
+            with self._single_flight.lock(("datasets", None)):
+                if self._all_data_sets_cache is None:
+                    datasets = self._variable_source.get_datasets(year=None)
 
-            self._all_data_sets_cache = self._datasets_from_source_dict(datasets)
+                    self._all_data_sets_cache = self._datasets_from_source_dict(
+                        datasets
+                    )
 
         return self._all_data_sets_cache
 
@@ -389,14 +643,19 @@ class VariableCache:
         -------
             A data frame of all the data sets for the year.
         """
-        if year not in self._data_sets_by_year_cache:
-            datasets = self._variable_source.get_datasets(year)
+        df_datasets = self._data_sets_by_year_cache.get(year, None)
 
-            self._data_sets_by_year_cache[year] = self._datasets_from_source_dict(
-                datasets
-            )
+        if df_datasets is None:
+            with self._single_flight.lock(("datasets", year)):
+                df_datasets = self._data_sets_by_year_cache.get(year, None)
+
+                if df_datasets is None:
+                    datasets = self._variable_source.get_datasets(year)
+
+                    df_datasets = self._datasets_from_source_dict(datasets)
+                    self._data_sets_by_year_cache[year] = df_datasets
 
-        return self._data_sets_by_year_cache[year]
+        return df_datasets
 
     @staticmethod
     def _datasets_from_source_dict(datasets) -> pd.DataFrame:
@@ -510,7 +769,8 @@ class VariableCache:
             vintage = [vintage]
 
         df_datasets = pd.concat(
-            (self.all_data_sets(year=year) for year in vintage), ignore_index=True
+            concurrent_map(lambda year: self.all_data_sets(year=year), vintage),
+            ignore_index=True,
         )
 
         if pattern is not None:
@@ -614,7 +874,7 @@ class VariableCache:
                     raise e
 
         df_groups = pd.concat(
-            (_all_groups_eat_404(year) for year in vintage), ignore_index=True
+            concurrent_map(_all_groups_eat_404, vintage), ignore_index=True
         )
 
         if pattern is not None:
@@ -682,25 +942,87 @@ class VariableCache:
 
             return None
 
+        def variable_row(variable_name: str) -> Dict[str, Any]:
+            variable = self.get(dataset, year, variable_name)
+            return {
+                "YEAR": year,
+                "DATASET": dataset,
+                "GROUP": variable.get("group", np.nan),
+                "VARIABLE": variable_name,
+                "LABEL": variable["label"],
+                "SUGGESTED_WEIGHT": variable.get("suggested-weight", np.nan),
+                "VALUES": variable_items(variable),
+            }
+
         return pd.DataFrame(
-            [
-                {
-                    "YEAR": year,
-                    "DATASET": dataset,
-                    "GROUP": self.get(dataset, year, variable_name).get(
-                        "group", np.nan
-                    ),
-                    "VARIABLE": variable_name,
-                    "LABEL": self.get(dataset, year, variable_name)["label"],
-                    "SUGGESTED_WEIGHT": self.get(dataset, year, variable_name).get(
-                        "suggested-weight", np.nan
-                    ),
-                    "VALUES": variable_items(self.get(dataset, year, variable_name)),
-                }
-                for variable_name in group_variables
-            ]
+            [variable_row(variable_name) for variable_name in group_variables]
         )
 
+    _VARIABLE_INDEX_DOCUMENT = "variable_index"
+    """The kind of document a :py:class:`VariableIndex` is persisted as."""
+
+    def variable_index(self, dataset: str, year: int) -> VariableIndex:
+        """
+        Get an index over all the variables in a data set.
+
+        The index is built the first time it is needed and then kept in
+        memory. If the variable source is a :py:class:`SqliteVariableSource`
+        it is also persisted there, so other processes don't have to build it.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+
+        Returns
+        -------
+            The index.
+        """
+        index = self._index_cache.get((dataset, year), None)
+
+        if index is not None:
+            return index
+
+        with self._single_flight.lock(("index", dataset, year)):
+            index = self._index_cache.get((dataset, year), None)
+
+            if index is None:
+                index = self._build_variable_index(dataset, year)
+                self._index_cache[(dataset, year)] = index
+
+        return index
+
+    def _build_variable_index(self, dataset: str, year: int) -> VariableIndex:
+        """Load a persisted index or build one from the metadata on all variables."""
+        # Persistent stores, like snapshots and the metadata cache, in the
+        # order the source looks in them.
+        stores = []
+        source = self._variable_source
+        while isinstance(source, SqliteVariableSource):
+            if source.persists(year):
+                stores.append(source.store)
+            source = source.backing_source
+
+        for store in stores:
+            document = store.get_document(dataset, year, self._VARIABLE_INDEX_DOCUMENT)
+            if document is not None:
+                return VariableIndex.from_document(dataset, year, document)
+
+        index = VariableIndex.from_variables(
+            dataset, year, self.get_group(dataset, year, None)
+        )
+
+        for store in stores:
+            if not store.read_only:
+                store.put_document(
+                    dataset, year, self._VARIABLE_INDEX_DOCUMENT, index.to_document()
+                )
+                break
+
+        return index
+
     def search(
         self,
         dataset: str,
@@ -709,6 +1031,7 @@ class VariableCache:
         group_name: Optional[str] = None,
         name: Optional[Union[str, Iterable[str]]] = None,
         pattern: Optional[Union[str, re.Pattern]] = None,
+        keywords: Optional[Union[str, Iterable[str]]] = None,
         case: bool = False,
         skip_annotations: bool = True,
         skip_subgroup_variables: bool = True,
@@ -731,6 +1054,11 @@ class VariableCache:
         pattern
             A regular expression to match against the name and description of a variable. This
             is used to filter down results. Normally at most one of `name` and `re` will be used.
+        keywords
+            One or more keywords. If not `None`, only variables where each keyword is the
+            start of a word in the name, label, concept or group of the variable are returned.
+            For example, `"hisp lat"` matches variables whose concept is
+            `"HISPANIC OR LATINO ORIGIN BY RACE"`. Keyword matches are not case sensitive.
         case:
             If `patters` is not `None` then indicates whether the regular expression match is
             case sensitive. Does not affect the `name` match.
@@ -755,19 +1083,37 @@ class VariableCache:
         if isinstance(vintage, int):
             vintage = [vintage]
 
-        def _all_variables_eat_404(year: int):
+        if isinstance(name, str):
+            name = [name]
+
+        if pattern is not None:
+            pattern = self._compile_pattern(pattern, case)
+
+        def _search_eat_404(year: int):
             """
             Skip bad year and return no results.
 
             We assume it is a bad year if we get a 404.
             """
             try:
-                return self.all_variables(
-                    dataset,
-                    year,
-                    group_name,
+                if group_name is None:
+                    index = self.variable_index(dataset, year)
+                else:
+                    index = VariableIndex.from_variables(
+                        dataset,
+                        year,
+                        self.get_group(
+                            dataset,
+                            year,
+                            group_name,
+                            skip_subgroup_variables=skip_subgroup_variables,
+                        ),
+                    )
+                return index.search(
+                    name=name,
+                    pattern=pattern,
+                    keywords=keywords,
                     skip_annotations=skip_annotations,
-                    skip_subgroup_variables=skip_subgroup_variables,
                 )
             except CensusApiException as e:
                 if "404" in str(e):
@@ -775,38 +1121,19 @@ class VariableCache:
                 else:
                     raise e
 
-        df_all_variables = pd.concat(
-            (_all_variables_eat_404(year) for year in vintage), ignore_index=True
+        df_matches = pd.concat(
+            concurrent_map(_search_eat_404, vintage), ignore_index=True
         )
 
-        # If we were given names to match on, then match on them.
-        if name is not None:
-            if isinstance(name, str):
-                name = [name]
-
-            df_name_matches = pd.concat(
-                [
-                    df_all_variables[df_all_variables["VARIABLE"] == var_name]
-                    for var_name in name
-                ],
-                axis="rows",
-            )
-        else:
-            df_name_matches = df_all_variables
-
-        if pattern is not None:
-            pattern = self._compile_pattern(pattern, case)
-
-            df_matches = df_name_matches[
-                (
-                    df_name_matches["VARIABLE"].str.contains(pattern)
-                    | df_name_matches["LABEL"].str.contains(pattern)
+        # Matches on names come back in the order the names were given.
+        if name is not None and len(df_matches.index) > 0:
+            df_matches = df_matches.iloc[
+                np.argsort(
+                    pd.Index(name).get_indexer(df_matches["VARIABLE"]), kind="stable"
                 )
             ]
-        else:
-            df_matches = df_name_matches
 
-        return pd.DataFrame(df_matches).reset_index(drop=True)
+        return df_matches.reset_index(drop=True)
 
     def group_tree(
         self,
@@ -833,11 +1160,40 @@ class VariableCache:
 
         Returns
         -------
-            A tree that can be printed or walked.
+            A tree that can be printed or walked. It is a copy of the one
+            that is cached, so callers are free to modify it.
+        """
+        root = self._shared_group_tree(
+            dataset, year, group_name, skip_annotations=skip_annotations
+        )
+
+        return VariableCache.GroupTreeNode._view(root._tree.copy(), root._index)
+
+    def _shared_group_tree(
+        self,
+        dataset: str,
+        year: int,
+        group_name: Optional[str],
+        *,
+        skip_annotations: bool = True,
+    ) -> "VariableCache.GroupTreeNode":
         """
+        Construct or look up the cached tree for a group.
+
+        The tree is shared with other callers, so it must not be modified.
+        See :py:meth:`~group_tree`.
+        """
+        key = ("tree", dataset, year, group_name, skip_annotations)
+
+        root = self._group_tree_cache.get(key, None)
+
+        if root is not None:
+            return root
+
         group = self.get_group(dataset, year, group_name)
 
-        root = VariableCache.GroupTreeNode()
+        tree = _GroupTreeArrays()
+        root_index = tree.add_node()
 
         for variable_name, details in group.items():
             path = details["label"].split("!!")
@@ -849,19 +1205,23 @@ class VariableCache:
             ):
                 continue
 
-            node = root
+            index = root_index
 
             # Construct a nested path of nodes down to the
             # leaf.
             for component in path:
-                child = node.get(component, None)
+                child = tree.children[index].get(component, None)
                 if child is None:
-                    child = VariableCache.GroupTreeNode()
-                    node.add_child(component, child)
-                node = child
+                    child = tree.add_node()
+                    tree.children[index][component] = child
+                index = child
 
             # Put the variable name at the lead.
-            node.name = variable_name
+            tree.names[index] = variable_name
+
+        root = VariableCache.GroupTreeNode._view(tree, root_index)
+
+        self._group_tree_cache[key] = root
 
         return root
 
@@ -903,20 +1263,29 @@ class VariableCache:
             to the total. We can use these directly in diversity and integration
             calculations using the `divintseg` package.
         """
-        tree = self.group_tree(dataset, year, name)
+        key = ("leaves", dataset, year, name, skip_annotations)
 
-        leaves = tree.leaf_variables()
+        leaves = self._group_tree_cache.get(key, None)
 
-        if skip_annotations:
-            group = self.get_group(dataset, year, name)
-            leaves = (
-                leaf
-                for leaf in leaves
-                if (not group[leaf]["label"].startswith("Annotation"))
-                and (not group[leaf]["label"].startswith("Margin of Error"))
-            )
+        if leaves is None:
+            tree = self._shared_group_tree(dataset, year, name)
+
+            leaves = tree.leaf_variables()
+
+            if skip_annotations:
+                group = self.get_group(dataset, year, name)
+                leaves = (
+                    leaf
+                    for leaf in leaves
+                    if (not group[leaf]["label"].startswith("Annotation"))
+                    and (not group[leaf]["label"].startswith("Margin of Error"))
+                )
+
+            leaves = sorted(leaves)
 
-        return sorted(leaves)
+            self._group_tree_cache[key] = leaves
+
+        return list(leaves)
 
     def group_variables(
         self,
@@ -956,27 +1325,88 @@ class VariableCache:
         -------
             A list of the variables in the group.
         """
-        tree = self.get_group(
-            dataset, year, group_name, skip_subgroup_variables=skip_subgroup_variables
+        key = (
+            "variables",
+            dataset,
+            year,
+            group_name,
+            skip_annotations,
+            skip_subgroup_variables,
         )
 
-        if skip_annotations:
-            group_variables = [
-                k
-                for k, v in tree.items()
-                if (not v["label"].startswith("Annotation"))
-                and (not v["label"].startswith("Margin of Error"))
-            ]
-        else:
-            group_variables = list(tree.keys())
+        group_variables = self._group_tree_cache.get(key, None)
+
+        if group_variables is None:
+            tree = self.get_group(
+                dataset,
+                year,
+                group_name,
+                skip_subgroup_variables=skip_subgroup_variables,
+            )
+
+            if skip_annotations:
+                group_variables = [
+                    k
+                    for k, v in tree.items()
+                    if (not v["label"].startswith("Annotation"))
+                    and (not v["label"].startswith("Margin of Error"))
+                ]
+            else:
+                group_variables = list(tree.keys())
+
+            group_variables = sorted(group_variables)
 
-        return sorted(group_variables)
+            self._group_tree_cache[key] = group_variables
+
+        return list(group_variables)
+
+    _NON_ADDITIVE_LABEL_PATTERN = re.compile(
+        r"\b(median|mean|average|percent|percentage|ratio|rate|per capita"
+        r"|index|quartile|quintile|gini)\b",
+        re.IGNORECASE,
+    )
+    """Words in labels that indicate that values cannot be summed across geographies."""
+
+    def is_additive(self, dataset: str, year: int, name: str) -> bool:
+        """
+        Determine whether the values of a variable can be summed across geographies.
+
+        Counts like `B03002_003E` ("Estimate!!Total:!!Not Hispanic or Latino:!!White alone")
+        are additive. The count for a county is the sum of the counts of the tracts
+        in it. Medians, means, percentages, ratios, and the like are not. Neither
+        are margins of error or annotations. We make this determination from the
+        type and label of the variable.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        name
+            The name of the variable.
+
+        Returns
+        -------
+            `True` if the variable is additive.
+        """
+        details = self.get(dataset, year, name)
+
+        if details.get("predicateType", None) not in ["int", "long"]:
+            return False
+
+        label = details.get("label", "")
+
+        if label.startswith("Annotation") or label.startswith("Margin of Error"):
+            return False
+
+        return self._NON_ADDITIVE_LABEL_PATTERN.search(label) is None
 
     def __contains__(self, item: Tuple[str, int, str]) -> bool:
         """Magic method behind the `in` operator."""
         source, year, name = item
 
-        return name in self._variable_cache[source][year]
+        return (source, year, name) in self._variable_cache
 
     def __getitem__(self, item: Tuple[str, int, str]):
         """Magic method behind the `[]` operator."""
@@ -984,11 +1414,7 @@ class VariableCache:
 
     def __len__(self):
         """Return he number of elements in the cache."""
-        return sum(
-            len(names)
-            for years in self._variable_cache.values()
-            for names in years.values()
-        )
+        return len(self._variable_cache)
 
     def keys(self) -> Iterable[Tuple[str, int, str]]:
         """Keys, i.e. the names of variables, in the cache."""
@@ -1006,18 +1432,16 @@ class VariableCache:
 
     def items(self) -> Iterable[Tuple[Tuple[str, int, str], dict]]:
         """Items in the mapping from variable name to descpription."""
-        for source, values_for_source in self._variable_cache.items():
-            for year, values_for_year in values_for_source.items():
-                for name, value in values_for_year.items():
-                    yield (source, year, name), value
+        # This is a snapshot, so other threads can keep using the cache.
+        yield from self._variable_cache.items()
 
     def invalidate(self, dataset: str, year: int, name: str):
         """Remove an item from the cache."""
-        if self._variable_cache[dataset][year].pop(name, None):
-            if len(self._variable_cache[dataset][year]) == 0:
-                self._variable_cache[dataset].pop(year)
-                if len(self._variable_cache[dataset]) == 0:
-                    self._variable_cache.pop(dataset)
+        self._index_cache.pop((dataset, year), None)
+        for key in self._group_tree_cache.keys():
+            if key[1] == dataset and key[2] == year:
+                self._group_tree_cache.pop(key, None)
+        self._variable_cache.pop((dataset, year, name), None)
 
     def clear(self):
         """
@@ -1026,4 +1450,7 @@ class VariableCache:
         This just means that further calls to :py:meth:`~get` will
         have to make a call to the source behind the cache.
         """
-        self._variable_cache = defaultdict(lambda: defaultdict(dict))
+        self._variable_cache.clear()
+        self._group_cache.clear()
+        self._index_cache.clear()
+        self._group_tree_cache.clear()
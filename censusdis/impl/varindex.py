@@ -0,0 +1,319 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""An inverted index over the metadata of all the variables in a data set."""
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from censusdis.impl.cache import estimate_size
+from censusdis.impl.varsource.base import VintageType
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+_REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+def _tokens(text: Optional[str]) -> List[str]:
+    """Split text into lower case alphanumeric tokens."""
+    if not isinstance(text, str):
+        return []
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class VariableIndex:
+    """
+    An inverted index over the variables in one vintage of one data set.
+
+    The index maps tokens in the names, labels, concepts and groups of variables
+    to the variables they appear in. It is used by :py:meth:`VariableCache.search`
+    to narrow down the set of variables a regular expression could match before
+    running the regular expression, and to support keyword searches.
+    """
+
+    def __init__(self, dataset: str, year: VintageType, columns: Dict[str, List[Any]]):
+        """
+        Construct an index.
+
+        Users will normally construct these with :py:meth:`from_variables`
+        or :py:meth:`from_document`.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        columns
+            Parallel lists of `"names"`, `"labels"`, `"concepts"`, `"groups"`,
+            `"suggested_weights"` and `"values"` of the variables, sorted by name.
+        """
+        self._dataset = dataset
+        self._year = year
+        self._columns = columns
+
+        self._names = np.asarray(columns["names"], dtype=object)
+        self._labels = np.asarray(columns["labels"], dtype=object)
+
+        self._annotation = np.array(
+            [
+                label.startswith("Annotation") or label.startswith("Margin of Error")
+                for label in columns["labels"]
+            ],
+            dtype=bool,
+        )
+
+        # Tokens in the names and labels, which is what regular expressions are
+        # matched against, and tokens in everything, for keyword searches.
+        text_postings = defaultdict(list)
+        all_postings = defaultdict(list)
+
+        for ii, (name, label, concept, group) in enumerate(
+            zip(
+                columns["names"],
+                columns["labels"],
+                columns["concepts"],
+                columns["groups"],
+            )
+        ):
+            text_tokens = set(_tokens(name)) | set(_tokens(label))
+            for token in text_tokens:
+                text_postings[token].append(ii)
+            for token in text_tokens | set(_tokens(concept)) | set(_tokens(group)):
+                all_postings[token].append(ii)
+
+        self._text_postings = {
+            token: np.asarray(rows, dtype=np.int64)
+            for token, rows in text_postings.items()
+        }
+        self._all_postings = {
+            token: np.asarray(rows, dtype=np.int64)
+            for token, rows in all_postings.items()
+        }
+        self._sorted_tokens = sorted(self._all_postings)
+
+    @classmethod
+    def from_variables(
+        cls, dataset: str, year: VintageType, variables: Dict[str, Dict[str, Any]]
+    ) -> "VariableIndex":
+        """
+        Build an index from the descriptions of all the variables in a data set.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        variables
+            A dictionary from variable names to descriptions, as in the
+            `"variables"` of what :py:meth:`VariableSource.get_group` returns.
+
+        Returns
+        -------
+            The index.
+        """
+        names = sorted(variables)
+
+        def variable_items(variable_dict: Dict) -> Optional[Dict[str, str]]:
+            if "values" in variable_dict:
+                return variable_dict["values"].get("item", np.nan)
+            return None
+
+        columns = {
+            "names": names,
+            "labels": [variables[name]["label"] for name in names],
+            "concepts": [variables[name].get("concept", None) for name in names],
+            "groups": [variables[name].get("group", None) for name in names],
+            "suggested_weights": [
+                variables[name].get("suggested-weight", None) for name in names
+            ],
+            "values": [variable_items(variables[name]) for name in names],
+        }
+
+        return cls(dataset, year, columns)
+
+    def to_document(self) -> Dict[str, List[Any]]:
+        """
+        Convert to a JSON-serializable document that can be persisted.
+
+        Returns
+        -------
+            The document. It can be turned back into an index with
+            :py:meth:`from_document`.
+        """
+        return self._columns
+
+    @classmethod
+    def from_document(
+        cls, dataset: str, year: VintageType, document: Dict[str, List[Any]]
+    ) -> "VariableIndex":
+        """
+        Construct an index from a document created by :py:meth:`to_document`.
+
+        Parameters
+        ----------
+        dataset
+            The census dataset.
+        year
+            The year
+        document
+            The document.
+
+        Returns
+        -------
+            The index.
+        """
+        return cls(dataset, year, document)
+
+    def __len__(self) -> int:
+        """Return the number of variables in the index."""
+        return len(self._names)
+
+    @property
+    def nbytes(self) -> int:
+        """An estimate of the number of bytes of memory the index uses."""
+        return (
+            estimate_size(self._columns)
+            + sum(rows.nbytes for rows in self._text_postings.values())
+            + sum(rows.nbytes for rows in self._all_postings.values())
+        )
+
+    def _rows_containing(self, fragment: str) -> np.ndarray:
+        """Find the rows with a name or label token that contains a fragment."""
+        postings = [
+            rows for token, rows in self._text_postings.items() if fragment in token
+        ]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(postings))
+
+    def _rows_with_prefix(self, prefix: str) -> np.ndarray:
+        """Find the rows with any token that starts with a prefix."""
+        postings = []
+        ii = bisect_left(self._sorted_tokens, prefix)
+        while ii < len(self._sorted_tokens) and self._sorted_tokens[ii].startswith(
+            prefix
+        ):
+            postings.append(self._all_postings[self._sorted_tokens[ii]])
+            ii = ii + 1
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(postings))
+
+    def _pattern_mask(self, pattern: re.Pattern) -> np.ndarray:
+        """Find the rows whose name or label match a regular expression."""
+        mask = np.ones(len(self), dtype=bool)
+
+        # If the pattern is a literal string, then every alphanumeric
+        # fragment of it has to be in some token in a matching row, so
+        # we can use the index to narrow down the candidates.
+        if not _REGEX_SPECIAL_CHARACTERS.intersection(pattern.pattern):
+            for fragment in _tokens(pattern.pattern):
+                fragment_mask = np.zeros(len(self), dtype=bool)
+                fragment_mask[self._rows_containing(fragment)] = True
+                mask &= fragment_mask
+
+        candidates = np.flatnonzero(mask)
+
+        matches = [
+            row
+            for row in candidates
+            if pattern.search(self._names[row]) or pattern.search(self._labels[row])
+        ]
+
+        mask = np.zeros(len(self), dtype=bool)
+        mask[matches] = True
+        return mask
+
+    def search(
+        self,
+        *,
+        name: Optional[Iterable[str]] = None,
+        pattern: Optional[re.Pattern] = None,
+        keywords: Optional[Union[str, Iterable[str]]] = None,
+        skip_annotations: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Search for variables.
+
+        Parameters
+        ----------
+        name
+            If not `None`, only return these variables, in this order.
+        pattern
+            If not `None`, only return variables whose name or label
+            matches this regular expression.
+        keywords
+            If not `None`, only return variables where each keyword is a prefix
+            of a word in the name, label, concept or group of the variable. Matching
+            is not case sensitive. For example, `"hisp lat"` matches
+            `"HISPANIC OR LATINO ORIGIN BY RACE"`.
+        skip_annotations
+            If `True` skip variables with labels that begin with "Annotation" or
+            "Margin of Error".
+
+        Returns
+        -------
+            A data frame of matching variables, in the same format as
+            :py:meth:`VariableCache.all_variables`.
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        if skip_annotations:
+            mask &= ~self._annotation
+
+        if keywords is not None:
+            if isinstance(keywords, str):
+                keywords = [keywords]
+            for keyword in (token for kw in keywords for token in _tokens(kw)):
+                keyword_mask = np.zeros(len(self), dtype=bool)
+                keyword_mask[self._rows_with_prefix(keyword)] = True
+                mask &= keyword_mask
+
+        if pattern is not None and mask.any():
+            mask &= self._pattern_mask(pattern)
+
+        if name is not None:
+            positions = pd.Index(self._names).get_indexer(list(name))
+            rows = [row for row in positions if row >= 0 and mask[row]]
+        else:
+            rows = np.flatnonzero(mask)
+
+        return pd.DataFrame(
+            {
+                "YEAR": self._year,
+                "DATASET": self._dataset,
+                "GROUP": [
+                    (
+                        np.nan
+                        if self._columns["groups"][row] is None
+                        else self._columns["groups"][row]
+                    )
+                    for row in rows
+                ],
+                "VARIABLE": [self._columns["names"][row] for row in rows],
+                "LABEL": [self._columns["labels"][row] for row in rows],
+                "SUGGESTED_WEIGHT": [
+                    (
+                        np.nan
+                        if self._columns["suggested_weights"][row] is None
+                        else self._columns["suggested_weights"][row]
+                    )
+                    for row in rows
+                ],
+                "VALUES": [self._columns["values"][row] for row in rows],
+            },
+            columns=[
+                "YEAR",
+                "DATASET",
+                "GROUP",
+                "VARIABLE",
+                "LABEL",
+                "SUGGESTED_WEIGHT",
+                "VALUES",
+            ],
+        )
@@ -0,0 +1,120 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""A variable source that persists metadata from another source in SQLite."""
+
+from numbers import Integral
+from typing import Any, Dict, List, Optional
+
+from censusdis.impl.metastore import SqliteMetadataStore
+from censusdis.impl.varsource.base import VariableSource, VintageType
+
+
+class SqliteVariableSource(VariableSource):
+    """
+    A :py:class:`~VariableSource` that persists what it gets from another source.
+
+    We look in a :py:class:`~SqliteMetadataStore` first. If we don't find what
+    we are looking for, we get it from the backing source, typically a
+    :py:class:`~CensusApiVariableSource`, and store it for next time, including
+    for other processes using the same store.
+
+    Information on which datasets exist is not persisted, since new ones are
+    published from time to time. Neither is metadata for vintages that are not
+    years, like `"timeseries"`, since the variables of those datasets change
+    over time. We always get that from the backing source.
+
+    If the store is read-only, as snapshots are, we look in it but don't
+    store anything in it.
+    """
+
+    def __init__(self, store: SqliteMetadataStore, backing_source: VariableSource):
+        """
+        Construct a persistent variable source.
+
+        Parameters
+        ----------
+        store
+            The store to persist metadata in.
+        backing_source
+            The source to get metadata from when it is not in the store.
+        """
+        self._store = store
+        self._backing_source = backing_source
+
+    @property
+    def store(self) -> SqliteMetadataStore:
+        """The store we persist metadata in."""
+        return self._store
+
+    @property
+    def backing_source(self) -> VariableSource:
+        """The source we get metadata from when it is not in the store."""
+        return self._backing_source
+
+    @staticmethod
+    def persists(year: VintageType) -> bool:
+        """
+        Determine whether metadata for a vintage is persisted.
+
+        Only vintages that are years are. Their metadata does not change once
+        it is published.
+        """
+        return isinstance(year, Integral) and not isinstance(year, bool)
+
+    def get(self, dataset: str, year: int, name: str) -> Dict[str, Any]:
+        """Get info on a variable from the store or the backing source."""
+        if not self.persists(year):
+            return self._backing_source.get(dataset, year, name)
+
+        value = self._store.get_variable(dataset, year, name)
+
+        if value is None:
+            value = self._backing_source.get(dataset, year, name)
+            if not self._store.read_only:
+                self._store.put_variables(dataset, year, {name: value})
+
+        return value
+
+    def get_group(
+        self, dataset: str, year: int, name: Optional[str]
+    ) -> Dict[str, Dict]:
+        """Get info on a group from the store or the backing source."""
+        if not self.persists(year):
+            return self._backing_source.get_group(dataset, year, name)
+
+        members = self._store.get_group(dataset, year, name)
+
+        if members is not None:
+            variables = self._store.get_variables(dataset, year, members)
+
+            # Normally everything will be there, but if not,
+            # fall through and get it all again.
+            if len(variables) == len(members):
+                return {"variables": {member: variables[member] for member in members}}
+
+        value = self._backing_source.get_group(dataset, year, name)
+
+        if not self._store.read_only:
+            # Store the variables before the group, so that other processes
+            # never see a group without its variables.
+            self._store.put_variables(dataset, year, value["variables"])
+            self._store.put_group(dataset, year, name, value["variables"].keys())
+
+        return value
+
+    def get_all_groups(self, dataset: str, year: int) -> Dict[str, List]:
+        """Get info on all the groups in a dataset from the store or the backing source."""
+        if not self.persists(year):
+            return self._backing_source.get_all_groups(dataset, year)
+
+        value = self._store.get_document(dataset, year, "groups")
+
+        if value is None:
+            value = self._backing_source.get_all_groups(dataset, year)
+            if not self._store.read_only:
+                self._store.put_document(dataset, year, "groups", value)
+
+        return value
+
+    def get_datasets(self, year: Optional[int]) -> Dict[str, Any]:
+        """Get info on all the datasets for a given year from the backing source."""
+        return self._backing_source.get_datasets(year)
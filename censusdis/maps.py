@@ -24,6 +24,7 @@ from shapely.geometry import MultiPolygon, Point, Polygon
 from shapely.geometry.base import BaseGeometry
 import matplotlib.patheffects as pe
 
+from censusdis.impl.cache import SingleFlight
 from censusdis.impl.exceptions import CensusApiException
 from censusdis.impl.fetch import certificates
 from censusdis.states import AK, HI, NAMES_FROM_IDS, PR
@@ -35,6 +36,10 @@ class MapException(CensusApiException):
     """An exception generated from `censusdis.maps` code."""
 
 
+_FETCH_FILE_SINGLE_FLIGHT = SingleFlight()
+"""Makes sure only one thread downloads each shapefile."""
+
+
 class ShapeReader:
     """
     A class for reading shapefiles into GeoPandas GeoDataFrames.
@@ -444,66 +449,69 @@ class ShapeReader:
     ) -> None:
         dir_path = self._shapefile_root / name
 
-        if dir_path.is_dir():
-            # Does it have the .shp file? If not maybe something
-            # random went wrong in the previous attempt, or someone
-            # deleted some stuff by mistake. So delete it and
-            # reload.
-            shp_path = dir_path / f"{name}.shp"
-            if shp_path.is_file():
-                # Looks like the shapefile is there.
-                return
-
-            # No shapefile so remove the whole directory and
-            # hope for the best when we recreate it.
-            shutil.rmtree(dir_path)
-
-        # Make the directory
-        dir_path.mkdir()
-
-        # We will put the zip file in the dir we just created.
-        zip_path = dir_path / f"{name}.zip"
-
-        # Construct the URL to get the zip file.
-        # url = self._url_for_file(name)
-        zip_url = f"{base_url}/{name}.zip"
-
-        # Fetch the zip file and write it.
-        response = requests.get(
-            zip_url,
-            timeout=timeout,
-            cert=certificates.map_cert,
-            verify=certificates.map_verify,
-        )
-
-        if response.status_code == 404:
-            raise MapException(
-                f"{zip_url} was not found. "
-                "The Census Bureau may not publish the shapefile you are looking for for the given year. "
-                "Or the file you are looking for may be from a year where a naming convention that censusdis "
-                "does not recognize was used."
+        # If several threads want the same file, only one of them
+        # downloads it. The rest wait and then find it there.
+        with _FETCH_FILE_SINGLE_FLIGHT.lock(dir_path.resolve()):
+            if dir_path.is_dir():
+                # Does it have the .shp file? If not maybe something
+                # random went wrong in the previous attempt, or someone
+                # deleted some stuff by mistake. So delete it and
+                # reload.
+                shp_path = dir_path / f"{name}.shp"
+                if shp_path.is_file():
+                    # Looks like the shapefile is there.
+                    return
+
+                # No shapefile so remove the whole directory and
+                # hope for the best when we recreate it.
+                shutil.rmtree(dir_path)
+
+            # Make the directory
+            dir_path.mkdir()
+
+            # We will put the zip file in the dir we just created.
+            zip_path = dir_path / f"{name}.zip"
+
+            # Construct the URL to get the zip file.
+            # url = self._url_for_file(name)
+            zip_url = f"{base_url}/{name}.zip"
+
+            # Fetch the zip file and write it.
+            response = requests.get(
+                zip_url,
+                timeout=timeout,
+                cert=certificates.map_cert,
+                verify=certificates.map_verify,
             )
 
-        headers = response.headers
-        content_type = headers.get("Content-Type", None)
+            if response.status_code == 404:
+                raise MapException(
+                    f"{zip_url} was not found. "
+                    "The Census Bureau may not publish the shapefile you are looking for for the given year. "
+                    "Or the file you are looking for may be from a year where a naming convention that censusdis "
+                    "does not recognize was used."
+                )
 
-        if content_type != "application/zip":
-            raise MapException(
-                f"Expected content type application/zip' from {zip_url}, but got '{content_type}' instead."
-            )
+            headers = response.headers
+            content_type = headers.get("Content-Type", None)
 
-        with zip_path.open("wb") as file:
-            file.write(response.content)
+            if content_type != "application/zip":
+                raise MapException(
+                    f"Expected content type application/zip' from {zip_url}, but got '{content_type}' instead."
+                )
 
-        # Unzip the file and extract all contents.
-        try:
-            with ZipFile(zip_path) as zip_file:
-                zip_file.extractall(dir_path)
-        except BadZipFile as exc:
-            raise MapException(f"Bad zip file retrieved from {zip_url}") from exc
-        finally:
-            # We don't need the zipfile anymore.
-            zip_path.unlink()
+            with zip_path.open("wb") as file:
+                file.write(response.content)
+
+            # Unzip the file and extract all contents.
+            try:
+                with ZipFile(zip_path) as zip_file:
+                    zip_file.extractall(dir_path)
+            except BadZipFile as exc:
+                raise MapException(f"Bad zip file retrieved from {zip_url}") from exc
+            finally:
+                # We don't need the zipfile anymore.
+                zip_path.unlink()
 
 
 def clip_to_states(gdf, gdf_bounds):
@@ -1,17 +1,26 @@
 """Utility functions for downloading, graphing and analyzing multiple years of ACS data."""
 
+import functools
+import json
+import threading
 from collections import defaultdict
+from pathlib import Path
+
 import pandas as pd
 
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 
 import censusdis.data as ced
+from censusdis.aggregate import _resolve_variables
+from censusdis.crosswalk import Crosswalk
 from censusdis.datasets import ACS1, ACS3, ACS5
+from censusdis.impl.concurrency import concurrent_map
+from censusdis.impl.resultcache import ResultCache
 
 import re
 
-from typing import List, Optional, Union, Iterable, Callable, Dict
+from typing import List, Optional, Union, Iterable, Callable, Dict, Tuple
 
 
 def is_variable_column(
@@ -100,17 +109,45 @@ def get_unique_labels_for_variable(
 
     Note: If the dict returned is of length 1, then the variable has only ever had 1 label.
     """
+    years = list(years)
+
+    # Fetch the metadata for all the years at once.
+    year_labels = concurrent_map(
+        lambda year: ced.variables.get(acs, year, variable)["label"], years
+    )
+
+    return _unique_labels(dict(zip(years, year_labels)))
+
+
+def _unique_labels(year_labels: Dict[int, str]) -> Dict[str, List[int]]:
+    """Group years by the label a variable had, ignoring case and ":"."""
     labels = defaultdict(list)
 
-    for year in years:
-        label = ced.variables.get(acs, year, variable)["label"].lower()
-        label = label.replace(":", "")
+    for year, label in year_labels.items():
+        label = label.lower().replace(":", "")
 
         labels[label].append(year)
 
     return labels
 
 
+def _variable_labels(
+    dataset: str, vintages: Iterable[int], variables: List[str]
+) -> Dict[int, Dict[str, str]]:
+    """Look up the labels of variables in each of several vintages, concurrently."""
+    vintages = list(vintages)
+
+    def vintage_labels(vintage: int) -> Dict[str, str]:
+        # Load the metadata for all the variables in bulk.
+        ced.variables.prefetch(dataset, vintage, variables)
+        return {
+            variable: ced.variables.get(dataset, vintage, variable)["label"]
+            for variable in variables
+        }
+
+    return dict(zip(vintages, concurrent_map(vintage_labels, vintages)))
+
+
 class VariableMistmatchOverTimeError(Exception):
     """Raised when an ACS variable has had multiple labels over time."""
 
@@ -124,6 +161,9 @@ def warn_variable_changes(
     download_variables: Optional[Union[str, Iterable[str]]],
     group: Optional[str],
     prompt: bool,
+    *,
+    labels: Optional[Dict[int, Dict[str, str]]] = None,
+    new_vintages: Optional[Iterable[int]] = None,
 ) -> None:
     """
     Issue a warning when an ACS variable has had multiple labels over the years.
@@ -135,24 +175,185 @@ def warn_variable_changes(
 
     This function always emits a warning if it encounters that situation. If prompt is True
     then it also prompts the user to confirm whether they want to continue with the download.
+
+    If `labels` is given, it maps each vintage to the labels of the variables in that
+    vintage, and they are not looked up again. If `new_vintages` is given, only variables
+    whose labels in those vintages differ from their labels in the other vintages
+    are warned about. This is how changes already checked in an earlier download of
+    the other vintages are not warned about again.
     """
-    years = df["Year"].unique()
+    variable_columns = [
+        col for col in df.columns if is_variable_column(col, download_variables, group)
+    ]
+
+    if labels is None:
+        labels = _variable_labels(dataset, vintages, variable_columns)
 
-    for col in df.columns:
-        if not is_variable_column(col, download_variables, group):
+    for col in variable_columns:
+        year_labels = {vintage: labels[vintage][col] for vintage in vintages}
+
+        unique_labels_for_variable = _unique_labels(year_labels)
+
+        if len(unique_labels_for_variable) < 2:
             continue
 
-        unique_labels_for_variable = get_unique_labels_for_variable(
-            dataset, col, vintages
+        if new_vintages is not None:
+            new_vintages = set(new_vintages)
+
+            # Did the label change going into or out of any new vintage?
+            normalized = [
+                year_labels[vintage].lower().replace(":", "")
+                for vintage in sorted(year_labels)
+            ]
+            is_new = [vintage in new_vintages for vintage in sorted(year_labels)]
+            if not any(
+                (is_new[ii - 1] or is_new[ii]) and normalized[ii - 1] != normalized[ii]
+                for ii in range(1, len(normalized))
+            ):
+                continue
+
+        print(f"Warning: {col} has had multiple labels over the selected years:")
+        for label, years in unique_labels_for_variable.items():
+            print(f"\t'{label}' in {years}")
+        if prompt:
+            if input("Continue downloading dataset (y/n)?") != "y":
+                raise VariableMistmatchOverTimeError()
+
+
+class _SeriesCache:
+    """
+    A directory of the downloaded data for each vintage of multiyear series.
+
+    Each vintage of a series is kept separately, so a series can be extended
+    with a new vintage without downloading the others again. The labels of
+    the variables in each vintage are kept in a `labels.json` file, so that
+    checking for changes in them does not require looking them up again.
+    """
+
+    _LABELS_FILE = "labels.json"
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Construct a cache.
+
+        Parameters
+        ----------
+        path
+            The directory to keep the cache in. It is created if it
+            does not exist.
+        """
+        self._results = ResultCache(path)
+        self._labels_path = self._results.path / self._LABELS_FILE
+        self._labels_lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        """Check whether there is data for the key of a vintage of a series."""
+        return key in self._results
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Get the data for the key of a vintage of a series, or `None`."""
+        return self._results.get(key)
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """Store the data for the key of a vintage of a series."""
+        self._results.put(key, df)
+
+    def labels(
+        self, dataset: str, vintages: Iterable[int], variables: List[str]
+    ) -> Dict[int, Dict[str, str]]:
+        """
+        Get the labels of variables in each of several vintages.
+
+        Labels that are not already in the cache are looked up and added to it.
+        """
+        vintages = list(vintages)
+
+        with self._labels_lock:
+            if self._labels_path.exists():
+                all_labels = json.loads(self._labels_path.read_text())
+            else:
+                all_labels = {}
+
+            # JSON keys are strings, so vintages are too.
+            dataset_labels = all_labels.setdefault(dataset, {})
+
+            missing_vintages = [
+                vintage
+                for vintage in vintages
+                if not set(variables) <= set(dataset_labels.get(str(vintage), {}))
+            ]
+
+            if missing_vintages:
+                for vintage, labels in _variable_labels(
+                    dataset, missing_vintages, variables
+                ).items():
+                    dataset_labels.setdefault(str(vintage), {}).update(labels)
+
+                tmp_path = self._labels_path.with_name(f"{self._LABELS_FILE}.tmp")
+                tmp_path.write_text(json.dumps(all_labels, indent=1, sort_keys=True))
+                tmp_path.replace(self._labels_path)
+
+        return {vintage: dataset_labels[str(vintage)] for vintage in vintages}
+
+
+def _harmonize(
+    df: pd.DataFrame,
+    dataset: str,
+    vintage: int,
+    harmonize_to: int,
+    download_variables: Optional[Union[str, Iterable[str]]],
+    group: Optional[str],
+    target_attributes: Callable[[Tuple[str, ...]], pd.DataFrame],
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Reallocate the additive variables in `df` to the geographies of `harmonize_to`.
+
+    Columns that are not variables, like `NAME`, are taken from the geographies
+    of `harmonize_to`, which `target_attributes` downloads, so that every vintage
+    ends up with the same columns.
+    """
+    if vintage != harmonize_to:
+        crosswalk = Crosswalk.build(dataset, vintage, harmonize_to, **kwargs)
+        df_harmonized = crosswalk.apply(df, dataset=dataset, vintage=vintage)
+
+        # The crosswalk only knows the keys of the target geographies.
+        key_columns = list(crosswalk.target_keys.columns)
+        attribute_columns = tuple(
+            col
+            for col in df.columns
+            if col not in key_columns
+            and not is_variable_column(col, download_variables, group)
         )
 
-        if len(unique_labels_for_variable) > 1:
-            print(f"Warning: {col} has had multiple labels over the selected years:")
-            for label, years in unique_labels_for_variable.items():
-                print(f"\t'{label}' in {years}")
-            if prompt:
-                if input("Continue downloading dataset (y/n)?") != "y":
-                    raise VariableMistmatchOverTimeError()
+        if attribute_columns:
+            df_harmonized = df_harmonized.merge(
+                target_attributes(attribute_columns), on=key_columns, how="left"
+            )
+
+        return df_harmonized[[col for col in df.columns if col in df_harmonized]]
+
+    # Already in the right geographies. Just drop the variables
+    # we would have dropped if we had to reallocate.
+    variables, moe_variables = _resolve_variables(
+        df,
+        [],
+        dataset=dataset,
+        vintage=vintage,
+        variables=None,
+        moe_variables=None,
+        variable_cache=None,
+    )
+
+    return df[
+        [
+            col
+            for col in df.columns
+            if not is_variable_column(col, download_variables, group)
+            or col in variables
+            or col in moe_variables
+        ]
+    ]
 
 
 def download_multiyear(
@@ -164,6 +365,8 @@ def download_multiyear(
     rename_vars: bool = True,
     drop_cols: bool = True,
     prompt: bool = True,
+    harmonize_to: Optional[int] = None,
+    cache_path: Optional[Union[str, Path]] = None,
     **kwargs,
 ) -> pd.DataFrame:
     """
@@ -190,6 +393,17 @@ def download_multiyear(
     prompt
         This function emits a warning each time a downloaded variable has had multiple labels over time.
         If True, prompt the user whether they want to continue downloading the dataset despite the differences.
+    harmonize_to
+        If not `None`, a vintage whose geographies all the data should be reallocated to,
+        so that, for example, tract-level data from before and after the 2020 census can
+        be compared tract by tract. This is done with a
+        :py:class:`~censusdis.crosswalk.Crosswalk` from each vintage's geographies to those
+        of `harmonize_to`. Only additive variables and their margins of error are kept.
+    cache_path
+        If not `None`, a directory to keep the data for each vintage in. When the same
+        series is downloaded again, for example with a newly released vintage added
+        to `vintages`, only the vintages that are not already there are downloaded,
+        and only changes in labels into or out of those vintages are warned about.
     **kwargs
         Geography parameters passed directly to `ced.download`.
 
@@ -234,11 +448,38 @@ def download_multiyear(
     ):
         raise ValueError("Exactly one of download_variables and group must be set.")
 
-    df = None
+    series_cache = None if cache_path is None else _SeriesCache(cache_path)
 
-    for vintage in vintages:
-        # This loop can take a while, so provide feedback to the user
-        print(".", end="", flush=True)
+    def vintage_key(vintage: int) -> str:
+        return ResultCache.key(
+            dataset=dataset,
+            vintage=vintage,
+            download_variables=download_variables,
+            group=group,
+            harmonize_to=harmonize_to,
+            geography=kwargs,
+        )
+
+    new_vintages = [
+        vintage
+        for vintage in vintages
+        if series_cache is None or vintage_key(vintage) not in series_cache
+    ]
+
+    @functools.lru_cache(maxsize=None)
+    def target_attributes(columns: Tuple[str, ...]) -> pd.DataFrame:
+        return ced.download(
+            dataset=dataset,
+            vintage=harmonize_to,
+            download_variables=list(columns),
+            **kwargs,
+        )
+
+    def download_vintage(vintage: int) -> pd.DataFrame:
+        if vintage not in new_vintages:
+            df_cached = series_cache.get(vintage_key(vintage))
+            if df_cached is not None:
+                return df_cached
 
         df_new = ced.download(
             dataset=dataset,
@@ -248,14 +489,53 @@ def download_multiyear(
             **kwargs,
         )
 
+        if harmonize_to is not None:
+            df_new = _harmonize(
+                df_new,
+                dataset,
+                vintage,
+                harmonize_to,
+                download_variables,
+                group,
+                target_attributes,
+                **kwargs,
+            )
+
         df_new["Year"] = vintage
 
-        if df is None:
-            df = df_new
-        else:
-            df = pd.concat([df, df_new])
+        if series_cache is not None:
+            series_cache.put(vintage_key(vintage), df_new)
 
-    warn_variable_changes(df, dataset, vintages, download_variables, group, prompt)
+        # This can take a while, so provide feedback to the user
+        print(".", end="", flush=True)
+
+        return df_new
+
+    # Download all the vintages concurrently and put them together once at the end.
+    df = pd.concat(concurrent_map(download_vintage, vintages))
+
+    if series_cache is None:
+        warn_variable_changes(df, dataset, vintages, download_variables, group, prompt)
+    elif new_vintages:
+        labels = series_cache.labels(
+            dataset,
+            vintages,
+            [
+                col
+                for col in df.columns
+                if is_variable_column(col, download_variables, group)
+            ],
+        )
+        warn_variable_changes(
+            df,
+            dataset,
+            vintages,
+            download_variables,
+            group,
+            prompt,
+            labels=labels,
+            new_vintages=new_vintages,
+        )
 
     if drop_cols:
         df = df[
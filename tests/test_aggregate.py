@@ -0,0 +1,160 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Tests for `censusdis.aggregate`."""
+
+import unittest
+from typing import Any, Dict
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import censusdis.aggregate as cagg
+from censusdis.impl.varcache import VariableCache
+from censusdis.impl.varsource.base import VariableSource
+
+
+class RollupTestCase(unittest.TestCase):
+    """Test rolling up fine geographies to coarser ones."""
+
+    class MockVariableSource(VariableSource):
+        """A mock variable source with a few variables of different kinds."""
+
+        _VARIABLES = {
+            "B01003_001E": {"label": "Estimate!!Total", "predicateType": "int"},
+            "B01003_001M": {
+                "label": "Margin of Error!!Total",
+                "predicateType": "int",
+            },
+            "B19013_001E": {
+                "label": "Estimate!!Median household income in the past 12 months",
+                "predicateType": "int",
+            },
+            "NAME": {"label": "Geographic Area Name", "predicateType": "string"},
+        }
+
+        def get(self, source: str, year: int, name: str) -> Dict[str, Any]:
+            """Get a mock variable."""
+            return dict(name=name, **self._VARIABLES[name])
+
+        def get_group(self, source: str, year: int, group_name: str):
+            """Not used."""
+            raise NotImplementedError()
+
+        def get_all_groups(self, dataset: str, year: int):
+            """Not used."""
+            raise NotImplementedError()
+
+        def get_datasets(self, year):
+            """Not used."""
+            raise NotImplementedError()
+
+    def setUp(self) -> None:
+        """Set up tract level data in two counties in two states."""
+        self.variables = VariableCache(variable_source=self.MockVariableSource())
+
+        self.df_tracts = pd.DataFrame(
+            {
+                "STATE": ["34", "34", "34", "36", "36"],
+                "COUNTY": ["013", "013", "017", "013", "013"],
+                "TRACT": ["000100", "000200", "000100", "000100", "000200"],
+                "NAME": ["A", "B", "C", "D", "E"],
+                "B01003_001E": [100, 200, 300, 400, 500],
+                "B01003_001M": [30, 40, 50, 60, 80],
+                "B19013_001E": [50000, 60000, 70000, 80000, 90000],
+            }
+        )
+
+    def test_is_additive(self):
+        """Tell additive variables from the rest."""
+        self.assertTrue(self.variables.is_additive("acs/acs5", 2020, "B01003_001E"))
+        self.assertFalse(self.variables.is_additive("acs/acs5", 2020, "B01003_001M"))
+        self.assertFalse(self.variables.is_additive("acs/acs5", 2020, "B19013_001E"))
+        self.assertFalse(self.variables.is_additive("acs/acs5", 2020, "NAME"))
+
+    def test_rollup_county(self):
+        """Roll up to counties using metadata to pick the variables."""
+        df_county = cagg.rollup(
+            self.df_tracts,
+            "county",
+            dataset="acs/acs5",
+            vintage=2020,
+            variable_cache=self.variables,
+        )
+
+        expected = pd.DataFrame(
+            {
+                "STATE": ["34", "34", "36"],
+                "COUNTY": ["013", "017", "013"],
+                "B01003_001E": [300, 300, 900],
+                "B01003_001M": [50, 50, 100],
+            }
+        )
+
+        assert_frame_equal(expected, df_county)
+
+    def test_metadata_errors_propagate(self):
+        """Errors other than unknown variables are not mistaken for non-additive variables."""
+
+        def get(source, year, name):
+            raise ConnectionError("Network is down.")
+
+        with mock.patch.object(self.variables, "get", side_effect=get):
+            with self.assertRaises(ConnectionError):
+                cagg.rollup(
+                    self.df_tracts,
+                    "county",
+                    dataset="acs/acs5",
+                    vintage=2020,
+                    variable_cache=self.variables,
+                )
+
+    def test_rollup_state(self):
+        """Roll up to states with explicit variables."""
+        df_state = cagg.rollup(self.df_tracts, "STATE", variables=["B01003_001E"])
+
+        self.assertEqual(
+            ["STATE", "B01003_001E", "B01003_001M"], list(df_state.columns)
+        )
+        self.assertEqual([600, 900], list(df_state["B01003_001E"]))
+        self.assertEqual(
+            [round(np.sqrt(30**2 + 40**2 + 50**2)), 100],
+            list(df_state["B01003_001M"]),
+        )
+
+    def test_rollup_matches_groupby(self):
+        """Results agree with a pandas groupby."""
+        df_region = self.df_tracts.assign(REGION=["X", "Y", "X", "Y", "Y"])
+
+        df_rollup = cagg.rollup(df_region, ["REGION"], variables="B01003_001E")
+        df_groupby = (
+            df_region.groupby("REGION")[["B01003_001E"]].sum().reset_index(drop=False)
+        )
+
+        assert_frame_equal(
+            df_groupby, df_rollup[["REGION", "B01003_001E"]], check_dtype=False
+        )
+
+    def test_missing_values(self):
+        """Missing values make the group missing."""
+        df = self.df_tracts.astype({"B01003_001E": float})
+        df.loc[0, "B01003_001E"] = np.nan
+
+        df_state = cagg.rollup(df, "state", variables=["B01003_001E"])
+
+        self.assertTrue(np.isnan(df_state["B01003_001E"].iloc[0]))
+        self.assertEqual(900.0, df_state["B01003_001E"].iloc[1])
+
+    def test_bad_level(self):
+        """An unknown level is an error."""
+        with self.assertRaises(ValueError):
+            cagg.rollup(self.df_tracts, "planet", variables=["B01003_001E"])
+
+    def test_needs_metadata(self):
+        """Without variables we need to know the dataset and vintage."""
+        with self.assertRaises(ValueError):
+            cagg.rollup(self.df_tracts, "state")
+
+
+if __name__ == "__main__":
+    unittest.main()
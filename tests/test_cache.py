@@ -0,0 +1,84 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Tests for in-process caches."""
+
+import unittest
+
+import pandas as pd
+
+from censusdis.impl.cache import LRUCache, estimate_size
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    """Test the LRU cache."""
+
+    def test_max_entries(self):
+        """The least recently used entries are evicted first."""
+        cache = LRUCache(max_entries=2)
+
+        cache["a"] = 1
+        cache["b"] = 2
+
+        # Use a, so b is the least recently used.
+        self.assertEqual(1, cache.get("a"))
+
+        cache["c"] = 3
+
+        self.assertEqual(["a", "c"], cache.keys())
+        self.assertIsNone(cache.get("b"))
+
+        info = cache.info()
+        self.assertEqual(2, info.entries)
+        self.assertEqual(1, info.hits)
+        self.assertEqual(1, info.misses)
+
+    def test_max_bytes(self):
+        """Byte limits are enforced on insertion and when limits change."""
+        cache = LRUCache(sizeof=len)
+
+        cache.update([("a", "x" * 10), ("b", "y" * 20), ("c", "z" * 30)])
+        self.assertEqual(60, cache.info().nbytes)
+
+        cache.set_limits(max_bytes=50)
+        self.assertEqual(["b", "c"], cache.keys())
+        self.assertEqual(50, cache.info().nbytes)
+
+        # Replacing a value accounts for the old size.
+        cache["b"] = "y"
+        self.assertEqual(31, cache.info().nbytes)
+
+        self.assertEqual("y", cache.pop("b"))
+        self.assertEqual(30, cache.info().nbytes)
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.info().nbytes)
+
+    def test_bad_limits(self):
+        """Negative limits are rejected."""
+        with self.assertRaises(ValueError):
+            LRUCache(max_entries=-1)
+
+    def test_set_one_limit(self):
+        """Limits that are not specified are left as they are."""
+        cache = LRUCache(max_entries=10, max_bytes=100)
+
+        cache.set_limits(max_entries=5)
+        self.assertEqual(5, cache.info().max_entries)
+        self.assertEqual(100, cache.info().max_bytes)
+
+        cache.set_limits(max_bytes=None)
+        self.assertEqual(5, cache.info().max_entries)
+        self.assertIsNone(cache.info().max_bytes)
+
+    def test_estimate_size(self):
+        """Sizes grow with the content of the value."""
+        small = {"label": "Estimate!!Total:"}
+        large = {"label": "Estimate!!Total:" * 100}
+        self.assertGreater(estimate_size(large), estimate_size(small))
+
+        df = pd.DataFrame({"A": range(1000)})
+        self.assertGreaterEqual(estimate_size(df), 8000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Tests for the command line interface."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+import censusdis.data as ced
+import censusdis.geography
+from censusdis.cli import cli
+
+
+class BatchTestCase(unittest.TestCase):
+    """Test the batch command without going to the network."""
+
+    def setUp(self) -> None:
+        """Set up a fake dataset and some data specs for it."""
+        self.dataset = "test/batch"
+        self.year = 2020
+
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.spec_dir = Path(self._tmp_dir.name) / "specs"
+        self.output_dir = Path(self._tmp_dir.name) / "output"
+        self.spec_dir.mkdir()
+
+        path_specs = {
+            "040": censusdis.geography.PathSpec(
+                ["state"], censusdis.geography.PathSpec._PathSpec__init_key
+            )
+        }
+
+        def fake_download(dataset, vintage, download_variables, **kwargs):
+            if kwargs["state"] == "02":
+                raise ced.CensusApiException("Unknown variable.")
+
+            return pd.DataFrame(
+                {"STATE": [kwargs["state"]]}
+                | {
+                    variable.upper(): [float(ii + 1)]
+                    for ii, variable in enumerate(download_variables)
+                }
+            )
+
+        patches = [
+            mock.patch.object(
+                censusdis.geography.PathSpec,
+                "_fetch_path_specs",
+                return_value=path_specs,
+            ),
+            mock.patch.object(
+                ced,
+                "_parse_download_variables",
+                side_effect=lambda *args, download_variables, **kwargs: list(
+                    download_variables
+                ),
+            ),
+            mock.patch.object(ced, "download", side_effect=fake_download),
+            mock.patch.object(ced, "variables", mock.MagicMock()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.mock_download = ced.download
+
+    def tearDown(self) -> None:
+        """Forget about the fake dataset."""
+        censusdis.geography.PathSpec._PATH_SPECS_CACHE.pop(
+            (self.dataset, self.year), None
+        )
+
+    def write_spec(self, name: str, variables, state: str, denominator=None):
+        """Write a data spec file."""
+        lines = [
+            "!DataSpec",
+            f"dataset: {self.dataset}",
+            f"vintage: {self.year}",
+            "geography:",
+            f"  state: '{state}'",
+            "specs:",
+            "  - !VariableList",
+            "    variables:",
+        ] + [f"      - {variable}" for variable in variables]
+        if denominator is not None:
+            lines.append(f"    denominator: {denominator}")
+
+        (self.spec_dir / f"{name}.yaml").write_text("\n".join(lines) + "\n")
+
+    def test_batch(self):
+        """Overlapping specs share a query and a failing spec does not stop the others."""
+        self.write_spec("a", ["X", "Y"], "01")
+        self.write_spec("b", ["Y"], "01", denominator="Z")
+        self.write_spec("c", ["X", "Y"], "01")
+        self.write_spec("d", ["X"], "02")
+
+        argv = ["censusdis", "batch", "-o", str(self.output_dir), str(self.spec_dir)]
+
+        with mock.patch.object(sys, "argv", argv):
+            with self.assertRaises(SystemExit) as context:
+                cli.main()
+
+        self.assertEqual(1, context.exception.code)
+
+        # One query for state 01 serves a, b and c.
+        self.assertEqual(2, self.mock_download.call_count)
+        self.assertEqual(
+            [["X"], ["X", "Y", "Z"]],
+            sorted(sorted(call.args[2]) for call in self.mock_download.call_args_list),
+        )
+
+        self.assertEqual(
+            ["a.csv", "b.csv", "c.csv"],
+            sorted(path.name for path in self.output_dir.iterdir()),
+        )
+
+        df_a = pd.read_csv(self.output_dir / "a.csv", dtype={"STATE": str})
+        self.assertEqual({"STATE", "X", "Y"}, set(df_a.columns))
+        self.assertEqual(["01"], list(df_a["STATE"]))
+
+        df_b = pd.read_csv(self.output_dir / "b.csv", dtype={"STATE": str})
+        self.assertEqual({"STATE", "Y", "Z", "frac_Y"}, set(df_b.columns))
+        self.assertEqual(list(df_b["Y"] / df_b["Z"]), list(df_b["frac_Y"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
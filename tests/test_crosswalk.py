@@ -0,0 +1,123 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Tests for `censusdis.crosswalk`."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from shapely.geometry import box
+
+import censusdis.crosswalk as ccw
+
+
+class CrosswalkTestCase(unittest.TestCase):
+    """Test building and applying crosswalks."""
+
+    def setUp(self) -> None:
+        """Set up two source and three target geographies."""
+        self.gdf_source = gpd.GeoDataFrame(
+            {
+                "STATE": ["34", "34"],
+                "TRACT": ["000100", "000200"],
+                "NAME": ["Old 1", "Old 2"],
+            },
+            geometry=[box(0, 0, 2, 1), box(2, 0, 4, 1)],
+            crs=3857,
+        )
+        self.gdf_target = gpd.GeoDataFrame(
+            {
+                "STATE": ["34", "34", "34"],
+                "TRACT": ["000101", "000102", "000201"],
+                "NAME": ["New 1", "New 2", "New 3"],
+            },
+            geometry=[box(0, 0, 1, 1), box(1, 0, 3, 1), box(3, 0, 4, 1)],
+            crs=3857,
+        )
+        self.df_source = pd.DataFrame(
+            {
+                "STATE": ["34", "34"],
+                "TRACT": ["000200", "000100"],
+                "B01003_001E": [200, 100],
+                "B01003_001M": [40, 30],
+            }
+        )
+
+        self.crosswalk = ccw.Crosswalk.from_geometries(self.gdf_source, self.gdf_target)
+
+    def test_weights(self):
+        """Each source is split evenly between the targets it overlaps."""
+        self.assertEqual(4, len(self.crosswalk))
+
+        df_weights = self.crosswalk.to_frame().sort_values(
+            ["TRACT_source", "TRACT_target"]
+        )
+
+        self.assertEqual(
+            ["000101", "000102", "000102", "000201"],
+            list(df_weights["TRACT_target"]),
+        )
+        np.testing.assert_allclose([0.5, 0.5, 0.5, 0.5], df_weights["WEIGHT"])
+
+    def test_apply(self):
+        """Reallocate estimates and margins of error."""
+        df_target = self.crosswalk.apply(self.df_source, variables=["B01003_001E"])
+
+        self.assertEqual(
+            ["STATE", "TRACT", "B01003_001E", "B01003_001M"], list(df_target.columns)
+        )
+        self.assertEqual(["000101", "000102", "000201"], list(df_target["TRACT"]))
+        np.testing.assert_allclose([50.0, 150.0, 100.0], df_target["B01003_001E"])
+        np.testing.assert_allclose(
+            [15.0, np.sqrt(15.0**2 + 20.0**2), 20.0], df_target["B01003_001M"]
+        )
+
+    def test_apply_missing_source(self):
+        """Targets that overlap a source we have no data for are missing."""
+        df_target = self.crosswalk.apply(
+            self.df_source.iloc[:1], variables=["B01003_001E"]
+        )
+
+        self.assertTrue(np.isnan(df_target["B01003_001E"].iloc[0]))
+        self.assertTrue(np.isnan(df_target["B01003_001E"].iloc[1]))
+        self.assertEqual(100.0, df_target["B01003_001E"].iloc[2])
+
+    def test_save_load(self):
+        """Round trip through a file."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "crosswalk.npz"
+            self.crosswalk.save(path)
+            crosswalk = ccw.Crosswalk.load(path)
+
+        assert_frame_equal(self.crosswalk.to_frame(), crosswalk.to_frame())
+
+    def test_build_cached(self):
+        """Build downloads geometry the first time and then loads from the cache."""
+
+        def fake_download(dataset, vintage, download_variables, **kwargs):
+            return (self.gdf_source if vintage == 2019 else self.gdf_target).copy()
+
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch(
+            "censusdis.data.download", side_effect=fake_download
+        ) as mock_download:
+            ccw.set_crosswalk_path(tmp_dir)
+            try:
+                crosswalk1 = ccw.Crosswalk.build(
+                    "acs/acs5", 2019, 2020, state="34", tract="*"
+                )
+                crosswalk2 = ccw.Crosswalk.build(
+                    "acs/acs5", 2019, 2020, state="34", tract="*"
+                )
+            finally:
+                ccw.set_crosswalk_path(None)
+
+        self.assertEqual(2, mock_download.call_count)
+        assert_frame_equal(crosswalk1.to_frame(), crosswalk2.to_frame())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,18 @@
 # Copyright (c) 2023 Darren Erik Vengroff
 """Tests for `censusdis.data`."""
+
+import json
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
 
+import geopandas as gpd
 import pandas as pd
+from shapely.geometry import box
 
 import censusdis.data as ced
+import censusdis.geography
 import censusdis.impl.us_census_shapefiles
 from censusdis import CensusApiException
 
@@ -97,5 +105,984 @@ class InferGeoTestCase(unittest.TestCase):
         self.assertIn("['STATE', 'COUNTY', 'TRACT', 'BLOCK_GROUP']", str(cm.exception))
 
 
+class ContainedWithinMemoTestCase(unittest.TestCase):
+    """Test that containment is resolved once and reused across downloads."""
+
+    def setUp(self) -> None:
+        """Set up fake container and contained geographies."""
+        self.gdf_container = gpd.GeoDataFrame(
+            {"STATE": ["34"], "PLACE": ["01960"], "NAME": ["Asbury Park"]},
+            geometry=[box(-74.02, 40.21, -74.00, 40.23)],
+            crs=4269,
+        )
+        self.gdf_tracts = gpd.GeoDataFrame(
+            {
+                "STATE": ["34", "34", "34"],
+                "COUNTY": ["025", "025", "025"],
+                "TRACT": ["807000", "807100", "807200"],
+                "NAME": ["Tract 8070", "Tract 8071", "Tract 8072"],
+            },
+            geometry=[
+                box(-74.02, 40.21, -74.01, 40.22),
+                box(-74.01, 40.22, -74.00, 40.23),
+                box(-74.10, 40.10, -74.05, 40.15),
+            ],
+            crs=4269,
+        )
+        self.df_data = pd.DataFrame(
+            {
+                "STATE": ["34", "34", "34"],
+                "COUNTY": ["025", "025", "025"],
+                "TRACT": ["807000", "807100", "807200"],
+                "B01003_001E": [100, 200, 300],
+            }
+        )
+
+        self.calls = []
+
+        def fake_download(dataset, vintage, download_variables=None, **kwargs):
+            with_geometry = kwargs.get("with_geometry", False)
+            self.calls.append((tuple(download_variables), with_geometry))
+            if "place" in kwargs:
+                return self.gdf_container.copy()
+            if with_geometry:
+                return self.gdf_tracts.copy()
+            return self.df_data.copy()
+
+        self.patches = [
+            mock.patch.object(ced, "download", side_effect=fake_download),
+            mock.patch.object(
+                ced,
+                "_intersecting_geos_kws",
+                return_value={"state": "34", "county": "025", "tract": "*"},
+            ),
+        ]
+        self.mock_download, self.mock_intersecting = [
+            patch.start() for patch in self.patches
+        ]
+
+    def tearDown(self) -> None:
+        """Remove the patches."""
+        for patch in self.patches:
+            patch.stop()
+
+    def test_memoized(self):
+        """Geometry is only downloaded the first time."""
+        within = ced.ContainedWithin(state="34", place="01960")
+
+        df1 = within.download("acs/acs5", 2020, ["B01003_001E"], tract="*")
+        df2 = within.download("acs/acs5", 2020, ["B01003_001E"], tract="*")
+
+        self.assertEqual(
+            ["STATE", "PLACE", "COUNTY", "TRACT", "B01003_001E"], list(df1.columns)
+        )
+        self.assertEqual(["807000", "807100"], list(df1["TRACT"]))
+        self.assertEqual([100, 200], list(df1["B01003_001E"]))
+        pd.testing.assert_frame_equal(df1, df2)
+
+        # One container and one contained geometry download, then
+        # one plain data download per call.
+        self.assertEqual(
+            [
+                (("NAME",), True),
+                (("NAME",), True),
+                (("B01003_001E",), False),
+                (("B01003_001E",), False),
+            ],
+            self.calls,
+        )
+        self.assertEqual(1, self.mock_intersecting.call_count)
+
+        # A different vintage is resolved on its own.
+        within.download("acs/acs5", 2021, ["B01003_001E"], tract="*")
+        self.assertEqual(2, self.mock_intersecting.call_count)
+
+
+class UcgidBatchTestCase(unittest.TestCase):
+    """Test that long lists of ucgids are split into batches."""
+
+    def test_batch_values(self):
+        """Batches fit within the encoded length."""
+        values = [f"1400000US34013{ii:06}" for ii in range(100)]
+
+        # Each value is 20 chars and each encoded comma is 3 more.
+        batches = ced._batch_values(values, 20 * 10 + 3 * 9)
+
+        self.assertEqual(10, len(batches))
+        self.assertTrue(all(len(batch) == 10 for batch in batches))
+        self.assertEqual(values, [value for batch in batches for value in batch])
+
+    def test_batch_values_single(self):
+        """Everything fits in one batch."""
+        self.assertEqual([["a", "b", "c"]], ced._batch_values(["a", "b", "c"], 100))
+
+    def test_download_ucgid_batched(self):
+        """A long list of ucgids is downloaded in several queries."""
+        ucgids = [f"1400000US34013{ii:06}" for ii in range(1000)]
+
+        def fake_data_from_url(url, params):
+            return pd.DataFrame(
+                [[ucgid, "1"] for ucgid in params["ucgid"].split(",")],
+                columns=["UCGID", "B01003_001E"],
+            )
+
+        variable_cache = mock.MagicMock()
+        variable_cache.get.return_value = {"predicateType": "int"}
+
+        with mock.patch.object(
+            ced, "data_from_url", side_effect=fake_data_from_url
+        ) as mock_data_from_url, mock.patch.object(
+            ced,
+            "_bind_path_if_possible",
+            return_value=censusdis.geography.BoundGeographyPath(
+                "000", censusdis.geography.PathSpec.empty_path_spec()
+            ),
+        ):
+            df = ced._download_remote(
+                "acs/acs5",
+                2020,
+                download_variables=["B01003_001E"],
+                with_geometry=False,
+                with_geometry_columns=False,
+                tiger_shapefiles_only=False,
+                remove_water=False,
+                api_key=None,
+                variable_cache=variable_cache,
+                ucgid=ucgids,
+            )
+
+        self.assertGreater(mock_data_from_url.call_count, 1)
+        for call in mock_data_from_url.call_args_list:
+            url, params = call.args
+            self.assertLessEqual(ced._url_length(url, params), ced._MAX_URL_LENGTH)
+
+        self.assertEqual(["UCGID", "B01003_001E"], list(df.columns))
+        self.assertEqual(ucgids, list(df["UCGID"]))
+        self.assertEqual(list(range(len(ucgids))), list(df.index))
+        self.assertTrue((df["B01003_001E"] == 1).all())
+
+    def test_ucgid_with_geo_kwargs(self):
+        """Can't mix ucgid and other geographies."""
+        with self.assertRaises(ValueError):
+            ced.download(
+                "acs/acs5",
+                2020,
+                ["B01003_001E"],
+                ucgid=["0400000US34"],
+                state="34",
+            )
+
+
+class GeoListBatchTestCase(unittest.TestCase):
+    """Test that long lists of geography values are split into batches."""
+
+    def setUp(self) -> None:
+        """Set up a fake geography for a fake data set."""
+        self.dataset = "test/geo_list_batch"
+        self.vintage = 2020
+
+        path_spec = censusdis.geography.PathSpec(
+            ["state", "place"], censusdis.geography.PathSpec._PathSpec__init_key
+        )
+        with mock.patch.object(
+            censusdis.geography.PathSpec,
+            "_fetch_path_specs",
+            return_value={"160": path_spec},
+        ):
+            censusdis.geography.PathSpec.get_path_specs(self.dataset, self.vintage)
+
+    def test_short_list(self):
+        """A short list fits in one request."""
+        table_requests, bound_path = ced._census_table_requests(
+            self.dataset,
+            self.vintage,
+            ["NAME"],
+            api_key=None,
+            state="34",
+            place="01960,02080",
+        )
+
+        self.assertEqual(1, len(table_requests))
+        _, params = table_requests[0]
+        self.assertEqual("place:01960,02080", params["for"])
+        self.assertEqual("state:34", params["in"])
+        self.assertEqual("160", bound_path.num)
+
+    def test_long_list(self):
+        """A long list is split into requests that cover all the values."""
+        places = [f"{ii:05}" for ii in range(3000)]
+
+        table_requests, bound_path = ced._census_table_requests(
+            self.dataset,
+            self.vintage,
+            ["NAME"],
+            api_key=None,
+            state="34",
+            place=",".join(places),
+        )
+
+        self.assertGreater(len(table_requests), 1)
+        self.assertEqual(
+            {"state": "34", "place": ",".join(places)}, bound_path.bindings
+        )
+
+        batched_places = []
+        for url, params in table_requests:
+            self.assertLessEqual(ced._url_length(url, params), ced._MAX_URL_LENGTH)
+            self.assertEqual("state:34", params["in"])
+            batched_places.extend(params["for"].removeprefix("place:").split(","))
+
+        self.assertEqual(places, batched_places)
+
+    def test_two_long_lists(self):
+        """Two lists that are each too long are both split."""
+        # Unrealistically long values keep the number of requests manageable.
+        states = [f"{ii:060}" for ii in range(150)]
+        places = [f"{ii:080}" for ii in range(150)]
+
+        table_requests, _ = ced._census_table_requests(
+            self.dataset,
+            self.vintage,
+            ["NAME"],
+            api_key=None,
+            state=",".join(states),
+            place=",".join(places),
+        )
+
+        pairs = set()
+        for url, params in table_requests:
+            self.assertLessEqual(ced._url_length(url, params), ced._MAX_URL_LENGTH)
+            for state in params["in"].removeprefix("state:").split(","):
+                for place in params["for"].removeprefix("place:").split(","):
+                    pairs.add((state, place))
+
+        self.assertEqual(len(states) * len(places), len(pairs))
+
+
+class MetadataCachePathTestCase(unittest.TestCase):
+    """Test turning the persistent metadata cache on and off."""
+
+    def test_set_metadata_cache_path(self):
+        """Set and unset the path."""
+        original_source = ced.variables.variable_source
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "metadata.db"
+            try:
+                ced.set_metadata_cache_path(path)
+                self.assertEqual(path, ced.get_metadata_cache_path())
+
+                # Setting it again replaces, rather than stacks, the store.
+                ced.set_metadata_cache_path(path)
+                self.assertIs(
+                    original_source, ced.variables.variable_source.backing_source
+                )
+            finally:
+                ced.set_metadata_cache_path(None)
+
+        self.assertIsNone(ced.get_metadata_cache_path())
+        self.assertIs(original_source, ced.variables.variable_source)
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    """Test caching the results of downloads."""
+
+    def setUp(self) -> None:
+        """Cache results in a temporary directory and stay off the network."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        ced.set_result_cache_path(self.tmp_dir.name)
+
+        def fake_download_remote(dataset, vintage, *, download_variables, **kwargs):
+            df = pd.DataFrame(
+                {"STATE": ["01", "02"]}
+                | {variable: [1, 2] for variable in download_variables}
+            )
+            if kwargs["with_geometry"]:
+                df = gpd.GeoDataFrame(
+                    df, geometry=[box(0, 0, 1, 1), box(1, 1, 2, 2)], crs=4269
+                )
+            return df
+
+        patches = [
+            mock.patch.object(ced.cgeo, "geo_path_snake_specs"),
+            mock.patch.object(
+                ced,
+                "_parse_download_variables",
+                side_effect=lambda *args, download_variables, **kwargs: list(
+                    download_variables
+                ),
+            ),
+            mock.patch.object(ced, "_prefetch_variable_types"),
+            mock.patch.object(
+                ced, "_download_remote", side_effect=fake_download_remote
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.mock_download_remote = ced._download_remote
+
+    def tearDown(self) -> None:
+        """Turn the result cache back off."""
+        ced.set_result_cache_path(None)
+        self.tmp_dir.cleanup()
+
+    def test_set_result_cache_path(self):
+        """Set and unset the path."""
+        self.assertEqual(Path(self.tmp_dir.name), ced.get_result_cache_path())
+        ced.set_result_cache_path(None)
+        self.assertIsNone(ced.get_result_cache_path())
+
+    def test_cached(self):
+        """The second identical query is loaded from the cache."""
+        df1 = ced.download("acs/acs5", 2020, ["B01003_001E"], variable_cache=None)
+        df2 = ced.download("acs/acs5", 2020, ["B01003_001E"], api_key="key")
+
+        self.assertEqual(1, self.mock_download_remote.call_count)
+        pd.testing.assert_frame_equal(df1, df2)
+
+        # The result can be modified in place.
+        df2.loc[0, "B01003_001E"] = 3
+        self.assertEqual(3, df2["B01003_001E"].iloc[0])
+
+    def test_different_queries(self):
+        """Queries that differ in any way are cached separately."""
+        ced.download("acs/acs5", 2020, ["B01003_001E"])
+        ced.download("acs/acs5", 2021, ["B01003_001E"])
+        ced.download("acs/acs5", 2020, ["B01001_001E"])
+        ced.download("acs/acs5", 2020, ["B01003_001E"], set_to_nan=False)
+
+        self.assertEqual(4, self.mock_download_remote.call_count)
+        self.assertEqual(4, len(list(Path(self.tmp_dir.name).glob("*.arrow"))))
+
+    def test_cached_geometry(self):
+        """Results with geometry come back with their geometry and CRS."""
+        gdf1 = ced.download("acs/acs5", 2020, ["B01003_001E"], with_geometry=True)
+        gdf2 = ced.download("acs/acs5", 2020, ["B01003_001E"], with_geometry=True)
+
+        self.assertEqual(1, self.mock_download_remote.call_count)
+        self.assertIsInstance(gdf2, gpd.GeoDataFrame)
+        self.assertEqual(gdf1.crs, gdf2.crs)
+        self.assertTrue(gdf1.geometry.geom_equals(gdf2.geometry).all())
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(gdf1.drop(columns="geometry")),
+            pd.DataFrame(gdf2.drop(columns="geometry")),
+        )
+
+    def test_only_outermost_cached(self):
+        """Downloads nested inside another download are not cached."""
+        fake_download_remote = self.mock_download_remote.side_effect
+
+        def nested_download_remote(dataset, vintage, **kwargs):
+            if kwargs["download_variables"] != ["NAME"]:
+                ced.download(dataset, vintage, ["NAME"])
+            return fake_download_remote(dataset, vintage, **kwargs)
+
+        self.mock_download_remote.side_effect = nested_download_remote
+
+        ced.download("acs/acs5", 2020, ["B01003_001E"])
+
+        self.assertEqual(2, self.mock_download_remote.call_count)
+        self.assertEqual(1, len(list(Path(self.tmp_dir.name).glob("*.arrow"))))
+
+    def test_generator_arguments(self):
+        """Arguments that can only be iterated once still reach the download."""
+        variables = ["B01003_001E", "B01001_001E"]
+
+        df = ced.download("acs/acs5", 2020, (variable for variable in variables))
+
+        self.assertEqual(
+            variables,
+            self.mock_download_remote.call_args.kwargs["download_variables"],
+        )
+        self.assertEqual(["STATE"] + variables, list(df.columns))
+
+        # It is the same query as one with a list.
+        ced.download("acs/acs5", 2020, variables)
+        self.assertEqual(1, self.mock_download_remote.call_count)
+
+    def test_key(self):
+        """Keys depend on values, not on how they were passed."""
+        self.assertEqual(
+            ced.ResultCache.key(dataset="acs/acs5", query_filter={"a": 1, "b": 2}),
+            ced.ResultCache.key(query_filter={"b": 2, "a": 1}, dataset="acs/acs5"),
+        )
+        self.assertEqual(
+            ced.ResultCache.key(variables=("A", "B")),
+            ced.ResultCache.key(variables=["A", "B"]),
+        )
+        self.assertNotEqual(
+            ced.ResultCache.key(variables=["A", "B"]),
+            ced.ResultCache.key(variables=["B", "A"]),
+        )
+
+
+class IterDownloadTestCase(unittest.TestCase):
+    """Test downloading in chunks."""
+
+    def setUp(self) -> None:
+        """Set up a fake dataset and stay off the network."""
+        self.dataset = "test/iter_download"
+        self.year = 2020
+
+        path_specs = {
+            num: censusdis.geography.PathSpec(
+                path, censusdis.geography.PathSpec._PathSpec__init_key
+            )
+            for num, path in {
+                "040": ["state"],
+                "050": ["state", "county"],
+                "150": ["state", "county", "tract", "block group"],
+            }.items()
+        }
+
+        def fake_download(dataset, vintage, download_variables, **kwargs):
+            kwargs = {
+                k: v
+                for k, v in kwargs.items()
+                if k in {"state", "county", "tract", "block group"}
+            }
+            if list(kwargs) == ["state"] and kwargs["state"] == "*":
+                return pd.DataFrame({"STATE": ["01", "02"], "NAME": ["A", "B"]})
+            if list(kwargs) == ["state", "county"] and kwargs["county"] == "*":
+                states = kwargs["state"].split(",")
+                return pd.DataFrame(
+                    {
+                        "STATE": [state for state in states for _ in range(2)],
+                        "COUNTY": ["001", "003"] * len(states),
+                        "NAME": ["C", "D"] * len(states),
+                    }
+                )
+            return pd.DataFrame(
+                {k.replace(" ", "_").upper(): [v] for k, v in kwargs.items()}
+                | {variable: [1] for variable in download_variables}
+            )
+
+        patches = [
+            mock.patch.object(
+                censusdis.geography.PathSpec,
+                "_fetch_path_specs",
+                return_value=path_specs,
+            ),
+            mock.patch.object(
+                ced,
+                "_parse_download_variables",
+                side_effect=lambda *args, download_variables, **kwargs: list(
+                    download_variables
+                ),
+            ),
+            mock.patch.object(ced, "_prefetch_variable_types"),
+            mock.patch.object(ced, "download", side_effect=fake_download),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.mock_download = ced.download
+
+    def tearDown(self) -> None:
+        """Forget about the fake dataset."""
+        censusdis.geography.PathSpec._PATH_SPECS_CACHE.pop(
+            (self.dataset, self.year), None
+        )
+
+    def test_chunk_by_state(self):
+        """By default there is a chunk per state."""
+        chunks = list(
+            ced.iter_download(
+                self.dataset,
+                self.year,
+                ["B01003_001E"],
+                state="*",
+                county="*",
+                tract="*",
+                block_group="*",
+            )
+        )
+
+        self.assertEqual(2, len(chunks))
+        df = pd.concat(chunks).sort_values("STATE", ignore_index=True)
+        self.assertEqual(["01", "02"], list(df["STATE"]))
+        self.assertTrue((df["BLOCK_GROUP"] == "*").all())
+
+        # One query for the states, then one for each of them.
+        self.assertEqual(3, self.mock_download.call_count)
+
+    def test_chunk_by_county(self):
+        """Wildcards for counties are resolved within each state."""
+        chunks = list(
+            ced.iter_download(
+                self.dataset,
+                self.year,
+                ["B01003_001E"],
+                chunk_by="county",
+                state=["01", "02"],
+                county="*",
+                tract="*",
+                block_group="*",
+            )
+        )
+
+        self.assertEqual(
+            {("01", "001"), ("01", "003"), ("02", "001"), ("02", "003")},
+            {(chunk["STATE"][0], chunk["COUNTY"][0]) for chunk in chunks},
+        )
+
+    def test_chunk_by_list(self):
+        """Lists of values don't need a query to resolve."""
+        chunks = list(
+            ced.iter_download(
+                self.dataset, self.year, ["B01003_001E"], state="01,02,04"
+            )
+        )
+
+        self.assertEqual({"01", "02", "04"}, {chunk["STATE"][0] for chunk in chunks})
+        self.assertEqual(3, self.mock_download.call_count)
+
+    def test_chunk_by_not_in_geography(self):
+        """Can only chunk on a component of the geography."""
+        with self.assertRaises(ValueError):
+            ced.iter_download(
+                self.dataset, self.year, ["B01003_001E"], chunk_by="tract", state="*"
+            )
+
+    def test_download_resumable(self):
+        """Resume a download that failed part way through."""
+        fake_download = self.mock_download.side_effect
+
+        def failing_download(dataset, vintage, download_variables, **kwargs):
+            if kwargs.get("state") == "02":
+                raise CensusApiException("Failed.")
+            return fake_download(dataset, vintage, download_variables, **kwargs)
+
+        self.mock_download.side_effect = failing_download
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint_dir = Path(tmp_dir) / "checkpoints"
+
+            with self.assertRaises(CensusApiException):
+                ced.download_resumable(
+                    self.dataset,
+                    self.year,
+                    ["B01003_001E"],
+                    checkpoint_dir=checkpoint_dir,
+                    state="*",
+                    county="*",
+                    workers=1,
+                )
+
+            manifest = json.loads((checkpoint_dir / "manifest.json").read_text())
+            self.assertEqual(
+                [True, False], [chunk["done"] for chunk in manifest["chunks"]]
+            )
+
+            # A different download can't use the same directory.
+            with self.assertRaises(ValueError):
+                ced.download_resumable(
+                    self.dataset,
+                    self.year,
+                    ["B01001_001E"],
+                    checkpoint_dir=checkpoint_dir,
+                    state="*",
+                    county="*",
+                )
+
+            self.mock_download.side_effect = fake_download
+            self.mock_download.reset_mock()
+
+            df = ced.download_resumable(
+                self.dataset,
+                self.year,
+                ["B01003_001E"],
+                checkpoint_dir=checkpoint_dir,
+                state="*",
+                county="*",
+                remove_checkpoints=True,
+            )
+
+            # Only the missing chunk was downloaded, and without
+            # querying for the states again.
+            self.mock_download.assert_called_once()
+            self.assertEqual("02", self.mock_download.call_args.kwargs["state"])
+
+            self.assertEqual(["01", "01", "02", "02"], list(df["STATE"]))
+            self.assertEqual([], list(checkpoint_dir.iterdir()))
+
+    def test_download_resumable_generator(self):
+        """Arguments that can only be iterated once are used for every chunk."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            df = ced.download_resumable(
+                self.dataset,
+                self.year,
+                (variable for variable in ["B01003_001E", "B01001_001E"]),
+                checkpoint_dir=Path(tmp_dir) / "checkpoints",
+                state="*",
+                county="*",
+                workers=1,
+                row_keys=(key for key in ["STATE"]),
+            )
+
+        for call in self.mock_download.call_args_list[1:]:
+            self.assertEqual(["B01003_001E", "B01001_001E"], call.args[2])
+            self.assertEqual(["STATE"], call.kwargs["row_keys"])
+
+        self.assertEqual(3, self.mock_download.call_count)
+        self.assertEqual(["01", "01", "02", "02"], list(df["STATE"]))
+
+
+class PlanDownloadTestCase(unittest.TestCase):
+    """Test planning downloads."""
+
+    def setUp(self) -> None:
+        """Set up a fake dataset and stay off the network."""
+        self.dataset = "test/plan_download"
+        self.year = 2020
+
+        path_specs = {
+            num: censusdis.geography.PathSpec(
+                path, censusdis.geography.PathSpec._PathSpec__init_key
+            )
+            for num, path in {
+                "040": ["state"],
+                "050": ["state", "county"],
+                "140": ["state", "county", "tract"],
+            }.items()
+        }
+
+        patches = [
+            mock.patch.object(
+                censusdis.geography.PathSpec,
+                "_fetch_path_specs",
+                return_value=path_specs,
+            ),
+            mock.patch.object(
+                ced,
+                "_parse_download_variables",
+                side_effect=lambda *args, download_variables, **kwargs: list(
+                    download_variables
+                ),
+            ),
+            mock.patch.object(ced, "_prefetch_variable_types"),
+            mock.patch.object(ced, "data_from_url"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self) -> None:
+        """Forget about the fake dataset."""
+        censusdis.geography.PathSpec._PATH_SPECS_CACHE.pop(
+            (self.dataset, self.year), None
+        )
+
+    def test_plan(self):
+        """Plan a narrow download."""
+        plan = ced.plan_download(
+            self.dataset,
+            self.year,
+            ["NAME", "B01003_001E"],
+            state="34",
+            county=["013", "017"],
+        )
+
+        self.assertEqual(["NAME", "B01003_001E"], plan.variables)
+        self.assertEqual([["NAME", "B01003_001E"]], plan.variable_groups)
+        self.assertEqual("single", plan.strategy)
+        self.assertEqual({"state": "34", "county": "013,017"}, plan.geography)
+        self.assertEqual("county", plan.geo_level)
+        self.assertEqual(1, plan.request_count)
+        self.assertEqual([], plan.shapefiles)
+        self.assertFalse(plan.remove_water)
+        self.assertEqual(2, plan.estimated_rows)
+        self.assertEqual(2 * 4 * 8, plan.estimated_bytes)
+
+        ced.data_from_url.assert_not_called()
+
+    def test_plan_wide(self):
+        """Plan a wide download with geometry."""
+        download_variables = [f"B{ii:05}_001E" for ii in range(120)]
+
+        plan = ced.plan_download(
+            self.dataset,
+            self.year,
+            download_variables,
+            with_geometry=True,
+            remove_water=True,
+            state="*",
+            county="*",
+            tract="*",
+        )
+
+        self.assertEqual([50, 50, 20], [len(vg) for vg in plan.variable_groups])
+        self.assertEqual("merge_or_concat", plan.strategy)
+        self.assertEqual(3, plan.request_count)
+        self.assertEqual([("*", "tract")], plan.shapefiles)
+        self.assertTrue(plan.remove_water)
+        self.assertIsNone(plan.estimated_rows)
+        self.assertIsNone(plan.estimated_bytes)
+
+
+class CompiledQueryTestCase(unittest.TestCase):
+    """Test compiling a query once and running it for many geographies."""
+
+    def setUp(self) -> None:
+        """Set up a fake dataset and stay off the network."""
+        self.dataset = "test/compile_query"
+        self.year = 2020
+
+        path_specs = {
+            num: censusdis.geography.PathSpec(
+                path, censusdis.geography.PathSpec._PathSpec__init_key
+            )
+            for num, path in {
+                "040": ["state"],
+                "050": ["state", "county"],
+            }.items()
+        }
+
+        def fake_data_from_url(url, params):
+            state = params["in"].removeprefix("state:")
+            return pd.DataFrame(
+                [[state, "001", "12"], [state, "003", "-666666666"]],
+                columns=["STATE", "COUNTY", "B01003_001E"],
+            )
+
+        self.variable_cache = mock.MagicMock()
+        self.variable_cache.get.return_value = {"predicateType": "int"}
+
+        patches = [
+            mock.patch.object(
+                censusdis.geography.PathSpec,
+                "_fetch_path_specs",
+                return_value=path_specs,
+            ),
+            mock.patch.object(ced, "data_from_url", side_effect=fake_data_from_url),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self) -> None:
+        """Forget about the fake dataset."""
+        censusdis.geography.PathSpec._PATH_SPECS_CACHE.pop(
+            (self.dataset, self.year), None
+        )
+
+    def test_execute(self):
+        """Metadata is only looked up when the query is compiled."""
+        query = ced.compile_query(
+            self.dataset,
+            self.year,
+            "B01003_001E",
+            variable_cache=self.variable_cache,
+        )
+        self.assertEqual(["B01003_001E"], query.variables)
+
+        metadata_lookups = self.variable_cache.get.call_count
+
+        df = query.execute(state="34", county="*")
+
+        self.assertEqual(metadata_lookups, self.variable_cache.get.call_count)
+        self.assertEqual(["STATE", "COUNTY", "B01003_001E"], list(df.columns))
+        self.assertEqual(["34", "34"], list(df["STATE"]))
+        self.assertEqual(12, df["B01003_001E"].iloc[0])
+        self.assertTrue(df["B01003_001E"].isnull().iloc[1])
+
+    def test_execute_many(self):
+        """Results come back in the order of the geographies."""
+        query = ced.compile_query(
+            self.dataset,
+            self.year,
+            ["B01003_001E"],
+            variable_cache=self.variable_cache,
+        )
+
+        states = [f"{ii:02}" for ii in range(1, 20)]
+        dfs = query.execute_many([{"state": state, "county": "*"} for state in states])
+
+        self.assertEqual(states, [df["STATE"].iloc[0] for df in dfs])
+        self.assertEqual(len(states), ced.data_from_url.call_count)
+
+    def test_execute_wide(self):
+        """Wide queries are planned once and run a request per group of variables."""
+        wide_variables = [f"B01001_{ii:03}E" for ii in range(1, 61)]
+
+        def fake_data_from_url(url, params):
+            state = params["in"].removeprefix("state:")
+            variables = params["get"].split(",")
+            return pd.DataFrame(
+                [[state, "001"] + ["1"] * len(variables)],
+                columns=["STATE", "COUNTY"] + variables,
+            )
+
+        ced.data_from_url.side_effect = fake_data_from_url
+
+        with mock.patch.object(
+            ced, "_parse_download_variables", return_value=wide_variables
+        ):
+            query = ced.compile_query(
+                self.dataset,
+                self.year,
+                wide_variables,
+                variable_cache=self.variable_cache,
+            )
+
+        with mock.patch.object(
+            ced, "_parse_download_variables"
+        ) as mock_parse, mock.patch.object(
+            ced, "_prefetch_variable_types"
+        ) as mock_prefetch, mock.patch.object(
+            ced, "_dtype_plan"
+        ) as mock_dtype_plan:
+            df1 = query.execute(state="34", county="*")
+            df2 = query.execute(state="36", county="*")
+
+        mock_parse.assert_not_called()
+        mock_prefetch.assert_not_called()
+        mock_dtype_plan.assert_not_called()
+
+        # One request per group of variables for each execution.
+        self.assertEqual(4, ced.data_from_url.call_count)
+
+        self.assertEqual(["STATE", "COUNTY"] + wide_variables, list(df1.columns))
+        self.assertEqual(["36"], list(df2["STATE"]))
+        self.assertEqual(1, df2["B01001_060E"].iloc[0])
+
+    def test_execute_ucgid_with_geo_kwargs(self):
+        """Can't mix ucgid and other geographies."""
+        query = ced.compile_query(
+            self.dataset,
+            self.year,
+            ["B01003_001E"],
+            variable_cache=self.variable_cache,
+        )
+
+        with self.assertRaises(ValueError):
+            query.execute(ucgid="0400000US34", state="34")
+
+
+class DownloadManyTestCase(unittest.TestCase):
+    """Test downloading many overlapping specs at once."""
+
+    def setUp(self) -> None:
+        """Set up a fake dataset and stay off the network."""
+        self.dataset = "test/download_many"
+        self.year = 2020
+
+        path_specs = {
+            num: censusdis.geography.PathSpec(
+                path, censusdis.geography.PathSpec._PathSpec__init_key
+            )
+            for num, path in {
+                "040": ["state"],
+                "050": ["state", "county"],
+            }.items()
+        }
+
+        def fake_download(dataset, vintage, download_variables, **kwargs):
+            return pd.DataFrame(
+                {"STATE": [kwargs["state"]]}
+                | {variable.upper(): [variable] for variable in download_variables}
+            )
+
+        self.variable_cache = mock.MagicMock()
+
+        patches = [
+            mock.patch.object(
+                censusdis.geography.PathSpec,
+                "_fetch_path_specs",
+                return_value=path_specs,
+            ),
+            mock.patch.object(
+                ced,
+                "_parse_download_variables",
+                side_effect=lambda *args, download_variables, **kwargs: (
+                    [download_variables]
+                    if isinstance(download_variables, str)
+                    else list(download_variables)
+                ),
+            ),
+            mock.patch.object(ced, "download", side_effect=fake_download),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.mock_download = ced.download
+
+    def tearDown(self) -> None:
+        """Forget about the fake dataset."""
+        censusdis.geography.PathSpec._PATH_SPECS_CACHE.pop(
+            (self.dataset, self.year), None
+        )
+
+    def spec(self, download_variables, **kwargs):
+        """Construct a spec for the fake dataset."""
+        return {
+            "dataset": self.dataset,
+            "vintage": self.year,
+            "download_variables": download_variables,
+            **kwargs,
+        }
+
+    def test_download_many(self):
+        """Identical and overlapping specs are combined."""
+        specs = [
+            self.spec(["X", "Y"], state="01"),
+            self.spec(["Z", "Y"], state="01"),
+            self.spec(["X", "Y"], state="01"),
+            self.spec("X", state="02"),
+            self.spec(["X"], state="01", set_to_nan=False),
+        ]
+
+        dfs = ced.download_many(specs, variable_cache=self.variable_cache)
+
+        # One query for state 01, one for state 02 and one with different arguments.
+        self.assertEqual(3, self.mock_download.call_count)
+        self.assertEqual(["X", "Y", "Z"], self.mock_download.call_args_list[0].args[2])
+
+        self.assertEqual(
+            [
+                ["STATE", "X", "Y"],
+                ["STATE", "Z", "Y"],
+                ["STATE", "X", "Y"],
+                ["STATE", "X"],
+                ["STATE", "X"],
+            ],
+            [list(df.columns) for df in dfs],
+        )
+        self.assertEqual(["01", "01", "01", "02", "01"], [df["STATE"][0] for df in dfs])
+
+        # Each spec has its own copy of the data.
+        self.assertIsNot(dfs[0], dfs[2])
+
+        self.variable_cache.prefetch.assert_called_once_with(
+            self.dataset, self.year, {"X": None, "Y": None, "Z": None}
+        )
+
+    def test_download_many_limit(self):
+        """Combined queries stay within the limit on variables per query."""
+        specs = [
+            self.spec([f"V{ii:03}_{jj}" for jj in range(20)], state="01")
+            for ii in range(5)
+        ]
+
+        dfs = ced.download_many(specs, variable_cache=self.variable_cache)
+
+        # 20 + 20 fit in a query, but 60 don't.
+        self.assertEqual(3, self.mock_download.call_count)
+        for call in self.mock_download.call_args_list:
+            self.assertLessEqual(len(call.args[2]), 50)
+
+        for spec, df in zip(specs, dfs):
+            self.assertEqual(["STATE"] + spec["download_variables"], list(df.columns))
+
+    def test_download_many_reserved(self):
+        """Some arguments apply to all the specs."""
+        with self.assertRaises(ValueError):
+            ced.download_many([self.spec(["X"], state="01", api_key="key")])
+
+
 if __name__ == "__main__":
     unittest.main()
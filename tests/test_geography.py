@@ -1,9 +1,20 @@
 # Copyright (c) 2023 Darren Erik Vengroff
 """Test for geography functionality."""
+import itertools
+import tempfile
+import time
 import unittest
+from pathlib import Path
 from typing import Mapping, Optional, Tuple
-
-from censusdis.geography import CensusGeographyQuerySpec, PathSpec
+from unittest import mock
+
+from censusdis.geography import (
+    CensusGeographyQuerySpec,
+    PathSpec,
+    path_component_to_snake,
+)
+from censusdis.impl.concurrency import concurrent_map
+from censusdis.impl.metastore import SqliteMetadataStore
 from censusdis.datasets import LODES_OD_MAIN_JT00
 
 
@@ -371,5 +382,131 @@ class LodesGeographyTestCase(unittest.TestCase):
         )
 
 
+class PathSpecCacheTestCase(unittest.TestCase):
+    """Test the cache of path specs."""
+
+    def test_concurrent_single_fetch(self):
+        """Concurrent misses on the same dataset and vintage fetch once."""
+        dataset = "test/path_spec_single_flight"
+
+        def slow_fetch(dataset, year):
+            time.sleep(0.05)
+            return {"040": PathSpec.get_path_specs("lodes/od", None)["040"]}
+
+        try:
+            with mock.patch.object(
+                PathSpec, "_fetch_path_specs", side_effect=slow_fetch
+            ) as mock_fetch:
+                path_specs = concurrent_map(
+                    lambda _: PathSpec.get_path_specs(dataset, 2020), range(4)
+                )
+
+            self.assertEqual(1, mock_fetch.call_count)
+            self.assertTrue(all(specs is path_specs[0] for specs in path_specs))
+            self.assertEqual(
+                "state",
+                path_component_to_snake(dataset, 2020, "state"),
+            )
+        finally:
+            PathSpec._PATH_SPECS_CACHE.pop((dataset, 2020), None)
+
+
+class PathSpecIndexTestCase(unittest.TestCase):
+    """Test matching through the path spec index and persisting path specs."""
+
+    PATHS = {
+        "010": ["us"],
+        "020": ["region"],
+        "040": ["state"],
+        "050": ["state", "county"],
+        "060": ["state", "county", "county subdivision"],
+        "140": ["state", "county", "tract"],
+        "150": ["state", "county", "tract", "block group"],
+        "160": ["state", "place"],
+        "500": ["state", "congressional district"],
+    }
+
+    def setUp(self) -> None:
+        """Set up a fake dataset."""
+        self.dataset = "test/path_spec_index"
+        self.year = 2020
+
+        self.path_specs = {
+            num: PathSpec(path, PathSpec._PathSpec__init_key)
+            for num, path in self.PATHS.items()
+        }
+
+    def tearDown(self) -> None:
+        """Forget about the fake dataset."""
+        PathSpec._PATH_SPECS_CACHE.pop((self.dataset, self.year), None)
+        PathSpec.set_metadata_store(None)
+
+    def test_index_matches_scan(self):
+        """The index finds the same matches as scanning all the path specs."""
+        components = [
+            "us",
+            "region",
+            "state",
+            "county",
+            "county subdivision",
+            "tract",
+            "block group",
+            "place",
+        ]
+
+        with mock.patch.object(
+            PathSpec, "_fetch_path_specs", return_value=self.path_specs
+        ):
+            for length in range(4):
+                for keys in itertools.permutations(components, length):
+                    kwargs = {key.replace(" ", "_"): "*" for key in keys}
+
+                    expected = [
+                        num
+                        for num, path_spec in self.path_specs.items()
+                        if path_spec._partial_match(True, **kwargs)
+                    ]
+                    matches = PathSpec.partial_matches(
+                        self.dataset, self.year, **kwargs
+                    )
+                    self.assertEqual(expected, [bgp.num for bgp in matches])
+
+                    expected_full = [
+                        num
+                        for num, path_spec in self.path_specs.items()
+                        if path_spec._full_match(**kwargs)
+                    ]
+                    num, _ = PathSpec.full_match(self.dataset, self.year, **kwargs)
+                    self.assertEqual(expected_full[0] if expected_full else None, num)
+
+        bgp = PathSpec.partial_prefix_match(
+            self.dataset, self.year, state="34", tract="*"
+        )
+        self.assertEqual("140", bgp.num)
+        self.assertEqual({"state": "34", "county": "*", "tract": "*"}, bgp.bindings)
+
+    def test_persisted(self):
+        """Path specs are fetched once and then loaded from the store."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            PathSpec.set_metadata_store(
+                SqliteMetadataStore(Path(tmp_dir) / "metadata.db")
+            )
+
+            with mock.patch.object(
+                PathSpec, "_fetch_path_specs", return_value=self.path_specs
+            ) as mock_fetch:
+                PathSpec.get_path_specs(self.dataset, self.year)
+
+                # A new process would start with an empty cache.
+                PathSpec._PATH_SPECS_CACHE.pop((self.dataset, self.year), None)
+                path_specs = PathSpec.get_path_specs(self.dataset, self.year)
+
+            self.assertEqual(1, mock_fetch.call_count)
+            self.assertEqual(
+                self.PATHS,
+                {num: path_spec.path for num, path_spec in path_specs.items()},
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,10 +1,15 @@
 """Tests for `censusdis.multiyear`."""
 
+import threading
+import time
 import unittest
+from unittest import mock
 
 import pandas as pd
 import numpy as np
 
+import censusdis.data as ced
+from censusdis.crosswalk import Crosswalk
 from censusdis.multiyear import (
     download_multiyear,
     pct_change_multiyear,
@@ -81,6 +86,156 @@ def TestGraphMultiyear(group_default):
     assert graph_multiyear(group_default) is None
 
 
+def test_download_multiyear_concurrent(capsys):
+    """Vintages are downloaded concurrently and combined in order."""
+    vintages = list(range(2010, 2020))
+    threads = set()
+
+    def fake_download(dataset, vintage, download_variables, group, **kwargs):
+        threads.add(threading.get_ident())
+        # Make the early vintages finish last.
+        time.sleep(0.01 * (2020 - vintage))
+        return pd.DataFrame({"STATE": [NY], "B01003_001E": [vintage]})
+
+    variable_cache = mock.MagicMock()
+    variable_cache.get.side_effect = lambda dataset, year, name: {
+        "label": "Estimate!!Total:" if year < 2015 else "Estimate!!Total"
+    }
+
+    with mock.patch.object(
+        ced, "download", side_effect=fake_download
+    ), mock.patch.object(ced, "variables", variable_cache):
+        df = download_multiyear(
+            dataset=ACS5,
+            vintages=vintages,
+            download_variables=["B01003_001E"],
+            rename_vars=False,
+            prompt=False,
+            state=NY,
+        )
+
+    assert len(threads) > 1
+    assert vintages == list(df["Year"])
+    assert vintages == list(df["B01003_001E"])
+    assert list(range(len(vintages))) == list(df.index)
+
+    # Metadata was loaded in bulk, and the labels only differ by a ":".
+    assert len(vintages) == variable_cache.prefetch.call_count
+    assert "multiple labels" not in capsys.readouterr().out
+
+
+def test_download_multiyear_cache_path(tmp_path, capsys):
+    """Only vintages that are not already in the cache are downloaded."""
+    downloaded = []
+
+    def fake_download(dataset, vintage, download_variables, group, **kwargs):
+        downloaded.append(vintage)
+        return pd.DataFrame({"STATE": [NY], "B01003_001E": [vintage]})
+
+    variable_cache = mock.MagicMock()
+    variable_cache.get.side_effect = lambda dataset, year, name: {
+        "label": "Estimate!!Total" if year < 2022 else "Estimate!!Total population"
+    }
+
+    def download(vintages):
+        with mock.patch.object(
+            ced, "download", side_effect=fake_download
+        ), mock.patch.object(ced, "variables", variable_cache):
+            return download_multiyear(
+                dataset=ACS5,
+                vintages=vintages,
+                download_variables=["B01003_001E"],
+                rename_vars=False,
+                prompt=False,
+                cache_path=tmp_path,
+                state=NY,
+            )
+
+    df = download([2018, 2019])
+    assert [2018, 2019] == downloaded
+    assert [2018, 2019] == list(df["B01003_001E"])
+    assert (tmp_path / "labels.json").exists()
+
+    # Adding a vintage only downloads it and looks up its labels.
+    downloaded.clear()
+    variable_cache.reset_mock()
+    df = download([2018, 2019, 2020])
+    assert [2020] == downloaded
+    assert [2018, 2019, 2020] == list(df["Year"])
+    assert [2018, 2019, 2020] == list(df["B01003_001E"])
+    assert {2020} == {call.args[1] for call in variable_cache.prefetch.call_args_list}
+
+    # Nothing new, so nothing is downloaded or checked.
+    downloaded.clear()
+    df = download([2018, 2019, 2020])
+    assert [] == downloaded
+    assert 3 == len(df.index)
+
+    assert "multiple labels" not in capsys.readouterr().out
+
+    # A label changes in a new vintage, so there is a warning.
+    download([2018, 2019, 2020, 2022])
+    out = capsys.readouterr().out
+    assert "B01003_001E has had multiple labels" in out
+
+
+def test_download_multiyear_harmonize_to():
+    """Earlier vintages are reallocated to the geographies of `harmonize_to`."""
+    # In 2015 there were two counties. By 2020, "002" was split into "002" and "003".
+    counties = {2015: ["001", "002"], 2020: ["001", "002", "003"]}
+    estimates = {2015: [100, 300], 2020: [110, 200, 120]}
+
+    def fake_download(dataset, vintage, download_variables=None, group=None, **kwargs):
+        df = pd.DataFrame({"STATE": NY, "COUNTY": counties[vintage]})
+        df["NAME"] = [f"County {county} in {vintage}" for county in counties[vintage]]
+        if group is not None:
+            df["B01003_001E"] = estimates[vintage]
+            df["B01003_001M"] = [10] * len(df.index)
+        return df
+
+    crosswalk = Crosswalk(
+        pd.DataFrame({"STATE": NY, "COUNTY": counties[2015]}),
+        pd.DataFrame({"STATE": NY, "COUNTY": counties[2020]}),
+        source_index=[0, 1, 1],
+        target_index=[0, 1, 2],
+        weights=[1.0, 0.75, 0.25],
+    )
+
+    variable_cache = mock.MagicMock()
+    variable_cache.get.side_effect = lambda dataset, year, name: {
+        "label": "Estimate!!Total"
+    }
+    variable_cache.is_additive.side_effect = (
+        lambda dataset, year, name: name == "B01003_001E"
+    )
+
+    with mock.patch.object(
+        ced, "download", side_effect=fake_download
+    ), mock.patch.object(ced, "variables", variable_cache), mock.patch.object(
+        Crosswalk, "build", return_value=crosswalk
+    ):
+        df = download_multiyear(
+            dataset=ACS5,
+            vintages=[2015, 2020],
+            group="B01003",
+            rename_vars=False,
+            drop_cols=False,
+            prompt=False,
+            harmonize_to=2020,
+            state=NY,
+            county="*",
+        )
+
+    columns = ["STATE", "COUNTY", "NAME", "B01003_001E", "B01003_001M", "Year"]
+    assert columns == list(df.columns)
+    assert [2015] * 3 + [2020] * 3 == list(df["Year"])
+    assert 2 * [f"County {county} in 2020" for county in counties[2020]] == list(
+        df["NAME"]
+    )
+    assert [100, 225, 75, 110, 200, 120] == list(df["B01003_001E"])
+    assert [10, 7.5, 2.5] == list(df["B01003_001M"])[:3]
+
+
 @pytest.fixture
 def group_default():
     """Correct output for running the following code.
@@ -0,0 +1,171 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Tests for metadata snapshots."""
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest import mock
+
+import censusdis.data as ced
+from censusdis.geography import PathSpec
+from censusdis.impl.metastore import SqliteMetadataStore
+from censusdis.impl.snapshot import build_snapshot
+from censusdis.impl.varcache import VariableCache
+from censusdis.impl.varsource.base import VariableSource
+from censusdis.impl.varsource.sqlite import SqliteVariableSource
+
+
+class SnapshotTestCase(unittest.TestCase):
+    """Build snapshots and look up metadata in them."""
+
+    class FakeVariableSource(VariableSource):
+        """A fake source with two groups that counts how often it is called."""
+
+        def __init__(self):
+            self.calls = 0
+
+        def get(self, dataset: str, year: int, name: str) -> Dict[str, Any]:
+            """Get a fake variable."""
+            self.calls = self.calls + 1
+            return {"name": name, "label": "Estimate!!Other", "group": "N/A"}
+
+        def get_group(
+            self, dataset: str, year: int, name: Optional[str]
+        ) -> Dict[str, Dict]:
+            """Get a fake group, or all the variables if `name` is `None`."""
+            self.calls = self.calls + 1
+            groups = ["B01001", "B01002"] if name is None else [name]
+            return {
+                "variables": {
+                    f"{group}_{ii:03}E": {
+                        "name": f"{group}_{ii:03}E",
+                        "label": f"Estimate!!Total:!!{ii}",
+                        "concept": "SEX BY AGE",
+                        "predicateType": "int",
+                        "group": group,
+                    }
+                    for group in groups
+                    for ii in range(1, 3)
+                }
+            }
+
+        def get_all_groups(self, dataset: str, year: int) -> Dict[str, List]:
+            """Get fake groups."""
+            self.calls = self.calls + 1
+            return {
+                "groups": [
+                    {"name": "B01001", "description": "SEX BY AGE"},
+                    {"name": "B01002", "description": "MEDIAN AGE BY SEX"},
+                ]
+            }
+
+        def get_datasets(self, year: Optional[int]) -> Dict[str, Any]:
+            """Get fake datasets."""
+            self.calls = self.calls + 1
+            return {"dataset": []}
+
+    def setUp(self) -> None:
+        """Build a snapshot in a temporary directory."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "snapshot.db"
+        self.dataset = "test/snapshot"
+        self.year = 2020
+
+        self.path_specs = {
+            "040": PathSpec(["state"], PathSpec._PathSpec__init_key),
+            "050": PathSpec(["state", "county"], PathSpec._PathSpec__init_key),
+        }
+
+        with mock.patch.object(
+            PathSpec, "_fetch_path_specs", return_value=self.path_specs
+        ):
+            build_snapshot(
+                self.path,
+                [(self.dataset, self.year)],
+                variable_source=self.FakeVariableSource(),
+            )
+
+        self.source = self.FakeVariableSource()
+
+    def tearDown(self) -> None:
+        """Clean up."""
+        PathSpec._PATH_SPECS_CACHE.pop((self.dataset, self.year), None)
+        PathSpec.set_snapshot_store(None)
+        self.tmp_dir.cleanup()
+
+    def test_snapshot_is_one_file(self):
+        """The snapshot is compacted into a single file."""
+        self.assertEqual(
+            ["snapshot.db"], sorted(p.name for p in self.path.parent.iterdir())
+        )
+
+    def test_variables_from_snapshot(self):
+        """Variables, groups and searches don't go to the source."""
+        store = SqliteMetadataStore(self.path, read_only=True)
+        self.assertTrue(store.read_only)
+
+        variables = VariableCache(
+            variable_source=SqliteVariableSource(store, self.source)
+        )
+
+        self.assertEqual(
+            "Estimate!!Total:!!1",
+            variables.get(self.dataset, self.year, "B01002_001E")["label"],
+        )
+        self.assertEqual(
+            ["B01001_001E", "B01001_002E"],
+            variables.group_variables(self.dataset, self.year, "B01001"),
+        )
+        self.assertEqual(2, len(variables.all_groups(self.dataset, self.year)))
+        self.assertEqual(
+            ["B01001_002E", "B01002_002E"],
+            list(variables.search(self.dataset, self.year, pattern="!!2$")["VARIABLE"]),
+        )
+        self.assertEqual(0, self.source.calls)
+
+        # Things that are not in the snapshot come from the source,
+        # and are not written to the snapshot.
+        variables.get(self.dataset, self.year, "OTHER")
+        self.assertEqual(1, self.source.calls)
+        self.assertIsNone(store.get_variable(self.dataset, self.year, "OTHER"))
+
+    def test_path_specs_from_snapshot(self):
+        """Path specs are loaded from the snapshot."""
+        PathSpec.set_snapshot_store(SqliteMetadataStore(self.path, read_only=True))
+
+        with mock.patch.object(PathSpec, "_fetch_path_specs") as mock_fetch:
+            path_specs = PathSpec.get_path_specs(self.dataset, self.year)
+
+        mock_fetch.assert_not_called()
+        self.assertEqual(["state", "county"], path_specs["050"].path)
+
+    def test_missing_snapshot(self):
+        """Opening a snapshot that isn't there fails right away."""
+        with self.assertRaises(ValueError):
+            SqliteMetadataStore(Path(self.tmp_dir.name) / "missing.db", read_only=True)
+
+    def test_set_metadata_snapshot_path(self):
+        """The snapshot goes in front of the metadata cache."""
+        original_source = ced.variables.variable_source
+        cache_path = Path(self.tmp_dir.name) / "cache.db"
+
+        try:
+            ced.set_metadata_cache_path(cache_path)
+            ced.set_metadata_snapshot_path(self.path)
+
+            self.assertEqual(self.path, ced.get_metadata_snapshot_path())
+            self.assertEqual(cache_path, ced.get_metadata_cache_path())
+            self.assertTrue(ced.variables.variable_source.store.read_only)
+
+            ced.set_metadata_cache_path(None)
+            self.assertEqual(self.path, ced.get_metadata_snapshot_path())
+            self.assertIs(original_source, ced.variables.variable_source.backing_source)
+        finally:
+            ced.set_metadata_snapshot_path(None)
+            ced.set_metadata_cache_path(None)
+
+        self.assertIs(original_source, ced.variables.variable_source)
+
+
+if __name__ == "__main__":
+    unittest.main()
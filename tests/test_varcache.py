@@ -1,10 +1,18 @@
 # Copyright (c) 2023 Darren Erik Vengroff
 """Test the variable cache."""
+
+import tempfile
+import time
 import unittest
+from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional
+from unittest import mock
 
+from censusdis.impl.concurrency import concurrent_map
+from censusdis.impl.metastore import SqliteMetadataStore
 from censusdis.impl.varcache import VariableCache
 from censusdis.impl.varsource.base import VariableSource
+from censusdis.impl.varsource.sqlite import SqliteVariableSource
 
 from pandas.testing import assert_frame_equal
 
@@ -244,6 +252,47 @@ class VariableCacheTestCase(unittest.TestCase):
         self.variables.clear()
         self.assertEqual(0, len(self.variables))
 
+    def test_prefetch_groups(self):
+        """Prefetch variables from a few groups with group calls."""
+        names = [
+            "X02002_002E",
+            "X02002_003E",
+            "X02002_004E",
+            "X03003_002E",
+            "X03003_003E",
+        ]
+
+        self.variables.prefetch(self.source, self.year, names)
+
+        self.assertEqual(0, self.mock_source.gets)
+        self.assertEqual(2, self.mock_source.group_gets)
+
+        for name in names:
+            self.variables.get(self.source, self.year, name)
+
+        # Everything was already in the cache.
+        self.assertEqual(0, self.mock_source.gets)
+
+        # A second prefetch has nothing to do.
+        self.variables.prefetch(self.source, self.year, names)
+        self.assertEqual(2, self.mock_source.group_gets)
+
+    def test_prefetch_many_groups(self):
+        """Prefetch variables from many groups with one call for all variables."""
+        names = [f"X{ii:05}_001E" for ii in range(20)]
+
+        self.variables.prefetch(self.source, self.year, names)
+
+        self.assertEqual(0, self.mock_source.gets)
+        self.assertEqual(1, self.mock_source.group_gets)
+
+    def test_prefetch_few(self):
+        """Prefetching just a few variables is left to get."""
+        self.variables.prefetch(self.source, self.year, ["X02002_002E", "NAME"])
+
+        self.assertEqual(0, self.mock_source.gets)
+        self.assertEqual(0, self.mock_source.group_gets)
+
     def test_group(self):
         """Test caching groups."""
         self.assertEqual(0, self.mock_source.gets)
@@ -498,6 +547,233 @@ class VariableCacheTestCase(unittest.TestCase):
 
         self.assertEqual((4, 7), df_white_vars_extra_years.shape)
 
+    def test_search_index(self):
+        """Search all the variables in a data set through the index."""
+        df_white_vars = self.variables.search(
+            self.source, [self.year - 1, self.year], pattern="white alone"
+        )
+
+        self.assertEqual((2, 7), df_white_vars.shape)
+        self.assertEqual(["None_003E", "None_003E"], list(df_white_vars["VARIABLE"]))
+        self.assertEqual([self.year - 1, self.year], list(df_white_vars["YEAR"]))
+        self.assertEqual(2, self.mock_source.group_gets)
+
+        # Regular expressions that are not literals, keywords and names.
+        df_alone_vars = self.variables.search(
+            self.source, self.year, pattern=r"(White|Black).*alone$", case=True
+        )
+        self.assertEqual(["None_003E", "None_004E"], list(df_alone_vars["VARIABLE"]))
+
+        df_keyword_vars = self.variables.search(
+            self.source, self.year, keywords="hisp lat black"
+        )
+        self.assertEqual(["None_004E"], list(df_keyword_vars["VARIABLE"]))
+
+        df_name_vars = self.variables.search(
+            self.source, self.year, name=["None_004E", "None_002E"]
+        )
+        self.assertEqual(["None_004E", "None_002E"], list(df_name_vars["VARIABLE"]))
+
+        # All of these came from the index.
+        self.assertEqual(2, self.mock_source.group_gets)
+        self.assertEqual(0, self.mock_source.gets)
+
+    def test_search_index_persisted(self):
+        """The index is persisted when the source is persistent."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SqliteMetadataStore(Path(tmp_dir) / "metadata.db")
+            variables = VariableCache(
+                variable_source=SqliteVariableSource(store, self.mock_source)
+            )
+
+            df_first = variables.search(self.source, self.year, pattern="White")
+            self.assertIsNotNone(
+                store.get_document(self.source, self.year, "variable_index")
+            )
+
+            # A new cache in front of the same store uses the persisted index.
+            variables = VariableCache(
+                variable_source=SqliteVariableSource(store, self.mock_source)
+            )
+            df_second = variables.search(self.source, self.year, pattern="White")
+
+        assert_frame_equal(df_first, df_second)
+        self.assertEqual(1, self.mock_source.group_gets)
+
+    def test_sqlite_source_persists_years(self):
+        """Metadata for vintages that are years is persisted."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SqliteMetadataStore(Path(tmp_dir) / "metadata.db")
+            source = SqliteVariableSource(store, self.mock_source)
+
+            source.get(self.source, self.year, "X01001_001E")
+            source.get_group(self.source, self.year, "X02002")
+
+            self.assertIsNotNone(
+                store.get_variable(self.source, self.year, "X01001_001E")
+            )
+            self.assertIsNotNone(store.get_group(self.source, self.year, "X02002"))
+
+            # Now they come from the store.
+            self.mock_source.reset_counts()
+            source.get(self.source, self.year, "X01001_001E")
+            source.get_group(self.source, self.year, "X02002")
+
+        self.assertEqual(0, self.mock_source.gets)
+        self.assertEqual(0, self.mock_source.group_gets)
+
+    def test_sqlite_source_does_not_persist_timeseries(self):
+        """Metadata for timeseries, which changes over time, is not persisted."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SqliteMetadataStore(Path(tmp_dir) / "metadata.db")
+            source = SqliteVariableSource(store, self.mock_source)
+            variables = VariableCache(variable_source=source)
+
+            for _ in range(2):
+                source.get(self.source, "timeseries", "X01001_001E")
+                source.get_group(self.source, "timeseries", "X02002")
+                variables.variable_index(self.source, "timeseries")
+                variables.clear()
+
+            self.assertIsNone(
+                store.get_variable(self.source, "timeseries", "X01001_001E")
+            )
+            self.assertIsNone(store.get_group(self.source, "timeseries", "X02002"))
+            self.assertIsNone(
+                store.get_document(self.source, "timeseries", "variable_index")
+            )
+
+        # Each time, they came from the backing source.
+        self.assertEqual(2, self.mock_source.gets)
+        self.assertEqual(4, self.mock_source.group_gets)
+
+    def test_search_concurrent_vintages(self):
+        """Vintages are searched concurrently but come back in order."""
+        get_group = self.mock_source.get_group
+
+        def slow_get_group(source, year, group_name):
+            # Earlier years are slower, so they finish last.
+            time.sleep(0.01 * (self.year - year))
+            return get_group(source, year, group_name)
+
+        years = list(range(self.year - 4, self.year + 1))
+
+        with mock.patch.object(
+            self.mock_source, "get_group", side_effect=slow_get_group
+        ):
+            df_white_vars = self.variables.search(
+                self.source, years, pattern="White alone"
+            )
+            df_groups = self.variables.search_groups(self.source, years)
+
+        self.assertEqual(years, list(df_white_vars["YEAR"]))
+        self.assertEqual(
+            [year for year in years for _ in range(2)], list(df_groups["YEAR"])
+        )
+
+    def test_group_tree_memoized(self):
+        """Trees and leaves are built once and reused."""
+        tree1 = self.variables.group_tree(self.source, self.year, "X02002")
+        leaves1 = self.variables.group_leaves(self.source, self.year, "X02002")
+
+        tree2 = self.variables.group_tree(self.source, self.year, "X02002")
+        leaves2 = self.variables.group_leaves(self.source, self.year, "X02002")
+
+        self.assertEqual(str(tree1), str(tree2))
+        self.assertEqual(leaves1, leaves2)
+        self.assertEqual(1, self.mock_source.group_gets)
+
+        # Callers can't change what is cached.
+        leaves2.append("X02002_999E")
+        self.assertEqual(
+            leaves1, self.variables.group_leaves(self.source, self.year, "X02002")
+        )
+
+        self.variables.clear()
+        tree3 = self.variables.group_tree(self.source, self.year, "X02002")
+        self.assertIsNot(tree1, tree3)
+        self.assertEqual(str(tree1), str(tree3))
+        self.assertEqual(2, self.mock_source.group_gets)
+
+    def test_group_tree_copied(self):
+        """Changes to a returned tree do not change the cached one."""
+        tree1 = self.variables.group_tree(self.source, self.year, "X02002")
+        expected = str(tree1)
+        expected_leaves = list(tree1.leaf_variables())
+
+        leaf = next(iter(tree1.leaves()))
+        leaf.name = "X02002_999E"
+        leaf.add_child("Extra", VariableCache.GroupTreeNode("X02002_998E"))
+        tree1.add_child("Other", VariableCache.GroupTreeNode("X02002_997E"))
+
+        tree2 = self.variables.group_tree(self.source, self.year, "X02002")
+
+        self.assertEqual(expected, str(tree2))
+        self.assertEqual(expected_leaves, list(tree2.leaf_variables()))
+        self.assertEqual(
+            expected_leaves,
+            self.variables.group_leaves(self.source, self.year, "X02002"),
+        )
+        self.assertNotIn("Other", tree2)
+
+    def test_group_tree_node_add_child(self):
+        """Nodes built by hand are copied into the tree they are added to."""
+        root = VariableCache.GroupTreeNode()
+        child = VariableCache.GroupTreeNode("X_001E")
+        grandchild = VariableCache.GroupTreeNode("X_002E")
+
+        child.add_child("Grandchild", grandchild)
+        root.add_child("Child", child)
+        child.name = "X_003E"
+
+        self.assertEqual("X_003E", root["Child"].name)
+        self.assertEqual(["X_002E"], list(root.leaf_variables()))
+        self.assertTrue(root["Child"]["Grandchild"].is_leaf())
+
+    def test_concurrent_get_single_flight(self):
+        """Concurrent misses on the same variable fetch it once."""
+        get = self.mock_source.get
+
+        def slow_get(source, year, name):
+            time.sleep(0.05)
+            return get(source, year, name)
+
+        with mock.patch.object(self.mock_source, "get", side_effect=slow_get):
+            values = concurrent_map(
+                lambda _: self.variables.get(self.source, self.year, "X01001_001E"),
+                range(4),
+            )
+
+        self.assertEqual(1, self.mock_source.gets)
+        self.assertTrue(all(value is values[0] for value in values))
+
+    def test_cache_limits(self):
+        """Variables evicted from a bounded cache are fetched again."""
+        self.variables.set_cache_limits("variables", max_entries=2)
+
+        for name in ["X01001_001E", "X01001_002E", "X01001_003E"]:
+            self.variables.get(self.source, self.year, name)
+
+        self.assertEqual(2, len(self.variables))
+        self.assertNotIn((self.source, self.year, "X01001_001E"), self.variables)
+
+        self.variables.get(self.source, self.year, "X01001_001E")
+        self.assertEqual(4, self.mock_source.gets)
+
+        info = self.variables.cache_info()["variables"]
+        self.assertEqual(2, info.entries)
+        self.assertEqual(2, info.max_entries)
+        self.assertGreater(info.nbytes, 0)
+
+        # Setting one limit leaves the other as it was.
+        self.assertEqual(
+            VariableCache._DEFAULT_CACHE_LIMITS["variables"]["max_bytes"],
+            info.max_bytes,
+        )
+
+        with self.assertRaises(ValueError):
+            self.variables.set_cache_limits("no_such_cache", max_entries=1)
+
 
 if __name__ == "__main__":
     unittest.main()
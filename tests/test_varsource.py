@@ -1,8 +1,16 @@
 # Copyright (c) 2023 Darren Erik Vengroff
 """Test variable source functionality."""
+
+import tempfile
 import unittest
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
+from censusdis.impl.concurrency import concurrent_map
+from censusdis.impl.metastore import SqliteMetadataStore
+from censusdis.impl.varsource.base import VariableSource
 from censusdis.impl.varsource.censusapi import CensusApiVariableSource
+from censusdis.impl.varsource.sqlite import SqliteVariableSource
 
 
 class CensusApiVariableSourceTestCase(unittest.TestCase):
@@ -41,5 +49,124 @@ class CensusApiVariableSourceTestCase(unittest.TestCase):
         )
 
 
+class SqliteVariableSourceTestCase(unittest.TestCase):
+    """Test the SqliteVariableSource class."""
+
+    class CountingVariableSource(VariableSource):
+        """A mock source that counts how often it is called."""
+
+        def __init__(self):
+            self.calls = 0
+
+        def get(self, dataset: str, year: int, name: str) -> Dict[str, Any]:
+            """Get a mock variable."""
+            self.calls = self.calls + 1
+            return {"name": name, "label": f"Estimate!!{name}", "predicateType": "int"}
+
+        def get_group(
+            self, dataset: str, year: int, name: Optional[str]
+        ) -> Dict[str, Dict]:
+            """Get a mock group."""
+            self.calls = self.calls + 1
+            return {
+                "variables": {
+                    f"{name}_{ii:03}E": {
+                        "name": f"{name}_{ii:03}E",
+                        "label": f"Estimate!!{ii}",
+                        "predicateType": "int",
+                        "group": name,
+                    }
+                    for ii in range(1, 4)
+                }
+            }
+
+        def get_all_groups(self, dataset: str, year: int) -> Dict[str, List]:
+            """Get mock groups."""
+            self.calls = self.calls + 1
+            return {"groups": [{"name": "B01001", "description": "SEX BY AGE"}]}
+
+        def get_datasets(self, year: Optional[int]) -> Dict[str, Any]:
+            """Get mock datasets."""
+            self.calls = self.calls + 1
+            return {"dataset": []}
+
+    def setUp(self) -> None:
+        """Set up a store in a temporary directory."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = Path(self._tmp_dir.name) / "metadata" / "cache.db"
+        self._backing_source = self.CountingVariableSource()
+        self._variable_source = SqliteVariableSource(
+            SqliteMetadataStore(self._path), self._backing_source
+        )
+
+    def tearDown(self) -> None:
+        """Clean up the temporary directory."""
+        self._tmp_dir.cleanup()
+
+    def test_get(self):
+        """Variables are fetched once and then come from the store."""
+        value = self._variable_source.get("acs/acs5", 2020, "B01001_001E")
+        self.assertEqual(1, self._backing_source.calls)
+
+        self.assertEqual(
+            value, self._variable_source.get("acs/acs5", 2020, "B01001_001E")
+        )
+        self.assertEqual(1, self._backing_source.calls)
+
+        # A different vintage is a different variable.
+        self._variable_source.get("acs/acs5", "timeseries", "B01001_001E")
+        self.assertEqual(2, self._backing_source.calls)
+
+    def test_get_group(self):
+        """Groups and their variables are stored."""
+        group = self._variable_source.get_group("acs/acs5", 2020, "B01001")
+        self.assertEqual(1, self._backing_source.calls)
+
+        self.assertEqual(
+            group, self._variable_source.get_group("acs/acs5", 2020, "B01001")
+        )
+        self.assertEqual(
+            group["variables"]["B01001_002E"],
+            self._variable_source.get("acs/acs5", 2020, "B01001_002E"),
+        )
+        self.assertEqual(1, self._backing_source.calls)
+
+    def test_get_all_groups(self):
+        """All groups are stored."""
+        groups = self._variable_source.get_all_groups("acs/acs5", 2020)
+        self.assertEqual(groups, self._variable_source.get_all_groups("acs/acs5", 2020))
+        self.assertEqual(1, self._backing_source.calls)
+
+    def test_shared(self):
+        """Another store on the same file, e.g. in another process, sees the data."""
+        value = self._variable_source.get("acs/acs5", 2020, "B01001_001E")
+
+        other_backing_source = self.CountingVariableSource()
+        other_variable_source = SqliteVariableSource(
+            SqliteMetadataStore(self._path), other_backing_source
+        )
+
+        self.assertEqual(
+            value, other_variable_source.get("acs/acs5", 2020, "B01001_001E")
+        )
+        self.assertEqual(0, other_backing_source.calls)
+
+    def test_threads(self):
+        """The store can be used from many threads."""
+        names = [f"B01001_{ii:03}E" for ii in range(1, 50)]
+
+        values = concurrent_map(
+            lambda name: self._variable_source.get("acs/acs5", 2020, name),
+            names,
+            workers=8,
+        )
+
+        self.assertEqual(names, [value["name"] for value in values])
+        self.assertEqual(
+            len(names),
+            len(self._variable_source.store.get_variables("acs/acs5", 2020, names)),
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,103 @@
+# Copyright (c) 2024 Darren Erik Vengroff
+"""Tests for writing CLI output files."""
+import tempfile
+import unittest
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+from shapely.geometry import Point, Polygon
+
+from censusdis.cli.writers import needs_geometry, write
+
+
+class WritersTestCase(unittest.TestCase):
+    """Test writing data in each output format."""
+
+    def setUp(self) -> None:
+        """Set up before each test."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp_dir.name)
+
+        self.df = pd.DataFrame(
+            {
+                "STATE": [f"{ii:02d}" for ii in range(10)],
+                "NAME": [f"State {ii}" for ii in range(10)],
+                "B01003_001E": range(10),
+                "frac_B01003_001E": [ii / 10 for ii in range(10)],
+            }
+        )
+        geometry = [Point(ii, ii) for ii in range(9)] + [
+            Polygon([(0, 0), (1, 0), (1, 1)])
+        ]
+        self.gdf = gpd.GeoDataFrame(self.df, geometry=geometry, crs="EPSG:4269")
+
+    def tearDown(self) -> None:
+        """Clean up after each test."""
+        self._tmp_dir.cleanup()
+
+    def test_needs_geometry(self):
+        """Test which formats require geometry."""
+        self.assertTrue(needs_geometry("out.geojson"))
+        self.assertTrue(needs_geometry("out.geoparquet"))
+        self.assertTrue(needs_geometry("out.fgb"))
+        self.assertFalse(needs_geometry("out.parquet"))
+        self.assertFalse(needs_geometry("out.csv"))
+
+        with self.assertRaises(ValueError):
+            write(self.df, self.directory / "out.fgb")
+
+    def test_parquet(self):
+        """Test Parquet is written in row groups."""
+        output = self.directory / "out.parquet"
+        write(self.df, output, rows_per_group=3)
+
+        self.assertEqual(4, pq.ParquetFile(output).num_row_groups)
+        pd.testing.assert_frame_equal(self.df, pd.read_parquet(output))
+
+    def test_geoparquet(self):
+        """Test GeoParquet round trips through geopandas."""
+        for suffix in ".parquet", ".geoparquet":
+            output = self.directory / f"out{suffix}"
+            write(self.gdf, output, rows_per_group=4)
+
+            gdf = gpd.read_parquet(output)
+
+            self.assertEqual(self.gdf.crs, gdf.crs)
+            self.assertEqual(list(self.gdf.columns), list(gdf.columns))
+            self.assertTrue(self.gdf.geometry.geom_equals(gdf.geometry).all())
+
+    def test_feather(self):
+        """Test Feather with and without geometry."""
+        output = self.directory / "out.feather"
+
+        write(self.df, output, rows_per_group=3)
+        pd.testing.assert_frame_equal(self.df, pd.read_feather(output))
+
+        write(self.gdf, output, rows_per_group=3)
+        gdf = gpd.read_feather(output)
+        self.assertTrue(self.gdf.geometry.geom_equals(gdf.geometry).all())
+
+    def test_flatgeobuf(self):
+        """Test FlatGeobuf."""
+        output = self.directory / "out.fgb"
+        write(self.gdf, output)
+
+        gdf = gpd.read_file(output)
+        self.assertEqual(len(self.gdf.index), len(gdf.index))
+
+    def test_csv(self):
+        """Test CSV written in groups of rows has a single header."""
+        output = self.directory / "out.csv"
+        write(self.df, output, rows_per_group=3)
+
+        df = pd.read_csv(output, dtype={"STATE": str})
+        pd.testing.assert_frame_equal(self.df, df)
+
+        write(self.df.iloc[:0], output)
+        self.assertEqual(",".join(self.df.columns), output.read_text().strip())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,21 @@
 # Copyright (c) 2023 Darren Erik Vengroff
 """Tests for YAML specification for the CLI."""
 import unittest
+import warnings
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
 import censusdis.states
+import censusdis.cli.yamlspec
 from censusdis.cli.yamlspec import (
     CensusGroup,
     DataSpec,
     VariableSpec,
     VariableList,
     VariableSpecCollection,
+    register_derivation,
 )
 from censusdis.data import ContainedWithin
 from censusdis.datasets import ACS5
@@ -201,6 +207,117 @@ class VariableSpecCollectionTestCase(unittest.TestCase):
         )
 
 
+class SynthesizeTestCase(unittest.TestCase):
+    """Test synthesizing derived variables after downloading, without downloading."""
+
+    def setUp(self) -> None:
+        """Set up before each test."""
+        self.df = pd.DataFrame(
+            {
+                "NAME": ["A", "B"],
+                "X01001_001E": [10, 20],
+                "X01001_002E": [30, 60],
+                "X02001_001E": [40, 80],
+            }
+        )
+
+    def test_variable_list(self):
+        """Test fractions, their complements and other derivations of a list."""
+        spec = VariableList(["X01001_001E", "X01001_002E"], denominator="X02001_001E")
+        df = spec.with_synthesized(self.df)
+
+        self.assertEqual([0.25, 0.25], list(df["frac_X01001_001E"]))
+        self.assertEqual([0.75, 0.75], list(df["frac_X01001_002E"]))
+        self.assertNotIn("frac_X01001_001E", self.df.columns)
+
+        spec = VariableList(["X01001_001E"], denominator=True, frac_not=True)
+        self.assertEqual(
+            [0.0, 0.0], list(spec.with_synthesized(self.df)["frac_X01001_001E"])
+        )
+
+        spec = VariableList(
+            ["X01001_001E"], denominator="X02001_001E", derivation="pct"
+        )
+        self.assertEqual(
+            [25.0, 25.0], list(spec.with_synthesized(self.df)["pct_X01001_001E"])
+        )
+
+        spec = VariableList(
+            ["X01001_001E"], denominator="X02001_001E", derivation="diff"
+        )
+        self.assertEqual(
+            [-30, -60], list(spec.with_synthesized(self.df)["diff_X01001_001E"])
+        )
+
+        with self.assertRaises(ValueError):
+            VariableList(["X01001_001E"], denominator=True, derivation="nope")
+
+    def test_synthesize_in_place(self):
+        """Test synthesizing adds the derived variables to the frame itself."""
+        df = self.df.copy()
+
+        for spec in (
+            VariableList(["X01001_001E", "X01001_002E"], denominator="X02001_001E"),
+            VariableSpecCollection(
+                [CensusGroup(["X01001", "X02001"], denominator=True)]
+            ),
+        ):
+            self.assertIsNone(spec.synthesize(df))
+
+        self.assertEqual([0.25, 0.25], list(df["frac_X01001_001E"]))
+        self.assertEqual([0.75, 0.75], list(df["frac_X01001_002E"]))
+        self.assertEqual([1.0, 1.0], list(df["frac_X02001_001E"]))
+        self.assertEqual(len(self.df.columns) + 3, len(df.columns))
+
+    def test_registered_derivation(self):
+        """Test a derivation registered by name."""
+        self.addCleanup(censusdis.cli.yamlspec._DERIVATIONS.pop, "log_ratio")
+
+        register_derivation(
+            "log_ratio",
+            lambda variables, denominator: np.log(
+                variables.div(denominator, axis="index")
+            ),
+        )
+        spec = VariableList(
+            ["X01001_001E"], denominator="X01001_001E", derivation="log_ratio"
+        )
+        self.assertEqual(
+            [0.0, 0.0], list(spec.with_synthesized(self.df)["log_ratio_X01001_001E"])
+        )
+
+    def test_group_sum_denominator(self):
+        """Test each group is divided by its own sum."""
+        spec = VariableSpecCollection(
+            [CensusGroup(["X01001", "X02001"], denominator=True)]
+        )
+        df = spec.with_synthesized(self.df)
+
+        self.assertEqual([0.25, 0.25], list(df["frac_X01001_001E"]))
+        self.assertEqual([1.0, 1.0], list(df["frac_X02001_001E"]))
+        self.assertEqual(len(self.df.columns) + 3, len(df.columns))
+
+    def test_wide_group(self):
+        """Test a wide group does not leave the frame fragmented."""
+        variables = [f"X03001_{ii:03d}E" for ii in range(1, 501)]
+        df_downloaded = pd.DataFrame(
+            np.arange(1, 1 + 3 * len(variables)).reshape(3, -1), columns=variables
+        )
+
+        spec = CensusGroup("X03001", denominator="X03001_001E")
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", pd.errors.PerformanceWarning)
+            df = spec.with_synthesized(df_downloaded)
+
+        self.assertEqual(2 * len(variables), len(df.columns))
+        self.assertEqual([1.0, 1.0, 1.0], list(df["frac_X03001_001E"]))
+        self.assertEqual(
+            list(df_downloaded["X03001_500E"] / df_downloaded["X03001_001E"]),
+            list(df["frac_X03001_500E"]),
+        )
+
+
 class DownloadTestCase(unittest.TestCase):
     """Test downloading from variable specs."""
 
@@ -370,6 +487,39 @@ class DataSpecTestCase(unittest.TestCase):
         self.assertEqual(NJ, dataspec.geography["state"])
         self.assertEqual([ESSEX, HUDSON], dataspec.geography["county"])
 
+    def test_eq(self):
+        """Test data specs are equal when they download the same data."""
+        dataspec1 = DataSpec.load_yaml(self.directory / "dataspec1.yaml")
+        dataspec2 = DataSpec.load_yaml(self.directory / "dataspec2.yaml")
+
+        self.assertEqual(
+            dataspec1, DataSpec.load_yaml(self.directory / "dataspec1.yaml")
+        )
+        self.assertEqual(
+            dataspec2, DataSpec.load_yaml(self.directory / "dataspec2.yaml")
+        )
+        self.assertNotEqual(dataspec1, dataspec2)
+        self.assertEqual(
+            2,
+            len(
+                {
+                    dataspec1,
+                    dataspec2,
+                    DataSpec.load_yaml(self.directory / "dataspec1.yaml"),
+                }
+            ),
+        )
+
+        # Collections with different members are not equal.
+        self.assertNotEqual(
+            VariableSpecCollection(
+                [VariableList("X01001_001E"), CensusGroup("X02001")]
+            ),
+            VariableSpecCollection(
+                [VariableList("X01001_002E"), CensusGroup("X02001")]
+            ),
+        )
+
     def test_state_geo_download(self):
         """Test downloading with state geographies."""
         dataspec = DataSpec.load_yaml(self.directory / "dataspec4.yaml")